@@ -0,0 +1,214 @@
+"""
+Recursos compartidos de las aplicaciones de chat con datos.
+
+El cliente de Groq se crea una vez por proceso y el agente de pandas se
+guarda por (huella del dataset, configuración del modelo), de modo que los
+reruns de Streamlit y cada pregunta del chat no vuelven a construirlos.
+Las respuestas se guardan en un caché persistente compartido por ambas apps
+y se muestran en el chat a medida que llegan los tokens. El código pandas que
+genera el agente se ejecuta en procesos aislados (ver ejecutor_aislado).
+"""
+import os
+import threading
+import time
+from typing import Any
+
+import streamlit as st
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import BaseTool
+from langchain_experimental.agents import create_pandas_dataframe_agent
+from langchain_groq import ChatGroq
+
+from cache_respuestas import CacheRespuestas
+from ejecutor_aislado import EjecutorAislado
+from perfil_datos import perfil_a_texto, perfilar
+
+MODELO_POR_DEFECTO = "llama3-70b-8192"
+
+PREFIJO_AGENTE = (
+    "You are working with a pandas dataframe in Python. The name of the dataframe is `df`.\n"
+    "This profile of `df` was computed in advance; use it instead of inspecting the data "
+    "with df.head(), df.dtypes or df.describe():\n{perfil}\n"
+    "Each python_repl_ast call may start from a clean namespace with `df`, `pd` and `np`, "
+    "so include every step you need in the same command.\n"
+    "You should use the tools below to answer the question posed of you:"
+)
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_llm(modelo=MODELO_POR_DEFECTO, temperatura=0):
+    """Cliente de Groq compartido por todo el proceso"""
+    return ChatGroq(
+        model=modelo,
+        temperature=temperatura,
+        max_tokens=None,
+        timeout=None,
+        max_retries=2,
+        streaming=True,
+        api_key=st.secrets["GROQ_API"],
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_ejecutor():
+    """Grupo de procesos para el código del agente, compartido por todas las sesiones"""
+    return EjecutorAislado()
+
+
+class HerramientaAislada(BaseTool):
+    """Reemplazo de python_repl_ast que ejecuta el código en el grupo de procesos aislados"""
+
+    name: str = "python_repl_ast"
+    description: str = (
+        "A Python shell. Use this to execute python commands. Input should be a valid python command. "
+        "When using this tool, sometimes output is abbreviated - make sure it does not look abbreviated "
+        "before using it in your answer. Each execution starts from a clean namespace with `df`, `pd` "
+        "and `np`, so include every step you need in the same command."
+    )
+    ejecutor: Any = None
+    ruta_datos: str = ""
+    # Con la huella y el DataFrame se vuelve a publicar el archivo si el ejecutor lo desalojó
+    huella: str = ""
+    datos: Any = None
+
+    def _run(self, query: str, run_manager=None) -> str:
+        if not os.path.exists(self.ruta_datos) and self.datos is not None:
+            self.ruta_datos = self.ejecutor.publicar(self.huella, self.datos)
+        # El agente se comparte entre sesiones: la cancelación viene con los callbacks de cada pregunta
+        manejadores = run_manager.handlers if run_manager is not None else []
+        cancelado = next((m.cancelado for m in manejadores if isinstance(m, RespuestaEnVivo)), None)
+        texto = self.ejecutor.ejecutar(self.ruta_datos, query, cancelado=cancelado)
+        if cancelado is not None and cancelado.interrupcion is not None:
+            # El usuario detuvo la app o envió otra pregunta: Streamlit termina esta ejecución del script
+            raise cancelado.interrupcion
+        return texto
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def obtener_perfil(huella, _df):
+    """Perfil del dataset en texto, calculado una vez por huella"""
+    return perfil_a_texto(perfilar(_df))
+
+
+def crear_agente(llm, df, perfil=None, ejecutor=None, huella=None):
+    """Construye el agente de pandas con cualquier modelo de chat (Groq o uno local de pruebas).
+    Con `perfil` el texto va en el prompt en lugar de df.head(); con `ejecutor` el código
+    generado se ejecuta en ese grupo de procesos aislados.
+    """
+    opciones = {}
+    if perfil is not None:
+        # El prefijo forma parte de una plantilla: las llaves del perfil se escapan
+        perfil = perfil.replace("{", "{{").replace("}", "}}")
+        opciones = {"prefix": PREFIJO_AGENTE.format(perfil=perfil), "include_df_in_prompt": False}
+    agente = create_pandas_dataframe_agent(llm, df, allow_dangerous_code=True, **opciones)
+    if ejecutor is not None:
+        agente.tools = [HerramientaAislada(ejecutor=ejecutor, ruta_datos=ejecutor.publicar(huella, df),
+                                           huella=huella, datos=df)]
+    return agente
+
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def obtener_agente(huella, modelo=MODELO_POR_DEFECTO, temperatura=0, aislado=True, _df=None):
+    """Agente de pandas por dataset y configuración del modelo.
+    `huella` identifica el contenido del DataFrame; `_df` no se usa como llave del caché.
+    El perfil del dataset va en el prompt, así que no se incluye df.head().
+    Con `aislado` el código generado se ejecuta fuera del proceso de Streamlit.
+    """
+    return crear_agente(
+        obtener_llm(modelo, temperatura),
+        _df,
+        perfil=obtener_perfil(huella, _df),
+        ejecutor=obtener_ejecutor() if aislado else None,
+        huella=huella,
+    )
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_cache_respuestas():
+    """Caché de respuestas compartido por todas las sesiones del proceso"""
+    return CacheRespuestas()
+
+
+def mostrar_estadisticas_cache(cache):
+    """Muestra en el sidebar los aciertos y fallos del caché de respuestas"""
+    estadisticas = cache.estadisticas()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Aciertos", estadisticas['aciertos'])
+    col2.metric("Fallos", estadisticas['fallos'])
+    col3.metric("Guardadas", estadisticas['entradas'])
+
+
+class CancelacionEnVivo:
+    """
+    Evento de cancelación de una pregunta que además detecta cuando el usuario detiene la app
+    o envía otra pregunta. Mientras el código corre no hay otros comandos de Streamlit, así que
+    se actualiza un aviso cada cierto tiempo: ese comando recibe la interrupción del script.
+    """
+
+    INTERVALO_SEGUNDOS = 0.5
+
+    def __init__(self, aviso):
+        self.aviso = aviso
+        self.evento = threading.Event()
+        self.interrupcion = None
+        self._ultima_revision = 0.0
+
+    def set(self):
+        self.evento.set()
+
+    def is_set(self):
+        if not self.evento.is_set() and time.monotonic() - self._ultima_revision > self.INTERVALO_SEGUNDOS:
+            self._ultima_revision = time.monotonic()
+            try:
+                self.aviso.caption("Ejecutando código…")
+            except BaseException as e:
+                # StopException o RerunException de Streamlit; se relanza al terminar la herramienta
+                self.interrupcion = e
+                self.evento.set()
+        return self.evento.is_set()
+
+
+class RespuestaEnVivo(BaseCallbackHandler):
+    """Muestra en el chat los tokens y los pasos intermedios del agente a medida que llegan"""
+
+    def __init__(self, contenedor):
+        self.pasos = contenedor.status("Analizando...", expanded=False)
+        self.texto_vivo = contenedor.empty()
+        self.tokens = ""
+        self.inicio = time.perf_counter()
+        self.primer_token = None
+        # El código del agente que corre en el ejecutor aislado se cancela con este evento
+        self.cancelado = CancelacionEnVivo(self.texto_vivo)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.primer_token is None:
+            self.primer_token = time.perf_counter() - self.inicio
+        self.tokens += token
+        # En la última llamada del agente solo se muestra lo que sigue a "Final Answer:"
+        self.texto_vivo.markdown(self.tokens.split("Final Answer:", 1)[-1] + "▌")
+
+    def on_agent_action(self, action, **kwargs):
+        # El texto generado hasta aquí era el razonamiento del paso: se pasa al registro de pasos
+        self.pasos.markdown(f"**{action.tool}**")
+        self.pasos.code(str(action.tool_input), language="python")
+        self.tokens = ""
+        self.texto_vivo.empty()
+
+    def on_tool_end(self, output, **kwargs):
+        self.pasos.text(str(output)[:1000])
+
+    def finalizar(self, respuesta, desde_cache=False):
+        """Reemplaza el texto en vivo por la respuesta final"""
+        self.texto_vivo.markdown(respuesta)
+        if desde_cache:
+            etiqueta = "⚡ Respuesta desde caché"
+        elif self.primer_token is not None:
+            etiqueta = (f"Análisis completo: primer token en {self.primer_token:.1f}s, "
+                        f"total {time.perf_counter() - self.inicio:.1f}s")
+        else:
+            etiqueta = "Análisis completo"
+        self.pasos.update(label=etiqueta, state="complete")
+
+    def fallar(self):
+        self.texto_vivo.empty()
+        self.pasos.update(label="Error en el análisis", state="error")
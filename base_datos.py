@@ -0,0 +1,321 @@
+"""
+Acceso compartido a la base de datos para ganttserv y habladatosBD.
+
+Las conexiones se guardan en un grupo (pool) por cadena de conexión que vive
+todo el proceso de Streamlit, en lugar de abrir un pyodbc.connect por cada
+rerun o botón. Antes de entregar una conexión que estuvo inactiva se verifica
+con una consulta mínima; si la conexión o la consulta fallan por un problema
+de red se reintenta con espera exponencial. Cada consulta registra su tiempo,
+filas e intentos para mostrarlos en la interfaz.
+
+Los resultados grandes se leen con fetchmany en lotes de tamaño fijo y cada
+lote se convierte enseguida en un RecordBatch de Arrow, con columnas tipadas,
+en vez de acumular todas las filas como objetos de Python.
+
+El grupo recibe la función que crea conexiones, así que también funciona con
+sqlite3 como base de datos local de reemplazo.
+"""
+import contextlib
+import datetime
+import decimal
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+TAMANO_POR_DEFECTO = 4
+INTENTOS_POR_DEFECTO = 3
+ESPERA_INICIAL = 0.5
+VERIFICAR_TRAS_SEGUNDOS = 30
+MAX_HISTORIAL = 100
+CONSULTA_PRUEBA = "SELECT 1"
+TAMANO_LOTE_POR_DEFECTO = int(os.environ.get('BD_TAMANO_LOTE', '10000'))
+
+# Tipo de Python que informa el cursor (pyodbc) -> tipo de Arrow. Los decimales se leen
+# como float64, igual que pd.read_sql; sqlite3 no informa tipos y se infieren por lote.
+TIPOS_ARROW = {
+    int: pa.int64(),
+    float: pa.float64(),
+    decimal.Decimal: pa.float64(),
+    bool: pa.bool_(),
+    str: pa.string(),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+    datetime.datetime: pa.timestamp('us'),
+    datetime.date: pa.date32(),
+}
+
+
+def cadena_odbc(server, database, uid, pwd, driver="{ODBC Driver 17 for SQL Server}"):
+    """Cadena de conexión ODBC para SQL Server"""
+    return f"DRIVER={driver};SERVER={server};DATABASE={database};UID={uid};PWD={pwd};"
+
+
+def conector_odbc(cadena):
+    """Función que abre una conexión pyodbc nueva con la cadena dada"""
+    def conectar():
+        import pyodbc
+        return pyodbc.connect(cadena)
+    return conectar
+
+
+def conector_sqlite(ruta):
+    """Función que abre una conexión sqlite3, usada como reemplazo local de SQL Server"""
+    def conectar():
+        return sqlite3.connect(ruta, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+    return conectar
+
+
+def _columna_arrow(valores, tipo):
+    if tipo is None:
+        columna = pa.array(valores)
+        # Los decimales inferidos se pasan a float64 como en pd.read_sql
+        return columna.cast(pa.float64()) if pa.types.is_decimal(columna.type) else columna
+    if tipo == pa.float64():
+        return pa.array(valores).cast(tipo)
+    return pa.array(valores, type=tipo)
+
+
+def lotes_arrow(cursor, tamano_lote=TAMANO_LOTE_POR_DEFECTO):
+    """Lee el resultado de un cursor ya ejecutado con fetchmany y entrega un RecordBatch por lote"""
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    tipos = [TIPOS_ARROW.get(descripcion[1]) for descripcion in cursor.description]
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            break
+        valores = list(zip(*filas))
+        yield pa.RecordBatch.from_arrays(
+            [_columna_arrow(list(valores[i]), tipo) for i, tipo in enumerate(tipos)], names=columnas
+        )
+
+
+def tabla_desde_lotes(lotes, columnas=()):
+    """Une los lotes en una tabla; un lote con una columna toda nula toma el tipo de los demás"""
+    lotes = list(lotes)
+    if not lotes:
+        return pa.table({columna: pa.array([], pa.null()) for columna in columnas})
+    return pa.concat_tables([pa.Table.from_batches([lote]) for lote in lotes], promote_options='default')
+
+
+class _Conexion:
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.ultimo_uso = time.monotonic()
+
+
+class PoolConexiones:
+    """
+    Grupo de conexiones reutilizables con verificación de salud, reintentos con espera
+    exponencial y medición de cada consulta
+    """
+
+    def __init__(self, conectar, tamano=TAMANO_POR_DEFECTO, intentos=INTENTOS_POR_DEFECTO,
+                 espera_inicial=ESPERA_INICIAL, verificar_tras=VERIFICAR_TRAS_SEGUNDOS,
+                 consulta_prueba=CONSULTA_PRUEBA):
+        self.conectar = conectar
+        self.intentos = intentos
+        self.espera_inicial = espera_inicial
+        self.verificar_tras = verificar_tras
+        self.consulta_prueba = consulta_prueba
+        self._libres = queue.LifoQueue()
+        self._cupos = threading.BoundedSemaphore(tamano)
+        self._candado = threading.Lock()
+        self.historial = deque(maxlen=MAX_HISTORIAL)
+        self.conexiones_creadas = 0
+        self.conexiones_descartadas = 0
+
+    def _esperar(self, intento):
+        time.sleep(self.espera_inicial * 2 ** (intento - 1))
+
+    def _nueva(self):
+        """Abre una conexión, reintentando con espera exponencial"""
+        for intento in range(1, self.intentos + 1):
+            try:
+                conexion = _Conexion(self.conectar())
+                with self._candado:
+                    self.conexiones_creadas += 1
+                return conexion
+            except Exception:
+                if intento == self.intentos:
+                    raise
+                self._esperar(intento)
+
+    def _sana(self, conexion):
+        try:
+            cursor = conexion.conexion.cursor()
+            cursor.execute(self.consulta_prueba)
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conexion):
+        with self._candado:
+            self.conexiones_descartadas += 1
+        with contextlib.suppress(Exception):
+            conexion.conexion.close()
+
+    def _tomar(self):
+        while True:
+            try:
+                conexion = self._libres.get_nowait()
+            except queue.Empty:
+                return self._nueva()
+            # Solo se verifica la conexión si estuvo inactiva, para no sumar una ida y vuelta por consulta
+            if time.monotonic() - conexion.ultimo_uso < self.verificar_tras or self._sana(conexion):
+                return conexion
+            self._descartar(conexion)
+
+    def _devolver(self, conexion, fallo=False):
+        """Devuelve la conexión al grupo; tras un error solo si sigue sana. Indica si se devolvió."""
+        if fallo and not self._sana(conexion):
+            self._descartar(conexion)
+            return False
+        conexion.ultimo_uso = time.monotonic()
+        self._libres.put(conexion)
+        return True
+
+    @contextlib.contextmanager
+    def conexion(self):
+        """Entrega una conexión del grupo y la devuelve al terminar; si queda inservible, se descarta"""
+        with self._cupos:
+            conexion = self._tomar()
+            try:
+                yield conexion.conexion
+            except BaseException:
+                self._devolver(conexion, fallo=True)
+                raise
+            self._devolver(conexion)
+
+    def ejecutar(self, leer, nombre="consulta"):
+        """
+        Ejecuta leer(conexion) con reintentos y registra la medición. Si falla con la
+        conexión sana, el error es de la consulta y no se reintenta.
+        `leer` debe devolver un DataFrame, una tabla de Arrow o una cantidad de filas.
+        """
+        inicio = time.perf_counter()
+        for intento in range(1, self.intentos + 1):
+            with self._cupos:
+                try:
+                    # Abrir la conexión ya tiene sus propios reintentos
+                    conexion = self._tomar()
+                except Exception as e:
+                    self._registrar(nombre, inicio, 0, intento, error=f"{type(e).__name__}: {e}")
+                    raise
+                try:
+                    resultado = leer(conexion.conexion)
+                except Exception as e:
+                    sana = self._devolver(conexion, fallo=True)
+                    if sana or intento == self.intentos:
+                        self._registrar(nombre, inicio, 0, intento, error=f"{type(e).__name__}: {e}")
+                        raise
+                else:
+                    self._devolver(conexion)
+                    break
+            self._esperar(intento)
+        filas = resultado if isinstance(resultado, int) else len(resultado)
+        self._registrar(nombre, inicio, filas, intento)
+        return resultado
+
+    def consultar(self, sql, params=None, nombre="consulta"):
+        """Ejecuta una consulta parametrizada y devuelve un DataFrame"""
+        def leer(conexion):
+            cursor = conexion.cursor()
+            try:
+                cursor.execute(sql, params or [])
+                columnas = [descripcion[0] for descripcion in cursor.description]
+                filas = [tuple(fila) for fila in cursor.fetchall()]
+            finally:
+                cursor.close()
+            return pd.DataFrame.from_records(filas, columns=columnas)
+
+        return self.ejecutar(leer, nombre)
+
+    def iterar_lotes(self, sql, params=None, tamano_lote=TAMANO_LOTE_POR_DEFECTO, nombre="consulta"):
+        """
+        Ejecuta la consulta y entrega RecordBatches de Arrow a medida que llegan, para consumidores
+        que procesan el resultado por partes. La conexión queda tomada hasta terminar de iterar.
+        """
+        inicio = time.perf_counter()
+        filas = 0
+        try:
+            with self.conexion() as conexion:
+                cursor = conexion.cursor()
+                try:
+                    cursor.execute(sql, params or [])
+                    for lote in lotes_arrow(cursor, tamano_lote):
+                        filas += lote.num_rows
+                        yield lote
+                finally:
+                    cursor.close()
+        except Exception as e:
+            self._registrar(nombre, inicio, filas, 1, error=f"{type(e).__name__}: {e}")
+            raise
+        self._registrar(nombre, inicio, filas, 1)
+
+    def consultar_arrow(self, sql, params=None, tamano_lote=TAMANO_LOTE_POR_DEFECTO, nombre="consulta"):
+        """Ejecuta la consulta por lotes (con reintentos) y devuelve una tabla de Arrow"""
+        def leer(conexion):
+            cursor = conexion.cursor()
+            try:
+                cursor.execute(sql, params or [])
+                columnas = [descripcion[0] for descripcion in cursor.description]
+                return tabla_desde_lotes(lotes_arrow(cursor, tamano_lote), columnas)
+            finally:
+                cursor.close()
+
+        return self.ejecutar(leer, nombre)
+
+    def consultar_por_lotes(self, sql, params=None, tamano_lote=TAMANO_LOTE_POR_DEFECTO, nombre="consulta"):
+        """Como consultar, pero leyendo por lotes de Arrow: menos memoria en resultados grandes"""
+        # Fechas en nanosegundos, como las entrega pd.read_sql
+        return self.consultar_arrow(sql, params, tamano_lote, nombre).to_pandas(coerce_temporal_nanoseconds=True)
+
+    def _registrar(self, nombre, inicio, filas, intentos, error=None):
+        segundos = time.perf_counter() - inicio
+        self.historial.append({
+            "consulta": nombre,
+            "inicio": pd.Timestamp.now().floor("s"),
+            "segundos": round(segundos, 3),
+            "filas": filas,
+            "filas_por_segundo": round(filas / segundos) if segundos > 0 else None,
+            "intentos": intentos,
+            "error": error,
+        })
+
+    def estadisticas(self):
+        return {
+            "conexiones_libres": self._libres.qsize(),
+            "conexiones_creadas": self.conexiones_creadas,
+            "conexiones_descartadas": self.conexiones_descartadas,
+            "consultas": len(self.historial),
+        }
+
+    def cerrar(self):
+        while not self._libres.empty():
+            with contextlib.suppress(Exception):
+                self._libres.get_nowait().conexion.close()
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_pool(cadena, tamano=TAMANO_POR_DEFECTO):
+    """Grupo de conexiones ODBC compartido por todas las sesiones del proceso"""
+    return PoolConexiones(conector_odbc(cadena), tamano=tamano)
+
+
+def mostrar_consultas(pool):
+    """Muestra el estado del grupo y el tiempo y filas de las últimas consultas"""
+    estadisticas = pool.estadisticas()
+    st.caption(f"Conexiones libres: {estadisticas['conexiones_libres']} · "
+               f"creadas: {estadisticas['conexiones_creadas']} · "
+               f"descartadas: {estadisticas['conexiones_descartadas']}")
+    if pool.historial:
+        st.dataframe(pd.DataFrame(list(pool.historial)[::-1]), use_container_width=True, hide_index=True)
@@ -0,0 +1,247 @@
+"""
+Benchmark del agente de datos sin conexión a Groq.
+
+Usa ChatFalso para reproducir trayectorias guionadas sobre un conjunto fijo de
+preguntas y mide por pregunta: latencia total, iteraciones del agente, tokens
+emitidos, tokens del historial enviado, tokens de los prompts que recibe el
+modelo en cada llamada (con el prefijo del perfil y el scratchpad del agente)
+y tiempo de ejecución de pandas. Permite comparar
+variantes (perfil en el prompt, ejecución aislada, caché de respuestas,
+memoria de conversación) con los mismos datos y guiones.
+
+Uso:
+    python benchmark_agente.py --repeticiones 3 --retardo-token 0.01 --cache --salida bench.csv
+    python benchmark_agente.py --datos produccion.csv --preguntas preguntas.json --aislado
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from langchain_core.callbacks import BaseCallbackHandler
+
+from cache_respuestas import CacheRespuestas
+from llm_falso import ChatFalso, paso_accion, paso_final
+from memoria_chat import contar_tokens, construir_contexto, nuevo_estado, resumen_extractivo, tokens_mensajes
+from perfil_datos import perfil_a_texto, perfilar
+
+PROMPT_SISTEMA = ("Vas a actuar como un analista de datos experto, dando siempre respuestas claras y concretas "
+                  "en español. Si te piden tablas o listas, las generas en markdown.")
+
+# Preguntas y trayectorias por defecto sobre el DataFrame Fecha / Proceso / Cantidad
+PREGUNTAS_POR_DEFECTO = [
+    {
+        "pregunta": "Total producción de costura por semana",
+        "pasos": [
+            paso_accion("df[df['Proceso'] == 'Produccion_Costura']"
+                        ".groupby(pd.Grouper(key='Fecha', freq='W'))['Cantidad'].sum()"),
+            paso_final("La producción semanal de costura se muestra en la tabla anterior."),
+        ],
+    },
+    {
+        "pregunta": "¿Qué proceso tuvo la mayor producción?",
+        "pasos": [
+            paso_accion("df.groupby('Proceso')['Cantidad'].sum().sort_values(ascending=False)"),
+            paso_final("El proceso con mayor producción es el primero de la lista."),
+        ],
+    },
+    {
+        "pregunta": "Promedio diario de tejido en el último mes",
+        "pasos": [
+            paso_accion("df['Fecha'].max()", "I need the last date first"),
+            paso_accion("t = df[(df['Proceso'] == 'Produccion_Tejido') & "
+                        "(df['Fecha'] > df['Fecha'].max() - pd.Timedelta(days=30))]\n"
+                        "t.groupby('Fecha')['Cantidad'].sum().mean()"),
+            paso_final("El promedio diario de tejido en los últimos 30 días es el valor calculado."),
+        ],
+    },
+    {
+        "pregunta": "¿Qué día se cortaron más unidades?",
+        "pasos": [
+            paso_accion("c = df[df['Proceso'] == 'Produccion_Corte']\n"
+                        "c.loc[c['Cantidad'].idxmax(), ['Fecha', 'Cantidad']]"),
+            paso_final("El día con más unidades cortadas es el indicado arriba."),
+        ],
+    },
+]
+
+
+def datos_sinteticos(dias=365, semilla=0):
+    """DataFrame de producción Fecha / Proceso / Cantidad con la forma de obtener_datos"""
+    generador = np.random.default_rng(semilla)
+    procesos = ['Produccion_Armado', 'Produccion_Corte', 'Produccion_Costura', 'Produccion_Hilado',
+                'Produccion_Tejido', 'Produccion_Teñido']
+    fechas = pd.date_range(end=pd.Timestamp.today().normalize(), periods=dias, freq='D')
+    df = pd.DataFrame({
+        'Fecha': np.repeat(fechas, len(procesos)),
+        'Proceso': np.tile(procesos, len(fechas)),
+    })
+    df['Cantidad'] = generador.integers(0, 5000, len(df))
+    return df
+
+
+class Medidor(BaseCallbackHandler):
+    """
+    Cuenta iteraciones del agente, suma los tokens de los prompts que llegan al modelo
+    y mide el tiempo de las herramientas (pandas)
+    """
+
+    def __init__(self):
+        self.iteraciones = 0
+        self.tokens_prompt = 0
+        self.segundos_pandas = 0.0
+        self._inicio_herramienta = None
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        # Mensajes completos de cada llamada: prefijo con el perfil, historial y scratchpad
+        self.tokens_prompt += sum(contar_tokens(mensaje.content) for lote in messages for mensaje in lote)
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.tokens_prompt += sum(contar_tokens(prompt) for prompt in prompts)
+
+    def on_agent_action(self, action, **kwargs):
+        self.iteraciones += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self._inicio_herramienta = time.perf_counter()
+
+    def on_tool_end(self, output, **kwargs):
+        if self._inicio_herramienta is not None:
+            self.segundos_pandas += time.perf_counter() - self._inicio_herramienta
+            self._inicio_herramienta = None
+
+
+def construir_agente(llm, df, con_perfil, aislado):
+    from agente_datos import crear_agente
+
+    ejecutor = None
+    huella = None
+    if aislado:
+        from ejecutor_aislado import EjecutorAislado
+        from ingesta import dataframe_fingerprint
+
+        ejecutor = EjecutorAislado(trabajadores=1)
+        huella = dataframe_fingerprint(df)
+    perfil = perfil_a_texto(perfilar(df)) if con_perfil else None
+    return crear_agente(llm, df, perfil=perfil, ejecutor=ejecutor, huella=huella), ejecutor
+
+
+def ejecutar_benchmark(df, preguntas, repeticiones=1, retardo_token=0.0, retardo_llamada=0.0, con_perfil=True,
+                       aislado=False, usar_cache=False, usar_memoria=False, presupuesto_tokens=2000):
+    """Ejecuta todas las preguntas y devuelve un DataFrame con una fila por pregunta y repetición"""
+    llm = ChatFalso(
+        guiones={item["pregunta"]: item["pasos"] for item in preguntas},
+        retardo_token=retardo_token,
+        retardo_llamada=retardo_llamada,
+    )
+    agente, ejecutor = construir_agente(llm, df, con_perfil, aislado)
+    cache = CacheRespuestas(os.path.join(tempfile.mkdtemp(), 'respuestas.sqlite')) if usar_cache else None
+    huella = f"benchmark-{len(df)}"
+
+    filas = []
+    try:
+        for repeticion in range(1, repeticiones + 1):
+            mensajes = [{"role": "system", "content": PROMPT_SISTEMA}]
+            memoria = nuevo_estado()
+            for item in preguntas:
+                llm.reiniciar(item["pregunta"])
+                medidor = Medidor()
+                mensajes.append({"role": "user", "content": item["pregunta"]})
+
+                inicio = time.perf_counter()
+                if usar_memoria:
+                    contexto, _ = construir_contexto(mensajes, memoria, resumir=resumen_extractivo,
+                                                     presupuesto_tokens=presupuesto_tokens)
+                else:
+                    contexto = [mensajes[0], mensajes[-1]]
+                entrada = contexto if usar_memoria else item["pregunta"]
+
+                def generar():
+                    return agente.run(entrada, callbacks=[medidor])
+
+                if cache is not None:
+                    respuesta, desde_cache = cache.responder(cache.llave(huella, item["pregunta"], contexto[:-1]),
+                                                             generar)
+                else:
+                    respuesta, desde_cache = generar(), False
+                segundos = time.perf_counter() - inicio
+
+                mensajes.append({"role": "assistant", "content": respuesta})
+                filas.append({
+                    "repeticion": repeticion,
+                    "pregunta": item["pregunta"],
+                    "segundos": round(segundos, 4),
+                    "iteraciones": medidor.iteraciones,
+                    "llamadas_llm": llm.llamadas,
+                    "tokens_salida": llm.tokens_emitidos,
+                    "tokens_contexto": tokens_mensajes(contexto),
+                    "tokens_prompt": medidor.tokens_prompt,
+                    "segundos_pandas": round(medidor.segundos_pandas, 4),
+                    "desde_cache": desde_cache,
+                })
+    finally:
+        if ejecutor is not None:
+            ejecutor.cerrar()
+
+    return pd.DataFrame(filas)
+
+
+def resumen(resultados):
+    """Latencia media, p50 y p95 e iteraciones promedio por pregunta"""
+    return resultados.groupby("pregunta", sort=False).agg(
+        media_s=("segundos", "mean"),
+        p50_s=("segundos", "median"),
+        p95_s=("segundos", lambda serie: serie.quantile(0.95)),
+        iteraciones=("iteraciones", "mean"),
+        tokens_salida=("tokens_salida", "mean"),
+        tokens_prompt=("tokens_prompt", "mean"),
+        pandas_s=("segundos_pandas", "mean"),
+        aciertos_cache=("desde_cache", "sum"),
+    ).round(4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del agente de datos con un modelo local guionado")
+    parser.add_argument("--datos", help="CSV con los datos; por defecto, producción sintética")
+    parser.add_argument("--preguntas", help="JSON con una lista de {pregunta, pasos}")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--retardo-token", type=float, default=0.0, help="Segundos por token emitido")
+    parser.add_argument("--retardo-llamada", type=float, default=0.0, help="Segundos fijos por llamada al modelo")
+    parser.add_argument("--sin-perfil", action="store_true", help="No incluir el perfil del dataset en el prompt")
+    parser.add_argument("--aislado", action="store_true", help="Ejecutar pandas en el grupo de procesos aislados")
+    parser.add_argument("--cache", action="store_true", help="Responder a través del caché de respuestas")
+    parser.add_argument("--memoria", action="store_true", help="Enviar el historial con memoria acotada")
+    parser.add_argument("--salida", help="CSV donde guardar los resultados por pregunta")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.datos, parse_dates=["Fecha"]) if args.datos else datos_sinteticos()
+    if args.preguntas:
+        with open(args.preguntas, encoding="utf-8") as f:
+            preguntas = json.load(f)
+    else:
+        preguntas = PREGUNTAS_POR_DEFECTO
+
+    resultados = ejecutar_benchmark(
+        df, preguntas,
+        repeticiones=args.repeticiones,
+        retardo_token=args.retardo_token,
+        retardo_llamada=args.retardo_llamada,
+        con_perfil=not args.sin_perfil,
+        aislado=args.aislado,
+        usar_cache=args.cache,
+        usar_memoria=args.memoria,
+    )
+    if args.salida:
+        resultados.to_csv(args.salida, index=False)
+
+    print(resumen(resultados).to_markdown())
+    print(f"\nTotal: {resultados['segundos'].sum():.2f}s en {len(resultados)} preguntas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Caché persistente de respuestas del LLM en SQLite.
+
+La llave combina la huella del dataset, la pregunta normalizada y el historial
+relevante de la conversación. Las entradas vencen por TTL y, si se supera el
+máximo de entradas, se descartan las usadas hace más tiempo. El caché no
+depende del LLM: solo guarda el texto de la respuesta, por lo que se puede
+probar con cualquier generador local.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+RUTA_POR_DEFECTO = os.path.join('.cache', 'respuestas.sqlite')
+TTL_POR_DEFECTO = 7 * 24 * 3600
+MAX_ENTRADAS_POR_DEFECTO = 5000
+
+
+def normalizar_texto(texto):
+    """Minúsculas, sin tildes, sin signos de puntuación ni espacios repetidos"""
+    texto = unicodedata.normalize('NFKD', str(texto).lower())
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    texto = re.sub(r'[¿?¡!.,;:]+', ' ', texto)
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+class CacheRespuestas:
+    """Caché de respuestas con TTL, descarte LRU y contadores de aciertos"""
+
+    def __init__(self, ruta=RUTA_POR_DEFECTO, ttl_segundos=TTL_POR_DEFECTO, max_entradas=MAX_ENTRADAS_POR_DEFECTO):
+        self.ruta = ruta
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    llave TEXT PRIMARY KEY,
+                    respuesta TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    usado REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_usado ON respuestas (usado)")
+            conn.execute("CREATE TABLE IF NOT EXISTS contadores (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def llave(huella, pregunta, historial=()):
+        """Llave del caché: huella del dataset, pregunta normalizada e historial (sin el prompt de sistema)"""
+        historial = list(historial)
+        # Solo se omite el prompt de sistema fijo (el primero); los demás mensajes de
+        # sistema, como el resumen de memoria_chat, sí distinguen conversaciones
+        sistema = next((i for i, mensaje in enumerate(historial) if mensaje.get('role') == 'system'), None)
+        contenido = {
+            'huella': huella,
+            'pregunta': normalizar_texto(pregunta),
+            'historial': [
+                [mensaje['role'], normalizar_texto(mensaje['content'])]
+                for i, mensaje in enumerate(historial) if i != sistema
+            ],
+        }
+        return hashlib.sha256(json.dumps(contenido, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _contar(self, conn, nombre):
+        conn.execute(
+            "INSERT INTO contadores (nombre, valor) VALUES (?, 1) "
+            "ON CONFLICT(nombre) DO UPDATE SET valor = valor + 1",
+            (nombre,)
+        )
+
+    def obtener(self, llave):
+        """Devuelve la respuesta guardada o None si no existe o ya venció"""
+        ahora = time.time()
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE llave = ?", (llave,)
+            ).fetchone()
+            if fila is None or ahora - fila[1] > self.ttl_segundos:
+                self._contar(conn, 'fallos')
+                return None
+            conn.execute("UPDATE respuestas SET usado = ? WHERE llave = ?", (ahora, llave))
+            self._contar(conn, 'aciertos')
+            return fila[0]
+
+    def guardar(self, llave, respuesta):
+        """Guarda la respuesta y aplica TTL y el máximo de entradas"""
+        ahora = time.time()
+        with self._conectar() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO respuestas (llave, respuesta, creado, usado) VALUES (?, ?, ?, ?)",
+                (llave, str(respuesta), ahora, ahora)
+            )
+            self._purgar(conn, ahora)
+
+    def _purgar(self, conn, ahora):
+        conn.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl_segundos,))
+        conn.execute("""
+            DELETE FROM respuestas WHERE llave IN (
+                SELECT llave FROM respuestas ORDER BY usado DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entradas,))
+
+    def responder(self, llave, generar, ignorar_cache=False):
+        """Devuelve (respuesta, desde_cache). Si no hay respuesta guardada, o se pide
+        ignorar el caché, se llama a `generar()` y se guarda el resultado.
+        """
+        if not ignorar_cache:
+            respuesta = self.obtener(llave)
+            if respuesta is not None:
+                return respuesta, True
+        respuesta = generar()
+        self.guardar(llave, respuesta)
+        return respuesta, False
+
+    def estadisticas(self):
+        """Aciertos, fallos y entradas guardadas"""
+        with self._conectar() as conn:
+            contadores = dict(conn.execute("SELECT nombre, valor FROM contadores").fetchall())
+            entradas = conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+        return {
+            'aciertos': contadores.get('aciertos', 0),
+            'fallos': contadores.get('fallos', 0),
+            'entradas': entradas,
+        }
+
+    def limpiar(self):
+        """Borra todas las respuestas guardadas"""
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM respuestas")
@@ -0,0 +1,85 @@
+"""
+Resultado en caché con vencimiento y actualización en segundo plano.
+
+La primera lectura espera la carga. Cuando el valor vence (TTL) se sigue
+entregando el valor anterior de inmediato y un hilo lo vuelve a cargar; las
+lecturas siguientes reciben el valor nuevo. Si la carga en segundo plano
+falla se conserva el valor anterior y se informa el error.
+"""
+import threading
+import time
+
+TTL_POR_DEFECTO = 300
+
+
+class CacheRevalidado:
+    """Guarda el resultado de cargar() y lo renueva en segundo plano cuando vence"""
+
+    def __init__(self, cargar, ttl_segundos=TTL_POR_DEFECTO):
+        self.cargar = cargar
+        self.ttl_segundos = ttl_segundos
+        self.ultima_duracion = None
+        self.ultimo_error = None
+        self.actualizaciones = 0
+        self._valor = None
+        self._cargado = None
+        self._hilo = None
+        self._candado_carga = threading.Lock()
+        self._candado = threading.Lock()
+
+    def _actualizar(self):
+        inicio = time.perf_counter()
+        try:
+            valor = self.cargar()
+        except Exception as e:
+            self.ultimo_error = f"{type(e).__name__}: {e}"
+            raise
+        with self._candado:
+            self._valor = valor
+            self._cargado = time.time()
+            self.ultima_duracion = time.perf_counter() - inicio
+            self.ultimo_error = None
+            self.actualizaciones += 1
+        return valor
+
+    def _actualizar_en_segundo_plano(self):
+        with self._candado_carga:
+            try:
+                self._actualizar()
+            except Exception:
+                # El error queda en ultimo_error y se sigue entregando el valor anterior
+                pass
+
+    def actualizando(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def edad(self):
+        """Segundos desde la última carga, o None si nunca se cargó"""
+        return None if self._cargado is None else time.time() - self._cargado
+
+    def obtener(self, forzar=False):
+        """
+        Devuelve (valor, estado). Sin valor previo, o con forzar=True, espera la carga;
+        si el valor venció, lo entrega igual y lanza la actualización en segundo plano.
+        """
+        if self._cargado is None or forzar:
+            with self._candado_carga:
+                # Otra sesión pudo cargarlo mientras se esperaba el candado
+                if self._cargado is None or forzar:
+                    self._actualizar()
+        elif self.edad() > self.ttl_segundos:
+            with self._candado:
+                if not self.actualizando():
+                    self._hilo = threading.Thread(target=self._actualizar_en_segundo_plano, daemon=True)
+                    self._hilo.start()
+        return self._valor, self.estado()
+
+    def estado(self):
+        return {
+            'edad': self.edad(),
+            'ttl': self.ttl_segundos,
+            'ultima_duracion': self.ultima_duracion,
+            'actualizando': self.actualizando(),
+            'error': self.ultimo_error,
+            'actualizaciones': self.actualizaciones,
+        }
@@ -0,0 +1,244 @@
+"""
+Ejecución aislada del código pandas generado por el agente.
+
+El código se ejecuta en un grupo de procesos trabajadores, fuera del proceso
+de Streamlit. Cada DataFrame se publica una vez como archivo Arrow IPC y los
+trabajadores lo abren con memory-map; las columnas numéricas sin nulos y las
+de texto quedan respaldadas por el archivo en lugar de copiarse en memoria.
+Solo se conservan los MAX_ARCHIVOS_PUBLICADOS archivos usados más
+recientemente. Cada ejecución tiene un tiempo máximo, un límite de memoria
+por proceso y puede cancelarse: en esos casos el trabajador se termina y se
+reemplaza por uno nuevo, sin afectar al resto.
+"""
+import ast
+import contextlib
+import io
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+
+CARPETA_DATOS = os.path.join('.cache', 'ejecutor')
+TRABAJADORES_POR_DEFECTO = int(os.environ.get('EJECUTOR_TRABAJADORES', '2'))
+TIEMPO_MAXIMO_POR_DEFECTO = float(os.environ.get('EJECUTOR_TIEMPO_MAXIMO', '30'))
+MEMORIA_MAXIMA_MB = int(os.environ.get('EJECUTOR_MEMORIA_MB', '2048'))
+MAX_CARACTERES_SALIDA = 10000
+# Igual que los agentes guardados en caché (obtener_agente), cada uno con su archivo
+MAX_ARCHIVOS_PUBLICADOS = int(os.environ.get('EJECUTOR_MAX_ARCHIVOS', '16'))
+
+
+def limpiar_codigo(codigo):
+    """Quita espacios y las marcas de bloque de código (```python) como lo hace la herramienta de LangChain"""
+    codigo = re.sub(r"^(\s|`)*(?i:python)?\s*", "", codigo)
+    return re.sub(r"(\s|`)*$", "", codigo)
+
+
+def ejecutar_codigo(codigo, variables):
+    """
+    Ejecuta el código como en un REPL: todas las sentencias y, si la última es una
+    expresión, devuelve su valor; si no, lo que se haya impreso
+    """
+    arbol = ast.parse(codigo)
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        if arbol.body and isinstance(arbol.body[-1], ast.Expr):
+            exec(compile(ast.Module(body=arbol.body[:-1], type_ignores=[]), '<agente>', 'exec'), variables)
+            resultado = eval(compile(ast.Expression(body=arbol.body[-1].value), '<agente>', 'eval'), variables)
+            impreso = salida.getvalue()
+            texto = impreso + (str(resultado) if resultado is not None else '')
+        else:
+            exec(compile(arbol, '<agente>', 'exec'), variables)
+            texto = salida.getvalue()
+    return texto[:MAX_CARACTERES_SALIDA]
+
+
+def _limitar_memoria(megabytes):
+    try:
+        import resource
+        limite = megabytes * 1024 * 1024
+        # RLIMIT_DATA y no RLIMIT_AS: el memory-map del archivo publicado no cuenta para el límite,
+        # solo la memoria que reserva el código (copias, resultados intermedios)
+        resource.setrlimit(resource.RLIMIT_DATA, (limite, limite))
+    except (ImportError, ValueError, OSError):
+        # Sin soporte de límites (por ejemplo, Windows): se trabaja solo con el tiempo máximo
+        pass
+
+
+def _leer_publicado(ruta):
+    """
+    Abre el archivo publicado sin copiar lo que se puede evitar: los números sin nulos se
+    leen sin copia (split_blocks) y el texto queda como string de Arrow sobre el memory-map,
+    en lugar de un objeto de Python por celda
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    def tipo_pandas(tipo):
+        if pa.types.is_string(tipo) or pa.types.is_large_string(tipo):
+            return pd.StringDtype('pyarrow')
+        return None
+
+    tabla = feather.read_table(ruta, memory_map=True)
+    return tabla.to_pandas(split_blocks=True, types_mapper=tipo_pandas)
+
+
+def _bucle_trabajador(conexion, memoria_mb):
+    """Proceso trabajador: recibe (ruta de datos, código) y responde (ok, texto)"""
+    _limitar_memoria(memoria_mb)
+
+    import numpy as np
+    import pandas as pd
+
+    cargados = {}
+    while True:
+        try:
+            mensaje = conexion.recv()
+        except EOFError:
+            break
+        if mensaje is None:
+            break
+
+        ruta, codigo = mensaje
+        try:
+            if ruta not in cargados:
+                cargados.clear()
+                cargados[ruta] = _leer_publicado(ruta)
+            # Cada ejecución parte de un espacio de nombres limpio: los cambios a df no persisten
+            variables = {'df': cargados[ruta].copy(deep=False), 'pd': pd, 'np': np}
+            conexion.send((True, ejecutar_codigo(codigo, variables)))
+        except MemoryError:
+            cargados.clear()
+            conexion.send((False, "MemoryError: la consulta supera el límite de memoria del ejecutor"))
+        except Exception as e:
+            conexion.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Trabajador:
+    def __init__(self, contexto, memoria_mb):
+        self.conexion, extremo_hijo = contexto.Pipe()
+        self.proceso = contexto.Process(target=_bucle_trabajador, args=(extremo_hijo, memoria_mb), daemon=True)
+        self.proceso.start()
+        extremo_hijo.close()
+
+    def terminar(self):
+        self.proceso.terminate()
+        self.proceso.join(timeout=5)
+        self.conexion.close()
+
+
+class EjecutorAislado:
+    """Grupo de procesos trabajadores con tiempo máximo, límite de memoria y cancelación"""
+
+    def __init__(self, trabajadores=TRABAJADORES_POR_DEFECTO, tiempo_maximo=TIEMPO_MAXIMO_POR_DEFECTO,
+                 memoria_mb=MEMORIA_MAXIMA_MB, carpeta_datos=CARPETA_DATOS):
+        self.tiempo_maximo = tiempo_maximo
+        self.memoria_mb = memoria_mb
+        self.carpeta_datos = carpeta_datos
+        # spawn evita copiar el estado del servidor de Streamlit en cada trabajador
+        self._contexto = multiprocessing.get_context('spawn')
+        self._libres = queue.Queue()
+        self._ocupados = {}
+        self._candado = threading.Lock()
+        for _ in range(trabajadores):
+            self._libres.put(_Trabajador(self._contexto, memoria_mb))
+
+    def publicar(self, huella, df):
+        """
+        Guarda el DataFrame como Arrow IPC (una vez por huella) y devuelve la ruta.
+        Los archivos menos usados se borran para conservar solo MAX_ARCHIVOS_PUBLICADOS.
+        """
+        import pyarrow.feather as feather
+
+        from ingesta import parquet_safe
+
+        ruta = os.path.join(self.carpeta_datos, f"{huella}.arrow")
+        if not os.path.exists(ruta):
+            os.makedirs(self.carpeta_datos, exist_ok=True)
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            feather.write_feather(parquet_safe(df), temporal, compression='uncompressed')
+            os.replace(temporal, ruta)
+            self._desalojar(conservar=ruta)
+        return ruta
+
+    def _desalojar(self, conservar):
+        """Borra los archivos publicados que no se usaron hace más tiempo"""
+        rutas = [os.path.join(self.carpeta_datos, nombre) for nombre in os.listdir(self.carpeta_datos)
+                 if nombre.endswith('.arrow')]
+        rutas = [ruta for ruta in rutas if ruta != conservar]
+        rutas.sort(key=lambda ruta: os.path.getmtime(ruta), reverse=True)
+        for ruta in rutas[MAX_ARCHIVOS_PUBLICADOS - 1:]:
+            # Un trabajador que lo tenga abierto conserva su memory-map; en Windows puede no poder borrarse
+            with contextlib.suppress(OSError):
+                os.remove(ruta)
+
+    def ejecutar(self, ruta, codigo, tiempo_maximo=None, cancelado=None):
+        """
+        Ejecuta el código sobre el DataFrame publicado en `ruta` y devuelve el texto de salida.
+        `cancelado` es un threading.Event opcional para interrumpir la ejecución.
+        """
+        tiempo_maximo = tiempo_maximo or self.tiempo_maximo
+        try:
+            # La fecha de modificación marca el uso más reciente para el desalojo
+            os.utime(ruta)
+        except OSError:
+            return "Error: los datos publicados ya no están disponibles; vuelve a cargar los datos"
+
+        # La espera por un trabajador libre también respeta el tiempo máximo y la cancelación
+        inicio = time.monotonic()
+        while True:
+            try:
+                trabajador = self._libres.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if cancelado is not None and cancelado.is_set():
+                    return "Error: ejecución cancelada"
+                if time.monotonic() - inicio > tiempo_maximo:
+                    return (f"Error: no hubo un proceso de ejecución libre en {tiempo_maximo:.0f} s; "
+                            "intenta de nuevo en unos momentos")
+        with self._candado:
+            self._ocupados[id(trabajador)] = trabajador
+
+        reemplazar = False
+        try:
+            trabajador.conexion.send((ruta, limpiar_codigo(codigo)))
+            while True:
+                if trabajador.conexion.poll(0.1):
+                    _, texto = trabajador.conexion.recv()
+                    return texto
+                if not trabajador.proceso.is_alive():
+                    reemplazar = True
+                    return "Error: el proceso de ejecución terminó inesperadamente (posible exceso de memoria)"
+                if cancelado is not None and cancelado.is_set():
+                    reemplazar = True
+                    return "Error: ejecución cancelada"
+                if time.monotonic() - inicio > tiempo_maximo:
+                    reemplazar = True
+                    return f"Error: la ejecución superó el tiempo máximo de {tiempo_maximo:.0f} s"
+        except (EOFError, OSError, BrokenPipeError):
+            reemplazar = True
+            return "Error: se perdió la comunicación con el proceso de ejecución"
+        except BaseException:
+            # Interrupción mientras el trabajador sigue ejecutando: no se puede devolver al grupo
+            reemplazar = True
+            raise
+        finally:
+            with self._candado:
+                self._ocupados.pop(id(trabajador), None)
+            if reemplazar:
+                trabajador.terminar()
+                trabajador = _Trabajador(self._contexto, self.memoria_mb)
+            self._libres.put(trabajador)
+
+    def cancelar_todo(self):
+        """Termina los trabajadores ocupados; sus ejecuciones devuelven error y se reemplazan"""
+        with self._candado:
+            ocupados = list(self._ocupados.values())
+        for trabajador in ocupados:
+            trabajador.proceso.terminate()
+
+    def cerrar(self):
+        while not self._libres.empty():
+            self._libres.get_nowait().terminar()
@@ -1,156 +1,260 @@
+import os
+import time
+
 import streamlit as st
-import pyodbc
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
+
+from base_datos import cadena_odbc, mostrar_consultas, obtener_pool
+from cache_revalidado import CacheRevalidado
+from ordenes_servicio import ModeloOrdenes, OrdenesIncrementales
 
-# Configuración de la conexión a la base de datos usando st.secrets
+# Grupo de conexiones compartido por el proceso, configurado con st.secrets
 def get_db_connection():
     try:
-        conn_str = (
-            f"DRIVER={st.secrets['db_credentials']['driver']};"
-            f"SERVER={st.secrets['db_credentials']['server']};"
-            f"DATABASE={st.secrets['db_credentials']['database']};"
-            f"UID={st.secrets['db_credentials']['uid']};"
-            f"PWD={st.secrets['db_credentials']['pwd']};"
-        )
-        conn = pyodbc.connect(conn_str)
-        return conn
-    except pyodbc.Error as e:
-        st.error(f"Error de conexión a la base de datos: {e}")
+        credenciales = st.secrets['db_credentials']
+        return obtener_pool(cadena_odbc(
+            credenciales['server'],
+            credenciales['database'],
+            credenciales['uid'],
+            credenciales['pwd'],
+            driver=credenciales['driver'],
+        ))
+    except KeyError as e:
+        st.error(f"Falta la configuración de la base de datos en los secretos: {e}")
         return None
 
-# Función para ejecutar la consulta y obtener los datos
-def get_data(conn):
-    query = """
-    SELECT 
-        c.CodDocumento AS OS_OT,
-        i.CoddocOrdenProduccion AS OP,
-        MAX(d.NommaeAnexoProveedor) AS PROVEEDOR,
-        MAX(w.NommaeEstilo) AS ESTILO,
-        MAX(z.dMinutos) AS MIN_COST,
-        MAX(z.dMinutos) * SUM(a.dCantidadProgramado - a.dCantidadProducido) AS MIN_PEND,
-        SUM(a.dCantidadProgramado) AS PROG,
-        SUM(a.dCantidadProducido) AS PROD,
-        SUM(a.dCantidadProgramado - a.dCantidadProducido) AS PENDIENT,
-        MAX(dbo.fneFechaRegistroMaximo_NotaInventario_Documento(
-            131,  -- @IdtdDocumentoForm_NotaInventario_IngresoProduccion
-            a.IdDocumento,
-            a.IdmaeItem_Inventario)) AS MAX_ING,
-        MIN(dbo.fneFechaRegistroMinimo_NotaInventario_Documento(
-            130,  -- @IdtdDocumentoForm_NotaInventario_SalidaProduccion
-            a.IdDocumento,
-            a.IdmaeItem_Inventario)) AS MIN_SAL,
-        ISNULL(DATEDIFF(DAY, MIN(dbo.fneFechaRegistroMinimo_NotaInventario_Documento(
-            130,  -- @IdtdDocumentoForm_NotaInventario_SalidaProduccion
-            a.IdDocumento,
-            a.IdmaeItem_Inventario)), GETDATE()), 0) AS DIAS_DESDE_MIN_SAL,
-        MAX(k.NommaeAnexoCliente) AS CLIENTE,
-        MAX(v.CoddocOrdenVenta) AS PEDIDO,
-        MIN(i.dtFechaEntrega) AS F_ENT
-    FROM (
-        SELECT 
-            a.IdDocumento,
-            a.IdmaeItem_Inventario,
-            a.dCantidadProgramado,
-            a.dCantidadProducido
-        FROM dbo.fntOrdenItem_Seguimiento_ServicioProduccion_Historico(13) a  -- @IdFiltro
-    ) a
-    INNER JOIN dbo.fntDocumento_Produccion() c
-        ON a.IdDocumento = c.IdDocumento
-    INNER JOIN dbo.maeAnexoProveedor d WITH (NOLOCK)
-        ON c.IdmaeAnexo = d.IdmaeAnexo_Proveedor
-    INNER JOIN dbo.maeItemInventario e WITH (NOLOCK)
-        ON a.IdmaeItem_Inventario = e.IdmaeItem_Inventario
-    INNER JOIN dbo.maeUnidadMedida f WITH (NOLOCK)
-        ON e.IdmaeUnidadMedida_Almacen = f.IdmaeUnidadMedida
-    INNER JOIN dbo.maeCombo g WITH (NOLOCK)
-        ON e.IdmaeCombo = g.IdmaeCombo
-    INNER JOIN dbo.docOrdenProduccion i WITH (NOLOCK)
-        ON c.IdDocumento_Referencia = i.IdDocumento_OrdenProduccion
-    INNER JOIN dbo.maeCentroCosto j WITH (NOLOCK)
-        ON c.IdmaeCentroCosto = j.IdmaeCentroCosto
-    INNER JOIN dbo.maeAnexoCliente k WITH (NOLOCK)
-        ON i.IdmaeAnexo_Cliente = k.IdmaeAnexo_Cliente 
-    INNER JOIN dbo.docOrdenVenta v WITH (NOLOCK) 
-        ON i.IdDocumento_Referencia = v.IdDocumento_OrdenVenta
-    INNER JOIN dbo.maeEstilo w WITH (NOLOCK) 
-        ON e.IdmaeEstilo = w.IdmaeEstilo
-    INNER JOIN dbo.maeEstiloRuta z WITH (NOLOCK) 
-        ON e.IdmaeEstilo = z.IdmaeEstilo AND z.idmaeCentroCosto = 47
-    WHERE j.IdmaeCentroCosto = 47
-    GROUP BY c.CodDocumento, i.CoddocOrdenProduccion
-    ORDER BY c.CodDocumento;
-    """
+TTL_ORDENES = int(os.environ.get('GANTT_TTL_SEGUNDOS', '300'))
+
+# Órdenes y resultado compartidos por todas las sesiones; al vencer se actualizan en segundo plano
+@st.cache_resource(show_spinner=False)
+def obtener_cache_ordenes(_pool):
+    ordenes = OrdenesIncrementales(_pool)
+    # El modelo indexado se arma una vez por actualización, no en cada rerun
+    return ordenes, CacheRevalidado(lambda: ModeloOrdenes(ordenes.actualizar()), ttl_segundos=TTL_ORDENES)
+
+def get_data(cache, forzar=False):
     try:
-        df = pd.read_sql(query, conn)
-        return df
+        modelo, estado = cache.obtener(forzar)
+        return modelo, estado
     except Exception as e:
         st.error(f"Error al ejecutar la consulta: {e}")
-        return pd.DataFrame()
+        return None, None
+
+def mostrar_estado_cache(estado):
+    texto = (f"Datos de hace {estado['edad']:.0f} s (vencen a los {estado['ttl']} s) · "
+             f"última actualización: {estado['ultima_duracion']:.1f} s")
+    if estado['actualizando']:
+        texto += " · actualizando en segundo plano…"
+    st.caption(texto)
+    if estado['error']:
+        st.warning(f"La última actualización falló, se muestran los datos anteriores: {estado['error']}")
+
+# Columnas de las órdenes que se muestran en el gráfico
+COLUMNAS_HOVER = ["PENDIENT", "MIN_SAL", "OP"]
+COLUMNAS_FIGURA = ["PROVEEDOR", "CLIENTE", "MIN_PEND", "OS_OT"] + COLUMNAS_HOVER
+
+# Por encima de esta cantidad de barras no se escribe el código de la OS dentro de cada una
+MAX_ETIQUETAS = 60
+
+MODO_RESUMEN = "Resumen por proveedor y cliente"
+MODO_PROVEEDOR = "Órdenes de un proveedor"
+MODO_TODAS = "Todas las órdenes"
+
+def resumir_ordenes(df_sorted):
+    """Una fila por proveedor y cliente con los minutos y prendas pendientes y la cantidad de OS"""
+    return df_sorted.groupby(['PROVEEDOR', 'CLIENTE'], observed=True, sort=True).agg(
+        MIN_PEND=('MIN_PEND', 'sum'),
+        PENDIENT=('PENDIENT', 'sum'),
+        ORDENES=('OS_OT', 'size'),
+    ).reset_index()
+
+def crear_figura_resumen(resumen):
+    """Barras apiladas por cliente con un segmento por proveedor, en lugar de uno por OS"""
+    fig = go.Figure()
+    for cliente, grupo in resumen.groupby('CLIENTE', observed=True, sort=True):
+        fig.add_trace(go.Bar(
+            x=grupo['MIN_PEND'].to_numpy(),
+            y=grupo['PROVEEDOR'].astype(str).to_numpy(),
+            orientation='h',
+            name=str(cliente),
+            customdata=grupo[['ORDENES', 'PENDIENT']].to_numpy(),
+            hovertemplate=(f"Cliente={cliente}<br>MIN_PEND=%{{x}}<br>OS=%{{customdata[0]}}"
+                           "<br>PENDIENT=%{customdata[1]}<extra></extra>"),
+        ))
+    proveedores = sorted(resumen['PROVEEDOR'].astype(str).unique())
+    fig.update_layout(
+        barmode='stack',
+        title="Minutos pendientes por proveedor y cliente",
+        xaxis_title="MIN_PEND",
+        yaxis_title="Proveedor",
+        yaxis={'categoryorder': 'array', 'categoryarray': proveedores},
+        legend_title_text="Cliente",
+        showlegend=True,
+        margin=dict(l=50, r=50, b=100, t=100, pad=10)
+    )
+    return fig
+
+def medir_figura(fig):
+    """Tamaño en KB del JSON que se envía al navegador y milisegundos en serializarlo"""
+    inicio = time.perf_counter()
+    carga = len(fig.to_json())
+    return carga / 1024, (time.perf_counter() - inicio) * 1000
+
+def crear_figura(df_sorted):
+    # Crear el gráfico de barras horizontales (sin categorías vacías, que agregarían series a la leyenda)
+    fig = px.bar(
+        df_sorted.astype({"PROVEEDOR": str, "CLIENTE": str}),
+        x="MIN_PEND",       # Eje X: Tamaño de la barra basado en MIN_PEND (redondeado)
+        y="PROVEEDOR",      # Eje Y: Proveedor
+        color="CLIENTE",    # Color por cliente
+        title="OS por servicio (Ancho de barras proporcional a minutos de costura)",
+        labels={
+            "MIN_PEND": "MIN_PEND",
+            "PROVEEDOR": "Proveedor",
+            "CLIENTE": "Cliente"
+        },
+        text="OS_OT",       # Mostrar el código de la orden (OS_OT) en las barras
+        hover_data={
+            "PENDIENT": True,  # Mostrar PENDIENT en el hover
+            "MIN_SAL": True,   # Mostrar MIN_SAL en el hover (formato corto)
+            "OP": True,        # Mostrar OP en el hover
+            "PROVEEDOR": False  # Ocultar PROVEEDOR en el hover
+        }
+    )
+
+    # Personalizar el gráfico; con muchas barras las etiquetas no se leen y solo se ocultan:
+    # el texto se conserva porque el hover muestra la OS con %{text}
+    if len(df_sorted) > MAX_ETIQUETAS:
+        fig.update_traces(textposition='none')
+    else:
+        fig.update_traces(
+            textposition='inside',  # Mover el texto dentro de las barras
+            insidetextanchor='middle'  # Centrar el texto dentro de las barras
+        )
+    fig.update_layout(
+        xaxis_title="MIN_PEND",  # Título del eje X
+        yaxis_title="Proveedor",
+        showlegend=True,
+        margin=dict(l=50, r=50, b=100, t=100, pad=10)  # Ajustar los márgenes
+    )
+
+    return fig
+
+def huellas_por_cliente(df_sorted):
+    filas = pd.util.hash_pandas_object(df_sorted[COLUMNAS_FIGURA].astype({"PROVEEDOR": str, "CLIENTE": str}),
+                                       index=False)
+    return filas.groupby(df_sorted['CLIENTE'].to_numpy(), sort=False).sum()
+
+def actualizar_figura(fig, anterior, df_sorted):
+    """
+    Reemplaza en la figura solo las barras de los clientes cuyas órdenes cambiaron.
+    Devuelve la cantidad de clientes actualizados, o None si hay que crear la figura de nuevo.
+    """
+    # Si cambia si se muestran o no las etiquetas, cambian todas las series
+    if (len(anterior) > MAX_ETIQUETAS) != (len(df_sorted) > MAX_ETIQUETAS):
+        return None
+    huellas_anteriores = huellas_por_cliente(anterior)
+    huellas = huellas_por_cliente(df_sorted)
+    # Un cliente nuevo o que ya no está cambia las series y la leyenda
+    if set(huellas.index) != set(huellas_anteriores.index):
+        return None
+    cambiados = set(huellas.index[huellas.ne(huellas_anteriores.reindex(huellas.index))])
+    for trace in fig.data:
+        if trace.name in cambiados:
+            ordenes = df_sorted[df_sorted['CLIENTE'] == trace.name]
+            trace.update(
+                x=ordenes['MIN_PEND'].to_numpy(),
+                y=ordenes['PROVEEDOR'].astype(str).to_numpy(),
+                text=ordenes['OS_OT'].to_numpy(),
+                customdata=ordenes[COLUMNAS_HOVER].to_numpy(),
+            )
+    return len(cambiados)
 
 # Función principal de la aplicación Streamlit
 def main():
     st.title("Visualización de Datos de Producción")
 
-    # Conectar a la base de datos
-    conn = get_db_connection()
-    if conn:
-        # Obtener los datos
-        df = get_data(conn)
-        if not df.empty:
-            # Filtrar los registros donde PENDIENT sea mayor a 4
-            df_filtered = df[df['PENDIENT'] > 4]
-
-            # Ordenar los datos por PROVEEDOR y DIAS_DESDE_MIN_SAL
-            df_sorted = df_filtered.sort_values(by=['PROVEEDOR', 'DIAS_DESDE_MIN_SAL'], ascending=[True, False])
-
-            # Redondear MIN_PEND a enteros
-            df_sorted['MIN_PEND'] = df_sorted['MIN_PEND'].round().astype(int)
-
-            # Formatear MIN_SAL en formato corto (solo la fecha)
-            df_sorted['MIN_SAL'] = pd.to_datetime(df_sorted['MIN_SAL']).dt.strftime('%Y-%m-%d')
-
-            # Truncar los nombres de los clientes a los primeros 15 caracteres
-            df_sorted['CLIENTE'] = df_sorted['CLIENTE'].str.slice(0, 15)
-
-            # Crear el gráfico de barras horizontales
-            fig = px.bar(
-                df_sorted,
-                x="MIN_PEND",       # Eje X: Tamaño de la barra basado en MIN_PEND (redondeado)
-                y="PROVEEDOR",      # Eje Y: Proveedor
-                color="CLIENTE",    # Color por cliente
-                title="OS por servicio (Ancho de barras proporcional a minutos de costura)",
-                labels={
-                    "MIN_PEND": "MIN_PEND",
-                    "PROVEEDOR": "Proveedor",
-                    "CLIENTE": "Cliente"
-                },
-                text="OS_OT",       # Mostrar el código de la orden (OS_OT) en las barras
-                hover_data={
-                    "PENDIENT": True,  # Mostrar PENDIENT en el hover
-                    "MIN_SAL": True,   # Mostrar MIN_SAL en el hover (formato corto)
-                    "OP": True,        # Mostrar OP en el hover
-                    "PROVEEDOR": False  # Ocultar PROVEEDOR en el hover
-                }
-            )
+    # Tomar el grupo de conexiones (las conexiones se reutilizan entre reruns)
+    pool = get_db_connection()
+    if pool:
+        ordenes, cache = obtener_cache_ordenes(pool)
+        with st.sidebar:
+            # El caché y las órdenes son de todo el proceso: solo se cambian cuando el usuario mueve el control,
+            # no en cada rerun con el valor que tenía esta sesión
+            st.number_input("Vigencia de los datos (segundos)", min_value=10, value=cache.ttl_segundos, step=30,
+                            key="ttl_ordenes",
+                            on_change=lambda: setattr(cache, 'ttl_segundos', st.session_state.ttl_ordenes))
+            st.checkbox("Actualización incremental", value=ordenes.incremental, key="ordenes_incremental",
+                        help="Vuelve a consultar solo las órdenes con notas nuevas",
+                        on_change=lambda: setattr(ordenes, 'incremental', st.session_state.ordenes_incremental))
+            forzar = st.button("Actualizar ahora")
+            if forzar:
+                ordenes.pedir_carga_completa()
 
-            # Personalizar el gráfico
-            fig.update_traces(
-                textposition='inside',  # Mover el texto dentro de las barras
-                insidetextanchor='middle'  # Centrar el texto dentro de las barras
-            )
-            fig.update_layout(
-                xaxis_title="MIN_PEND",  # Título del eje X
-                yaxis_title="Proveedor",
-                showlegend=True,
-                margin=dict(l=50, r=50, b=100, t=100, pad=10)  # Ajustar los márgenes
-            )
+        # Obtener los datos (desde el caché si siguen vigentes); las OS con 4 o menos pendientes ya vienen filtradas
+        modelo, estado = get_data(cache, forzar)
+        if estado:
+            mostrar_estado_cache(estado)
+            detalle = ordenes.ultimo_detalle
+            if detalle:
+                st.caption(f"Última actualización {detalle['tipo']}: "
+                           f"{detalle['ordenes_cambiadas']} de {detalle['ordenes']} órdenes consultadas")
+        if modelo is not None and not modelo.base.empty:
+            # Los filtros se aplican sobre el modelo en memoria, sin consultar la base de datos
+            with st.sidebar:
+                st.subheader("Filtros")
+                proveedores = st.multiselect("Proveedor", modelo.proveedores)
+                clientes = st.multiselect("Cliente", modelo.clientes)
+                primera, ultima = modelo.rango_f_ent()
+                rango = st.date_input("Fecha de entrega", value=(primera, ultima)) if primera else ()
+            desde, hasta = (rango[0], rango[-1]) if rango and rango != (primera, ultima) else (None, None)
+            inicio = time.perf_counter()
+            df_sorted = modelo.filtrar(proveedores, clientes, desde, hasta)
+            st.caption(f"{len(df_sorted)} de {len(modelo.base)} órdenes · "
+                       f"filtrado en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+            if df_sorted.empty:
+                st.info("Ninguna orden cumple los filtros seleccionados")
+            else:
+                with st.sidebar:
+                    modo = st.radio("Detalle del gráfico", [MODO_RESUMEN, MODO_PROVEEDOR, MODO_TODAS])
+                    if modo == MODO_PROVEEDOR:
+                        proveedor = st.selectbox("Proveedor a detallar",
+                                                 sorted(df_sorted['PROVEEDOR'].astype(str).unique()))
+                inicio = time.perf_counter()
+                if modo == MODO_RESUMEN:
+                    # Por defecto se agrega por proveedor y cliente: pocas barras aunque haya miles de OS
+                    resumen = resumir_ordenes(df_sorted)
+                    barras = len(resumen)
+                    fig = crear_figura_resumen(resumen)
+                else:
+                    if modo == MODO_PROVEEDOR:
+                        df_sorted = df_sorted[df_sorted['PROVEEDOR'] == proveedor]
+                    barras = len(df_sorted)
+                    # Si ya hay un gráfico de este detalle, solo se actualizan las barras de los clientes con cambios
+                    clave = (modo, proveedor if modo == MODO_PROVEEDOR else None)
+                    actualizados = None
+                    if st.session_state.get("clave_figura") == clave:
+                        fig = st.session_state.figura_ordenes
+                        actualizados = actualizar_figura(fig, st.session_state.datos_figura, df_sorted)
+                    if actualizados is None:
+                        fig = crear_figura(df_sorted)
+                    elif actualizados:
+                        st.caption(f"Gráfico actualizado para {actualizados} clientes con cambios")
+                    st.session_state.clave_figura = clave
+                    st.session_state.figura_ordenes = fig
+                    st.session_state.datos_figura = df_sorted
+                construccion = (time.perf_counter() - inicio) * 1000
 
-            # Mostrar el gráfico en Streamlit
-            st.plotly_chart(fig)
+                # Mostrar el gráfico en Streamlit
+                st.plotly_chart(fig)
+                kilobytes, serializacion = medir_figura(fig)
+                st.caption(f"Gráfico: {barras} barras · {kilobytes:,.0f} KB · armado en {construccion:.0f} ms · "
+                           f"serializado en {serializacion:.0f} ms")
 
-        # Cerrar la conexión a la base de datos
-        conn.close()
+        with st.expander("Consultas a la base de datos"):
+            mostrar_consultas(pool)
 
 if __name__ == "__main__":
     main()
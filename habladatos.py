@@ -1,7 +1,10 @@
 import streamlit as st
-import pandas as pd
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_groq import ChatGroq
+
+from agente_datos import (MODELO_POR_DEFECTO, RespuestaEnVivo, mostrar_estadisticas_cache, obtener_agente,
+                          obtener_cache_respuestas, obtener_llm, obtener_perfil)
+from ingesta import compact_dataframe, file_fingerprint, load_table
+from memoria_chat import (PRESUPUESTO_POR_DEFECTO, TURNOS_RECIENTES_POR_DEFECTO, construir_contexto, nuevo_estado,
+                          resumidor_llm, tokens_mensajes)
 
 
 def reiniciarChat():
@@ -13,17 +16,20 @@ def reiniciarChat():
         st.session_state.messages = []
         promtpSistema = "Vas a actuar como un analista de datos experto, dando siempre respuestas claras y concretas y siempre en idioma español, si te piden tablas o listas, las generas siempre en markdown"
         st.session_state.messages.append({"role": "system", "content": promtpSistema})
+        st.session_state.memoria = nuevo_estado()
 
 
-llm = ChatGroq(
-    model="llama3-70b-8192",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    api_key=st.secrets["GROQ_API"],
+@st.cache_resource(show_spinner=False, max_entries=4)
+def cargarDatos(huella, compactar, _archivo):
+    """Carga el archivo una sola vez por contenido, el DataFrame se comparte entre reruns y sesiones.
+    Si se pide, se compacta en memoria antes de crear el agente.
+    """
+    df = load_table(_archivo)
+    if compactar:
+        return compact_dataframe(df)
+    memoria = int(df.memory_usage(deep=True).sum())
+    return df, {'before': memoria, 'after': memoria}
 
-)
 
 # Definimos los parámetros de configuración de la aplicación
 st.set_page_config(
@@ -39,19 +45,39 @@ st.header('Habla con tus datos')
 with st.sidebar:
     st.subheader('Parámetros')
     archivo_cargado = st.file_uploader("Elige un archivo", type=['csv', 'xls', 'xlsx'], on_change=reiniciarChat)
+    parCompactar = st.checkbox("Compactar datos en memoria", value=False,
+                               help="Usa categorías, textos Arrow, números más chicos y fechas al cargar el archivo")
     parUsarMemoria = st.checkbox("Recordar la conversacion", value=True)
+    if parUsarMemoria:
+        # Los turnos más antiguos se resumen para no superar el presupuesto de tokens
+        parPresupuestoTokens = st.slider("Presupuesto de tokens del historial", 500, 8000,
+                                         PRESUPUESTO_POR_DEFECTO, step=250)
+        parTurnosRecientes = st.slider("Turnos recientes sin resumir", 1, 10, TURNOS_RECIENTES_POR_DEFECTO)
+    parIgnorarCache = st.checkbox("Ignorar respuestas guardadas", value=False,
+                                  help="Consulta siempre al modelo, aunque la pregunta ya tenga respuesta en caché")
+    cacheRespuestas = obtener_cache_respuestas()
+    with st.expander("Caché de respuestas"):
+        mostrar_estadisticas_cache(cacheRespuestas)
     # Si existe un archivo cargado ejecutamos el código
     if archivo_cargado is not None:
-        # Se puede cargar con pandas si se tiene detectado el tipo de archivo
-        if '.csv' in archivo_cargado.name:
-            df = pd.read_csv(archivo_cargado)
-        elif '.xls' in archivo_cargado.name:
-            df = pd.read_excel(archivo_cargado)
-        # Creamos el agente con el dataframe
-        agent = create_pandas_dataframe_agent(llm, df, allow_dangerous_code=True)
+        # Se carga desde el caché de ingesta; el tipo de archivo se detecta por la extensión
+        huellaArchivo = file_fingerprint(archivo_cargado)
+        df, memoriaDatos = cargarDatos(huellaArchivo, parCompactar, archivo_cargado)
+        st.caption(f"Memoria del dataset: {memoriaDatos['before'] / 1024 ** 2:,.1f} MB"
+                   + (f" → {memoriaDatos['after'] / 1024 ** 2:,.1f} MB compactado" if parCompactar else ""))
+        # Los datos compactados tienen otros tipos: el agente y el perfil se guardan aparte
+        if parCompactar:
+            huellaArchivo = f"{huellaArchivo}-compacto"
+        # Obtenemos el agente del caché (se crea solo la primera vez para este archivo y modelo)
+        agent = obtener_agente(huellaArchivo, MODELO_POR_DEFECTO, 0, _df=df)
+        # El perfil se calcula una vez por archivo y se entrega al agente en su prompt
+        with st.expander("Perfil de los datos"):
+            st.markdown(obtener_perfil(huellaArchivo, df))
     # Inicializamos el historial de chat
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "memoria" not in st.session_state:
+    st.session_state.memoria = nuevo_estado()
 
 # Muestra mensajes de chat desde la historia en la aplicación cada vez que la aplicación se ejecuta
 with st.container():
@@ -68,15 +94,15 @@ if prompt:
     st.chat_message("user").markdown(prompt)
     # Agregar mensaje de usuario al historial de chat
     st.session_state.messages.append({"role": "user", "content": prompt})
-    # Si requerimos usar la memoria entregamos siempre el historial de chat
+    # Si requerimos usar la memoria entregamos el prompt de sistema, el resumen y los últimos turnos
     if parUsarMemoria:
-        messages = [
-            {
-                "role": m["role"],
-                "content": m["content"]
-            }
-            for m in st.session_state.messages
-        ]
+        messages, tokensEnviados = construir_contexto(
+            st.session_state.messages,
+            st.session_state.memoria,
+            resumir=resumidor_llm(obtener_llm()),
+            turnos_recientes=parTurnosRecientes,
+            presupuesto_tokens=parPresupuestoTokens
+        )
     else:
         # Si no se usa la memoria solo se entrega el prompt de sistema y la consulta del usuario
         messages = [
@@ -86,11 +112,19 @@ if prompt:
             }
             for m in [st.session_state.messages[0], st.session_state.messages[-1]]
         ]
-    respuesta = agent.run(messages)
-
-    # Mostrar respuesta del asistente en el contenedor de mensajes de chat
+        tokensEnviados = tokens_mensajes(messages)
+    # Mostrar respuesta del asistente en el contenedor de mensajes de chat a medida que se genera
     with st.chat_message("assistant"):
-        # Mostramos la respuesta
-        st.write(respuesta)
+        respuestaEnVivo = RespuestaEnVivo(st)
+        # Las preguntas repetidas sobre el mismo archivo se responden desde el caché
+        llaveCache = cacheRespuestas.llave(huellaArchivo, prompt, messages[:-1])
+        respuesta, desdeCache = cacheRespuestas.responder(
+            llaveCache,
+            lambda: agent.run(messages, callbacks=[respuestaEnVivo]),
+            parIgnorarCache
+        )
+        # Mostramos la respuesta final
+        respuestaEnVivo.finalizar(respuesta, desdeCache)
+        st.caption(f"Tokens del historial enviado: {tokensEnviados}")
         # Agregar respuesta de asistente al historial de chat
     st.session_state.messages.append({"role": "assistant", "content": respuesta})
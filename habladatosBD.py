@@ -1,8 +1,17 @@
+import datetime
+
 import streamlit as st
 import pandas as pd
-import pyodbc
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_groq import ChatGroq
+
+from agente_datos import (RespuestaEnVivo, mostrar_estadisticas_cache, obtener_agente, obtener_cache_respuestas,
+                          obtener_llm, obtener_perfil)
+from base_datos import cadena_odbc, mostrar_consultas, obtener_pool
+from ingesta import dataframe_fingerprint
+from memoria_chat import (PRESUPUESTO_POR_DEFECTO, TURNOS_RECIENTES_POR_DEFECTO, construir_contexto, nuevo_estado,
+                          resumidor_llm)
+from produccion import (PROCESOS, AlmacenProduccion, consultar_produccion, consultar_produccion_paralela,
+                        consultar_rama, fin_del_dia)
+from rutas_rapidas import etiqueta_proceso, preparar_datos, responder_rapido
 
 def reiniciar_chat():
     """Reinicia el historial del chat"""
@@ -13,185 +22,83 @@ def reiniciar_chat():
         "role": "system",
         "content": "Vas a actuar como un analista de datos experto, dando siempre respuestas claras y concretas en español. Si te piden tablas o listas, las generas en markdown."
     })
-
-def obtener_datos(fecha_inicio, fecha_fin):
+    st.session_state.memoria = nuevo_estado()
+
+def mostrar_respuesta_rapida(rapida):
+    """Muestra una respuesta calculada directamente con pandas"""
+    st.markdown(rapida["texto"])
+    if rapida["grafico"] is not None:
+        if rapida["tipo_grafico"] == "line":
+            st.line_chart(rapida["grafico"])
+        else:
+            st.bar_chart(rapida["grafico"])
+    if rapida["tabla"] is not None:
+        st.dataframe(rapida["tabla"], use_container_width=True)
+    st.caption("⚡ Respuesta calculada directamente, sin consultar al modelo")
+
+
+def texto_respuesta_rapida(rapida, max_filas=30):
+    """Texto que se guarda en el historial: la respuesta y, si es corta, su tabla en markdown"""
+    if rapida["tabla"] is not None and len(rapida["tabla"]) <= max_filas:
+        return rapida["texto"] + "\n\n" + rapida["tabla"].to_markdown()
+    return rapida["texto"]
+
+def obtener_pool_produccion():
+    """Grupo de conexiones a SQL Server compartido entre reruns y sesiones"""
+    return obtener_pool(cadena_odbc(
+        st.secrets['server'],
+        st.secrets['database'],
+        st.secrets['username'],
+        st.secrets['password']
+    ), tamano=len(PROCESOS))
+
+@st.cache_resource(show_spinner=False)
+def obtener_almacen_produccion():
+    """Almacén local por día de las filas de producción"""
+    return AlmacenProduccion()
+
+@st.cache_data(show_spinner=False, ttl=600, max_entries=256)
+def consultar_rama_cacheada(proceso, fecha_inicio, fecha_fin):
+    """Suma diaria de un proceso, guardada por separado para cada proceso y rango"""
+    return consultar_rama(obtener_pool_produccion(), proceso, fecha_inicio, fecha_fin)
+
+def obtener_datos(fecha_inicio, fecha_fin, usar_almacen=True, en_paralelo=False):
     """Ejecuta la consulta SQL y devuelve un DataFrame"""
-    consulta = """
-    ;WITH ProductionCTE AS (
-        Select 
-            convert(date,sc.Fecha) as Fecha, 
-            convert(int,sum(sc.Kg_Hilado)) AS Produccion_Hilado,
-            convert(int,sum(sc.Kg_Tejido)) AS Produccion_Tejido,
-            convert(int,sum(sc.Kg_Armados)) AS Produccion_Armado,
-            convert(int,sum(sc.Kg_Teñidos)) AS Produccion_Teñido,
-            convert(int,sum(sc.Unid_Cortadas)) AS Produccion_Corte,
-            convert(int,sum(Unid_Cosidas)) AS Produccion_Costura
-        From
-        (
-            -- Hilado
-            select 
-                b.dtFechaRegistro AS Fecha, 
-                a.dCantidadIng AS Kg_Hilado, 
-                0 AS Kg_Tejido, 
-                0 AS Kg_Armados,
-                0 AS Kg_Teñidos,
-                0 AS Unid_Cortadas,
-                0 AS Unid_Cosidas
-            from docNotaInventarioItem a 
-            inner join docNotaInventario b
-            on b.IdDocumento_NotaInventario = a.IdDocumento_NotaInventario
-            where a.IdtdItemForm=19 
-            and a.dCantidadIng>0 
-            and a.IdmaeCentroCosto=7 
-            and b.IdtdDocumentoForm=1 
-            and b.IdmaeArea_Almacen=6 
-            and b.dtFechaRegistro BETWEEN ? AND ?
-
-            union all
-
-            -- Tejido
-            select 
-                dtFechaEmision, 
-                0 AS Kg_Hilado, 
-                dpeso as Kg_Tejido, 
-                0 AS Kg_Armados,
-                0 AS Kg_Teñidos,
-                0 AS Unid_Cortadas,
-                0 AS Unid_Cosidas
-            from docOrdenProduccionRollo
-            where dtFechaEmision BETWEEN ? AND ?
-
-            union all
-
-            -- Partidas armadas
-            select 
-                dtFechaEmision,  
-                0 AS Kg_Hilado, 
-                0 as Kg_Tejido, 
-                dCantidad AS Kg_Armados,
-                0 AS Kg_Teñidos,
-                0 AS Unid_Cortadas,
-                0 AS Unid_Cosidas
-            from docOrdenProduccion
-            where IdtdDocumentoForm=138 
-            and bAnulado=0
-            and dtFechaEmision BETWEEN ? AND ?
-
-            union all
-
-            -- Teñido
-            select  
-                cast(convert(char(8), Fechacerrado, 112) as datetime) AS Fecha, 
-                0 AS Kg_Hilado, 
-                0 as Kg_Tejido, 
-                0 AS Kg_Armados,
-                dCantidad AS Kg_Teñidos,
-                0 AS Unid_Cortadas,
-                0 AS Unid_Cosidas
-            from docOrdenProduccion
-            where IdtdDocumentoForm=138 
-            and bAnulado=0 
-            and bCerrado=1
-            and cast(convert(char(8), Fechacerrado, 112) as datetime) BETWEEN ? AND ?
-
-            union all
-
-            -- Corte
-            SELECT  
-                a.dtFechaRegistro,
-                0 AS Kg_Hilado, 
-                0 as Kg_Tejido, 
-                0 AS Kg_Armados,
-                0 AS Kg_Teñidos,
-                b.dCantidadIng AS Unid_Cortadas,
-                0 AS Unid_Cosidas
-            FROM dbo.docNotaInventario a 
-            INNER JOIN dbo.docNotaInventarioItem b      
-                ON a.IdDocumento_NotaInventario = b.IdDocumento_NotaInventario     
-                AND b.dCantidadIng <> 0     
-            INNER JOIN dbo.docOrdenProduccion c    
-                ON a.IdDocumento_OrdenProduccion = c.IdDocumento_OrdenProduccion    
-                AND c.bCerrado = 0      
-                AND c.bAnulado = 0    
-                AND c.IdtdDocumentoForm = 127
-            WHERE (a.IdtdDocumentoForm = 131)
-                AND (a.bDevolucion = 0)      
-                AND (a.bDesactivado = 0)      
-                AND (a.bAnulado = 0)      
-                AND (a.IdDocumento_OrdenProduccion <> 0) 
-                and a.dtFechaRegistro BETWEEN ? AND ?
-                and a.IdmaeCentroCosto=29
-
-            union all
-
-            -- Costura
-            SELECT  
-                a.dtFechaRegistro, 
-                0 AS Kg_Hilado, 
-                0 as Kg_Tejido, 
-                0 AS Kg_Armados,
-                0 AS Kg_Teñidos,
-                0 AS Unid_Cortadas,
-                b.dCantidadIng AS Unid_Cosidas  
-            FROM dbo.docNotaInventario a 
-            INNER JOIN dbo.docNotaInventarioItem b      
-                ON a.IdDocumento_NotaInventario = b.IdDocumento_NotaInventario     
-                AND b.dCantidadIng <> 0     
-            INNER JOIN dbo.docOrdenProduccion c    
-                ON a.IdDocumento_OrdenProduccion = c.IdDocumento_OrdenProduccion    
-                AND c.bCerrado = 0      
-                AND c.bAnulado = 0    
-                AND c.IdtdDocumentoForm = 127
-            WHERE (a.IdtdDocumentoForm = 131)
-                AND (a.bDevolucion = 0)      
-                AND (a.bDesactivado = 0)      
-                AND (a.bAnulado = 0)      
-                AND (a.IdDocumento_OrdenProduccion <> 0) 
-                and a.dtFechaRegistro BETWEEN ? AND ?
-                and a.IdmaeCentroCosto=47
-        ) sc
-        group by sc.Fecha
-    )
-    SELECT 
-        Fecha,
-        Proceso,
-        Cantidad
-    FROM ProductionCTE
-    UNPIVOT
-    (
-        Cantidad FOR Proceso IN 
-        (
-            Produccion_Hilado,
-            Produccion_Tejido,
-            Produccion_Armado,
-            Produccion_Teñido,
-            Produccion_Corte,
-            Produccion_Costura
-        )
-    ) AS UnpivotedData
-    ORDER BY Fecha, Proceso;
-    """
-    
     try:
-        connection_string = (
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={st.secrets['server']};"
-            f"DATABASE={st.secrets['database']};"
-            f"UID={st.secrets['username']};"
-            f"PWD={st.secrets['password']}"
-        )
-        
-        conn = pyodbc.connect(connection_string)
-        
-        # Crear lista de parámetros (6 pares de fechas)
-        params = [fecha_inicio, fecha_fin] * 6
-        
-        df = pd.read_sql(consulta, conn, params=params)
-        conn.close()
+        pool = obtener_pool_produccion()
+        tiempos = []
+
+        def consultar(inicio, fin):
+            if not en_paralelo:
+                return consultar_produccion(pool, inicio, fin)
+            # Una consulta por proceso, en paralelo; el resultado se arma igual que la consulta única.
+            # Los días recientes todavía cambian: esos tramos no pasan por el caché por proceso
+            limite_reciente = datetime.date.today() - datetime.timedelta(days=obtener_almacen_produccion().dias_recientes)
+            if pd.Timestamp(fin).date() >= limite_reciente:
+                consultar_proceso = lambda proceso, desde, hasta: consultar_rama(pool, proceso, desde, hasta)
+            else:
+                consultar_proceso = consultar_rama_cacheada
+            df, segundos = consultar_produccion_paralela(consultar_proceso, inicio, fin)
+            tiempos.append({'Tramo': f"{inicio:%d/%m/%Y} - {fin:%d/%m/%Y}", **segundos})
+            return df
+
+        if usar_almacen:
+            # Solo se consultan los días que faltan en el almacén y los recientes
+            df, detalle = obtener_almacen_produccion().cargar(fecha_inicio, fecha_fin, consultar)
+            st.caption(f"Días consultados: {detalle['dias_consultados']} "
+                       f"({len(detalle['tramos'])} consultas) · días desde el almacén: {detalle['dias_almacen']}")
+        else:
+            # Igual que el almacén: el último día se incluye completo
+            df = consultar(fecha_inicio, fin_del_dia(fecha_fin))
+        if tiempos:
+            st.caption("Segundos por proceso")
+            st.dataframe(pd.DataFrame(tiempos).set_index('Tramo').rename(columns=etiqueta_proceso),
+                         use_container_width=True)
         return df
     except Exception as e:
         st.error(f"Error en la conexión: {str(e)}")
         return None
+
 # Configuración inicial
 st.set_page_config(
     page_title="Análisis de Producción",
@@ -200,31 +107,54 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Inicializar LLM
-llm = ChatGroq(
-    model="llama3-70b-8192",
-    temperature=0,
-    api_key=st.secrets["GROQ_API"],
-)
+# Inicializar LLM (cliente compartido con streaming de tokens)
+llm = obtener_llm()
 
 # Sidebar para parámetros
 with st.sidebar:
     st.header("📅 Rango de Fechas")
     fecha_inicio = st.date_input("Fecha inicial")
     fecha_fin = st.date_input("Fecha final")
+    usar_almacen = st.checkbox("Usar almacén local por día", value=True,
+                               help="Consulta solo los días nuevos o recientes; el resto se lee del disco")
+    en_paralelo = st.checkbox("Consultar procesos en paralelo", value=False,
+                              help="Una consulta por proceso a la vez, cada una con su propio caché")
     
     if st.button("Cargar Datos", use_container_width=True):
         with st.spinner("Conectando con la base de datos..."):
-            df = obtener_datos(fecha_inicio, fecha_fin)
+            df = obtener_datos(fecha_inicio, fecha_fin, usar_almacen, en_paralelo)
             
             if df is not None:
                 st.session_state.df = df
-                st.session_state.agent = create_pandas_dataframe_agent(
-                    llm, df, allow_dangerous_code=True
-                )
+                st.session_state.huella = dataframe_fingerprint(df)
+                st.session_state.df_rapido = preparar_datos(df)
+                # El agente recibe el perfil precalculado de los datos
+                st.session_state.agent = obtener_agente(st.session_state.huella, _df=df)
                 reiniciar_chat()
                 st.success(f"Datos cargados: {len(df)} registros encontrados")
 
+    if "df" in st.session_state:
+        with st.expander("Perfil de los datos"):
+            st.markdown(obtener_perfil(st.session_state.huella, st.session_state.df))
+        with st.expander("Consultas a la base de datos"):
+            mostrar_consultas(obtener_pool_produccion())
+            almacen = obtener_almacen_produccion().estadisticas()
+            st.caption(f"Almacén local: {almacen['dias']} días, {almacen['filas']} filas "
+                       f"({almacen['primer_dia']} a {almacen['ultimo_dia']})")
+
+    usar_rutas_rapidas = st.checkbox("Respuestas rápidas sin IA", value=True,
+                                     help="Totales, tendencias y comparaciones simples se calculan directamente")
+
+    st.header("🧠 Memoria")
+    presupuesto_tokens = st.slider("Presupuesto de tokens del historial", 500, 8000, PRESUPUESTO_POR_DEFECTO, step=250)
+    turnos_recientes = st.slider("Turnos recientes sin resumir", 1, 10, TURNOS_RECIENTES_POR_DEFECTO)
+
+    ignorar_cache = st.checkbox("Ignorar respuestas guardadas", value=False,
+                                help="Consulta siempre al modelo, aunque la pregunta ya tenga respuesta en caché")
+    cache_respuestas = obtener_cache_respuestas()
+    with st.expander("Caché de respuestas"):
+        mostrar_estadisticas_cache(cache_respuestas)
+
 # Interfaz principal
 st.title("📈 Análisis de Producción en Tiempo Real")
 st.caption("Sistema de consulta inteligente de datos de producción")
@@ -252,6 +182,9 @@ if "messages" not in st.session_state:
             "content": "Vas a actuar como un analista de datos experto, dando siempre respuestas claras y concretas en español. Si te piden tablas o listas, las generas en markdown."
         })
 
+if "memoria" not in st.session_state:
+    st.session_state.memoria = nuevo_estado()
+
 # Mostrar mensajes existentes
 for message in st.session_state.messages:
     if message["role"] != "system":  # No mostrar el mensaje de sistema
@@ -267,18 +200,44 @@ if prompt := st.chat_input("Haz tu pregunta sobre la producción"):
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Obtener respuesta
-    with st.chat_message("assistant"):
-        with st.spinner("Analizando..."):
+    # Las preguntas frecuentes se responden directamente sobre el DataFrame
+    rapida = responder_rapido(prompt, st.session_state.df_rapido) if usar_rutas_rapidas else None
+
+    if rapida is not None:
+        with st.chat_message("assistant"):
+            mostrar_respuesta_rapida(rapida)
+        respuesta = texto_respuesta_rapida(rapida)
+    else:
+        # Obtener respuesta del agente, mostrando tokens y pasos intermedios a medida que llegan
+        with st.chat_message("assistant"):
+            respuesta_en_vivo = RespuestaEnVivo(st)
             try:
-                respuesta = st.session_state.agent.run({
-                    "input": prompt,
-                    "chat_history": st.session_state.messages
-                })
-                st.markdown(respuesta)
+                # Historial acotado: prompt de sistema, resumen de turnos antiguos y últimos turnos
+                contexto, tokens_enviados = construir_contexto(
+                    st.session_state.messages + [{"role": "user", "content": prompt}],
+                    st.session_state.memoria,
+                    resumir=resumidor_llm(llm),
+                    turnos_recientes=turnos_recientes,
+                    presupuesto_tokens=presupuesto_tokens
+                )
+                chat_history = contexto[:-1]
+
+                # Las preguntas repetidas sobre los mismos datos se responden desde el caché
+                llave = cache_respuestas.llave(st.session_state.huella, prompt, chat_history)
+                respuesta, desde_cache = cache_respuestas.responder(
+                    llave,
+                    lambda: st.session_state.agent.run({
+                        "input": prompt,
+                        "chat_history": chat_history
+                    }, callbacks=[respuesta_en_vivo]),
+                    ignorar_cache
+                )
+                respuesta_en_vivo.finalizar(respuesta, desde_cache)
+                st.caption(f"Tokens enviados (historial y pregunta): {tokens_enviados}")
             except Exception as e:
+                respuesta_en_vivo.fallar()
                 st.error(f"Error en el análisis: {str(e)}")
-    
+
     # Actualizar historial
     st.session_state.messages.extend([
         {"role": "user", "content": prompt},
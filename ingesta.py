@@ -0,0 +1,255 @@
+"""
+Capa de ingesta compartida para las aplicaciones que cargan archivos.
+
+El contenido subido se identifica por el hash SHA-256 de sus bytes. La primera
+vez se parsea con el motor más rápido disponible (pyarrow para CSV, calamine
+para Excel) y el DataFrame se guarda en Parquet en .cache/ingesta. Las cargas
+siguientes del mismo contenido, incluido cada rerun de Streamlit, se leen del
+Parquet con memory-map. El caché se limita por tamaño y descarta primero los
+archivos usados hace más tiempo.
+
+compact_dataframe reduce opcionalmente la memoria del DataFrame cargado
+(textos en Arrow, categorías, enteros y decimales más chicos, fechas con
+formato explícito, nunca mes/día).
+"""
+import hashlib
+import os
+from io import BytesIO
+
+import pandas as pd
+
+CACHE_DIR = os.path.join('.cache', 'ingesta')
+MAX_CACHE_BYTES = int(os.environ.get('INGESTA_CACHE_MB', '2048')) * 1024 * 1024
+
+# Hash ya calculado por archivo subido, para no recorrer los bytes en cada rerun.
+# Se conservan solo los más recientes: cada subida tiene un file_id nuevo
+MAX_FINGERPRINTS = 64
+_fingerprints = {}
+
+
+def _module_available(name):
+    try:
+        __import__(name)
+        return True
+    except ImportError:
+        return False
+
+
+CSV_ENGINE = 'pyarrow' if _module_available('pyarrow') else 'c'
+EXCEL_ENGINE = 'calamine' if _module_available('python_calamine') else None
+
+
+def _file_bytes(file):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return f.read()
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+
+def file_fingerprint(file):
+    """
+    Hash SHA-256 del contenido del archivo (ruta, UploadedFile o BytesIO)
+    """
+    # Los UploadedFile de Streamlit conservan su file_id entre reruns
+    file_id = getattr(file, 'file_id', None)
+    memo_key = (file_id, getattr(file, 'name', None), getattr(file, 'size', None)) if file_id else None
+    if memo_key and memo_key in _fingerprints:
+        return _fingerprints[memo_key]
+
+    digest = hashlib.sha256(_file_bytes(file)).hexdigest()
+    if memo_key:
+        if len(_fingerprints) >= MAX_FINGERPRINTS:
+            _fingerprints.pop(next(iter(_fingerprints)))
+        _fingerprints[memo_key] = digest
+    return digest
+
+
+def dataframe_fingerprint(dataframe):
+    """
+    Hash del contenido de un DataFrame (columnas y valores), para datos que no vienen de un archivo
+    """
+    digest = hashlib.sha256(pd.util.hash_pandas_object(dataframe, index=False).to_numpy().tobytes())
+    digest.update('|'.join(map(str, dataframe.columns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Proporción máxima de valores distintos para convertir un texto en categoría
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_VALUES = 10000
+DATE_SAMPLE_SIZE = 1000
+# Formatos de fecha aceptados; los ambiguos se leen siempre día primero
+DATE_FORMATS = [
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y/%m/%d',
+    '%d/%m/%Y',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y',
+    '%d/%m/%y',
+]
+
+
+def _date_format(values):
+    """
+    Formato explícito con el que se leen sin pérdida todas las fechas en texto, o None.
+    Nunca se adivina día y mes: los datos usan el formato día/mes/año.
+    """
+    values = values.dropna().astype(str)
+    sample = values.head(DATE_SAMPLE_SIZE)
+    if sample.empty or not sample.str.contains(r'[-/:]').all():
+        return None
+    for date_format in DATE_FORMATS:
+        if pd.to_datetime(sample, format=date_format, errors='coerce').notna().all():
+            if pd.to_datetime(values, format=date_format, errors='coerce').notna().all():
+                return date_format
+    return None
+
+
+def _downcast_numeric(values):
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast='integer')
+    smaller = pd.to_numeric(values, downcast='float')
+    # Los decimales solo se achican si no se pierde precisión
+    same = (smaller.astype(values.dtype) == values) | (smaller.isna() & values.isna())
+    return smaller if same.all() else values
+
+
+def compact_dataframe(dataframe):
+    """
+    Reduce la memoria del DataFrame: fechas en texto a datetime, textos con pocos valores
+    distintos a categoría, el resto a string de Arrow, y números al tipo más chico sin pérdida.
+    Devuelve el DataFrame compactado y la memoria en bytes antes y después.
+    """
+    before = int(dataframe.memory_usage(deep=True).sum())
+    compacted = dataframe.copy()
+    arrow_strings = CSV_ENGINE == 'pyarrow'
+
+    for col in compacted.columns:
+        values = compacted[col]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if pd.api.types.is_numeric_dtype(values):
+            compacted[col] = _downcast_numeric(values)
+        elif values.dtype == object:
+            if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'mixed'):
+                continue
+            date_format = _date_format(values)
+            if date_format:
+                compacted[col] = pd.to_datetime(values, format=date_format)
+                continue
+            distinct = values.nunique(dropna=True)
+            if distinct <= CATEGORY_MAX_VALUES and distinct <= CATEGORY_MAX_RATIO * len(values):
+                compacted[col] = values.astype('category')
+            elif arrow_strings:
+                compacted[col] = values.astype('string[pyarrow]')
+
+    after = int(compacted.memory_usage(deep=True).sum())
+    return compacted, {'before': before, 'after': after}
+
+
+def _cache_path(fingerprint, sheet_name, cache_dir):
+    sheet_key = hashlib.sha1(str(sheet_name).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{fingerprint}_{sheet_key}.parquet")
+
+
+def parse_file(file, sheet_name=0):
+    """
+    Parsea un CSV o Excel con el motor más rápido disponible
+    """
+    name = str(getattr(file, 'name', file)).lower()
+    data = BytesIO(_file_bytes(file))
+
+    if name.endswith('.csv'):
+        return pd.read_csv(data, engine=CSV_ENGINE)
+    if EXCEL_ENGINE:
+        return pd.read_excel(data, sheet_name=sheet_name, engine=EXCEL_ENGINE)
+    return pd.read_excel(data, sheet_name=sheet_name)
+
+
+def parquet_safe(dataframe):
+    """
+    Parquet exige nombres de columna de texto y tipos homogéneos: las columnas object
+    con valores mezclados (números y textos) se guardan como texto
+    """
+    dataframe = dataframe.copy(deep=False)
+    dataframe.columns = [str(col) for col in dataframe.columns]
+    for col in dataframe.columns[dataframe.dtypes == object]:
+        if pd.api.types.infer_dtype(dataframe[col], skipna=True) in ('mixed', 'mixed-integer'):
+            values = dataframe[col]
+            dataframe[col] = values.where(values.isna(), values.astype(str))
+    return dataframe
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Borra los archivos usados hace más tiempo hasta que el caché quede bajo el límite
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_file() and entry.name.endswith('.parquet'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def read_cached_table(file, sheet_name=0, cache_dir=CACHE_DIR):
+    """
+    Devuelve el DataFrame guardado para este contenido, o None si no está en caché
+    """
+    path = _cache_path(file_fingerprint(file), sheet_name, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        dataframe = pd.read_parquet(path, memory_map=True)
+        # Actualizar la fecha de uso para la política LRU
+        os.utime(path)
+        return dataframe
+    except (OSError, ValueError):
+        return None
+
+
+def store_table(file, dataframe, sheet_name=0, cache_dir=CACHE_DIR):
+    """
+    Guarda el DataFrame parseado en el caché columnar
+    """
+    path = _cache_path(file_fingerprint(file), sheet_name, cache_dir)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        parquet_safe(dataframe).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        evict_cache(cache_dir)
+    except (OSError, ImportError, ValueError, TypeError):
+        # Sin disco o sin pyarrow se trabaja sin caché
+        pass
+
+
+def load_table(file, sheet_name=0, parser=None, cache_dir=CACHE_DIR):
+    """
+    Carga un archivo subido usando el caché por contenido.
+    `parser` permite un lector propio (recibe el archivo); por defecto se usa parse_file.
+    """
+    dataframe = read_cached_table(file, sheet_name, cache_dir)
+    if dataframe is not None:
+        return dataframe
+
+    # Se devuelve la misma versión que se guarda, para que la primera carga y las siguientes coincidan
+    dataframe = parquet_safe(parser(file) if parser else parse_file(file, sheet_name))
+    store_table(file, dataframe, sheet_name, cache_dir)
+    return dataframe
@@ -0,0 +1,105 @@
+"""
+Modelo de chat local que reproduce trayectorias guionadas del agente.
+
+Sirve para medir y probar las aplicaciones de chat sin acceso a Groq: cada
+pregunta tiene un guion con los pasos que "escribiría" el modelo (acciones
+sobre python_repl_ast y la respuesta final) y los tokens se emiten con un
+retardo configurable, también en modo streaming.
+"""
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from cache_respuestas import normalizar_texto
+
+RESPUESTA_SIN_GUION = "Thought: I now know the final answer\nFinal Answer: No hay un guion para esta pregunta."
+
+
+def paso_accion(codigo, pensamiento="I should run this in pandas"):
+    """Texto de un paso del agente que ejecuta código en python_repl_ast"""
+    return f"Thought: {pensamiento}\nAction: python_repl_ast\nAction Input: {codigo}"
+
+
+def paso_final(respuesta):
+    """Texto del último paso del agente con la respuesta final"""
+    return f"Thought: I now know the final answer\nFinal Answer: {respuesta}"
+
+
+class ChatFalso(BaseChatModel):
+    """
+    Modelo de chat guionado. `guiones` asocia cada pregunta con la lista de textos que
+    devuelve en llamadas sucesivas; llamar a reiniciar() antes de cada pregunta, idealmente
+    con la pregunta actual: con historial en el prompt aparecen también las anteriores.
+    """
+
+    guiones: Dict[str, List[str]] = {}
+    retardo_token: float = 0.0
+    retardo_llamada: float = 0.0
+    llamadas: int = 0
+    tokens_emitidos: int = 0
+    paso_actual: Dict[str, int] = {}
+    pregunta_actual: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "chat-falso"
+
+    def reiniciar(self, pregunta=None):
+        """Vuelve al primer paso de todos los guiones y pone los contadores en cero"""
+        self.paso_actual = {}
+        self.llamadas = 0
+        self.tokens_emitidos = 0
+        self.pregunta_actual = pregunta
+
+    def _pregunta(self, messages):
+        texto = messages[-1].content if messages else ""
+        # El prompt del agente termina con "Question: <pregunta>" seguido del razonamiento previo;
+        # las instrucciones de formato también tienen una línea "Question:", por eso se toma la última
+        preguntas = re.findall(r"Question:\s*(.*?)(?:\n|$)", str(texto))
+        return normalizar_texto(preguntas[-1] if preguntas else texto)
+
+    def _guion(self, pregunta):
+        if self.pregunta_actual is not None:
+            return self.guiones.get(self.pregunta_actual)
+        # Con el historial en la entrada la línea "Question:" trae también las preguntas anteriores:
+        # se usa la que aparece más al final, que es la actual
+        posiciones = {clave: pregunta.rfind(normalizar_texto(clave)) for clave in self.guiones}
+        clave = max(posiciones, key=posiciones.get, default=None)
+        return self.guiones[clave] if clave is not None and posiciones[clave] >= 0 else None
+
+    def _siguiente_texto(self, messages):
+        self.llamadas += 1
+        pregunta = self._pregunta(messages)
+        guion = self._guion(pregunta)
+        if not guion:
+            return RESPUESTA_SIN_GUION
+        indice = self.paso_actual.get(pregunta, 0)
+        self.paso_actual[pregunta] = indice + 1
+        return guion[min(indice, len(guion) - 1)]
+
+    @staticmethod
+    def _tokens(texto):
+        # Palabras con su espacio, como llegarían los tokens de un modelo real
+        return re.findall(r"\S+\s*|\s+", texto)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        texto = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=texto))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.retardo_llamada)
+        for token in self._tokens(self._siguiente_texto(messages)):
+            if self.retardo_token:
+                time.sleep(self.retardo_token)
+            self.tokens_emitidos += 1
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,95 @@
+"""
+Memoria de conversación con presupuesto de tokens.
+
+Se envían siempre el prompt de sistema y los últimos N turnos tal cual; los
+turnos más antiguos se van integrando en un resumen acumulado, de modo que el
+tamaño del prompt queda acotado durante toda la sesión.
+"""
+
+PRESUPUESTO_POR_DEFECTO = 2000
+TURNOS_RECIENTES_POR_DEFECTO = 3
+PREFIJO_RESUMEN = "Resumen de la conversación anterior:\n"
+
+PROMPT_RESUMEN = (
+    "Resume en español, en no más de {palabras} palabras, la conversación entre un usuario y un analista "
+    "de datos. Conserva cifras, nombres de columnas, filtros y conclusiones.\n\n"
+    "Resumen previo:\n{resumen}\n\nNuevos mensajes:\n{mensajes}\n\nResumen actualizado:"
+)
+
+try:
+    import tiktoken
+
+    _codificador = tiktoken.get_encoding("cl100k_base")
+
+    def contar_tokens(texto):
+        """Cantidad de tokens del texto"""
+        return len(_codificador.encode(str(texto)))
+except ImportError:
+    def contar_tokens(texto):
+        """Cantidad aproximada de tokens del texto (unos 4 caracteres por token)"""
+        return max(1, len(str(texto)) // 4)
+
+
+def tokens_mensajes(mensajes):
+    """Tokens de una lista de mensajes, con un pequeño costo fijo por mensaje"""
+    return sum(contar_tokens(m["content"]) + 4 for m in mensajes)
+
+
+def nuevo_estado():
+    """Estado de la memoria que se guarda en st.session_state"""
+    return {"resumen": "", "resumidos": 0, "tokens_enviados": 0}
+
+
+def resumidor_llm(llm, palabras=150):
+    """Crea una función de resumen que usa el LLM indicado"""
+    def resumir(resumen, mensajes):
+        texto = "\n".join(f"{m['role']}: {m['content']}" for m in mensajes)
+        respuesta = llm.invoke(PROMPT_RESUMEN.format(palabras=palabras, resumen=resumen or "(vacío)",
+                                                     mensajes=texto))
+        return getattr(respuesta, "content", str(respuesta)).strip()
+    return resumir
+
+
+def resumen_extractivo(resumen, mensajes, max_caracteres=1500):
+    """Resumen sin LLM: agrega el inicio de cada mensaje y conserva lo más reciente"""
+    lineas = [resumen] if resumen else []
+    lineas += [f"- {m['role']}: {m['content'][:200]}" for m in mensajes]
+    return "\n".join(lineas)[-max_caracteres:]
+
+
+def construir_contexto(mensajes, estado, resumir=resumen_extractivo,
+                       turnos_recientes=TURNOS_RECIENTES_POR_DEFECTO, presupuesto_tokens=PRESUPUESTO_POR_DEFECTO):
+    """
+    Arma los mensajes a enviar: prompt de sistema, resumen acumulado y últimos turnos.
+    El último mensaje de `mensajes` es la pregunta actual y siempre se envía completo.
+    `estado` se actualiza con el resumen y la cantidad de tokens enviados.
+    """
+    sistema = [m for m in mensajes if m["role"] == "system"][:1]
+    conversacion = [m for m in mensajes if m["role"] != "system"]
+
+    # Cada turno es una pregunta y su respuesta; la pregunta actual va aparte
+    corte = max(0, len(conversacion) - 1 - 2 * turnos_recientes)
+    # Lo que ya está en el resumen no se vuelve a enviar completo, aunque un turno anterior
+    # haya adelantado el corte por presupuesto
+    corte = max(corte, min(estado["resumidos"], len(conversacion) - 1))
+
+    while True:
+        antiguos = conversacion[:corte]
+        recientes = conversacion[corte:]
+
+        # Solo se resumen los mensajes que aún no forman parte del resumen
+        if len(antiguos) > estado["resumidos"]:
+            estado["resumen"] = resumir(estado["resumen"], antiguos[estado["resumidos"]:])
+            estado["resumidos"] = len(antiguos)
+
+        resumen = [{"role": "system", "content": PREFIJO_RESUMEN + estado["resumen"]}] if estado["resumen"] else []
+        contexto = sistema + resumen + recientes
+        tokens = tokens_mensajes(contexto)
+
+        # Si se excede el presupuesto se pasa un turno más al resumen
+        if tokens <= presupuesto_tokens or len(recientes) <= 1:
+            break
+        corte = min(corte + 2, len(conversacion) - 1)
+
+    estado["tokens_enviados"] = tokens
+    return contexto, tokens
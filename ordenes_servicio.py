@@ -0,0 +1,272 @@
+"""
+Órdenes de servicio (OS/OT) de costura con su avance, para ganttserv.
+
+La carga completa agrega todas las órdenes. En la actualización incremental
+se guarda una marca de agua: la última fecha de registro de las notas de
+ingreso (131) y salida (130) de producción. En cada actualización se buscan
+las órdenes con notas posteriores a la marca, solo esas se vuelven a agregar
+y se reemplazan en el DataFrame. DIAS_DESDE_MIN_SAL depende de la fecha actual
+y se recalcula para todas las filas. Las órdenes nuevas que todavía no tienen
+notas aparecen en la siguiente carga completa, que se hace cada
+CARGA_COMPLETA_CADA actualizaciones.
+
+El filtro de pendientes se aplica en la consulta (HAVING). ModeloOrdenes
+prepara una sola vez por actualización el DataFrame para el gráfico, con
+proveedor y cliente como categorías y posiciones precalculadas por proveedor,
+cliente y fecha de entrega, para filtrar sin volver a la base de datos.
+"""
+import numpy as np
+import pandas as pd
+
+QUERY_ORDENES = """
+SELECT 
+    c.CodDocumento AS OS_OT,
+    i.CoddocOrdenProduccion AS OP,
+    MAX(d.NommaeAnexoProveedor) AS PROVEEDOR,
+    MAX(w.NommaeEstilo) AS ESTILO,
+    MAX(z.dMinutos) AS MIN_COST,
+    MAX(z.dMinutos) * SUM(a.dCantidadProgramado - a.dCantidadProducido) AS MIN_PEND,
+    SUM(a.dCantidadProgramado) AS PROG,
+    SUM(a.dCantidadProducido) AS PROD,
+    SUM(a.dCantidadProgramado - a.dCantidadProducido) AS PENDIENT,
+    MAX(dbo.fneFechaRegistroMaximo_NotaInventario_Documento(
+        131,  -- @IdtdDocumentoForm_NotaInventario_IngresoProduccion
+        a.IdDocumento,
+        a.IdmaeItem_Inventario)) AS MAX_ING,
+    MIN(dbo.fneFechaRegistroMinimo_NotaInventario_Documento(
+        130,  -- @IdtdDocumentoForm_NotaInventario_SalidaProduccion
+        a.IdDocumento,
+        a.IdmaeItem_Inventario)) AS MIN_SAL,
+    ISNULL(DATEDIFF(DAY, MIN(dbo.fneFechaRegistroMinimo_NotaInventario_Documento(
+        130,  -- @IdtdDocumentoForm_NotaInventario_SalidaProduccion
+        a.IdDocumento,
+        a.IdmaeItem_Inventario)), GETDATE()), 0) AS DIAS_DESDE_MIN_SAL,
+    MAX(k.NommaeAnexoCliente) AS CLIENTE,
+    MAX(v.CoddocOrdenVenta) AS PEDIDO,
+    MIN(i.dtFechaEntrega) AS F_ENT,
+    MAX(a.IdDocumento) AS ID_DOC
+FROM (
+    SELECT 
+        a.IdDocumento,
+        a.IdmaeItem_Inventario,
+        a.dCantidadProgramado,
+        a.dCantidadProducido
+    FROM dbo.fntOrdenItem_Seguimiento_ServicioProduccion_Historico(13) a  -- @IdFiltro
+    {filtro}
+) a
+INNER JOIN dbo.fntDocumento_Produccion() c
+    ON a.IdDocumento = c.IdDocumento
+INNER JOIN dbo.maeAnexoProveedor d WITH (NOLOCK)
+    ON c.IdmaeAnexo = d.IdmaeAnexo_Proveedor
+INNER JOIN dbo.maeItemInventario e WITH (NOLOCK)
+    ON a.IdmaeItem_Inventario = e.IdmaeItem_Inventario
+INNER JOIN dbo.maeUnidadMedida f WITH (NOLOCK)
+    ON e.IdmaeUnidadMedida_Almacen = f.IdmaeUnidadMedida
+INNER JOIN dbo.maeCombo g WITH (NOLOCK)
+    ON e.IdmaeCombo = g.IdmaeCombo
+INNER JOIN dbo.docOrdenProduccion i WITH (NOLOCK)
+    ON c.IdDocumento_Referencia = i.IdDocumento_OrdenProduccion
+INNER JOIN dbo.maeCentroCosto j WITH (NOLOCK)
+    ON c.IdmaeCentroCosto = j.IdmaeCentroCosto
+INNER JOIN dbo.maeAnexoCliente k WITH (NOLOCK)
+    ON i.IdmaeAnexo_Cliente = k.IdmaeAnexo_Cliente 
+INNER JOIN dbo.docOrdenVenta v WITH (NOLOCK) 
+    ON i.IdDocumento_Referencia = v.IdDocumento_OrdenVenta
+INNER JOIN dbo.maeEstilo w WITH (NOLOCK) 
+    ON e.IdmaeEstilo = w.IdmaeEstilo
+INNER JOIN dbo.maeEstiloRuta z WITH (NOLOCK) 
+    ON e.IdmaeEstilo = z.IdmaeEstilo AND z.idmaeCentroCosto = ?  -- centro de costo
+WHERE j.IdmaeCentroCosto = ?  -- centro de costo
+GROUP BY c.CodDocumento, i.CoddocOrdenProduccion
+HAVING SUM(a.dCantidadProgramado - a.dCantidadProducido) > ?  -- pendiente mínimo
+ORDER BY c.CodDocumento;
+"""
+
+
+FILTRO_DOCUMENTOS = "WHERE a.IdDocumento IN ({marcadores})"
+
+QUERY_MARCA = """
+SELECT MAX(dtFechaRegistro) AS MARCA
+FROM dbo.docNotaInventario WITH (NOLOCK)
+WHERE IdtdDocumentoForm IN (130, 131)
+"""
+
+# Órdenes con notas de ingreso o salida registradas después de la marca. Primero se toman las
+# notas nuevas (pocas filas, por dtFechaRegistro) y solo las órdenes del centro de costo ligadas a
+# ellas pasan por las mismas funciones y la misma llave (a.IdDocumento) que QUERY_ORDENES, así
+# ID_DOC coincide con el IdDocumento que filtra FILTRO_DOCUMENTOS
+QUERY_CAMBIOS = """
+;WITH NotasNuevas AS (
+    SELECT DISTINCT IdDocumento_OrdenProduccion
+    FROM dbo.docNotaInventario WITH (NOLOCK)
+    WHERE IdtdDocumentoForm IN (130, 131)
+        AND dtFechaRegistro > ?  -- marca
+)
+SELECT DISTINCT a.IdDocumento AS ID_DOC
+FROM dbo.fntOrdenItem_Seguimiento_ServicioProduccion_Historico(13) a  -- @IdFiltro
+INNER JOIN dbo.fntDocumento_Produccion() c
+    ON a.IdDocumento = c.IdDocumento
+INNER JOIN NotasNuevas n
+    ON n.IdDocumento_OrdenProduccion IN (c.IdDocumento, c.IdDocumento_Referencia)
+WHERE c.IdmaeCentroCosto = ?  -- centro de costo
+    AND (dbo.fneFechaRegistroMaximo_NotaInventario_Documento(
+            131,  -- @IdtdDocumentoForm_NotaInventario_IngresoProduccion
+            a.IdDocumento,
+            a.IdmaeItem_Inventario) > ?  -- marca
+        OR dbo.fneFechaRegistroMaximo_NotaInventario_Documento(
+            130,  -- @IdtdDocumentoForm_NotaInventario_SalidaProduccion
+            a.IdDocumento,
+            a.IdmaeItem_Inventario) > ?)  -- marca
+"""
+
+# SQL Server admite hasta 2100 parámetros por consulta
+MAX_DOCUMENTOS_POR_CONSULTA = 1000
+CARGA_COMPLETA_CADA = 12
+# Filtros fijos de la consulta: servicio de costura y órdenes con más de 4 prendas pendientes
+CENTRO_COSTO_COSTURA = 47
+PENDIENTE_MINIMO = 4
+
+
+def consulta_ordenes(documentos=0):
+    """Consulta de órdenes, completa o filtrada a `documentos` IdDocumento parametrizados"""
+    filtro = FILTRO_DOCUMENTOS.format(marcadores=", ".join("?" * documentos)) if documentos else ""
+    return QUERY_ORDENES.replace("{filtro}", filtro)
+
+
+def parametros_ordenes(documentos=()):
+    """Parámetros en el orden en que aparecen en la consulta: documentos, centros de costo y pendiente"""
+    return list(documentos) + [CENTRO_COSTO_COSTURA, CENTRO_COSTO_COSTURA, PENDIENTE_MINIMO]
+
+
+def parametros_cambios(marca):
+    """Parámetros de QUERY_CAMBIOS: marca de las notas nuevas, centro de costo y marca de cada función"""
+    return [marca, CENTRO_COSTO_COSTURA, marca, marca]
+
+
+def recalcular_dias(df, hoy=None):
+    """DIAS_DESDE_MIN_SAL como DATEDIFF(DAY, MIN_SAL, GETDATE()), 0 si no hay salida"""
+    hoy = pd.Timestamp(hoy or pd.Timestamp.now()).normalize()
+    min_sal = pd.to_datetime(df['MIN_SAL']).dt.normalize()
+    return df.assign(DIAS_DESDE_MIN_SAL=(hoy - min_sal).dt.days.fillna(0).astype('int64'))
+
+
+class OrdenesIncrementales:
+    """DataFrame de órdenes que se actualiza volviendo a consultar solo las órdenes que cambiaron"""
+
+    def __init__(self, pool, carga_completa_cada=CARGA_COMPLETA_CADA, incremental=True):
+        self.pool = pool
+        self.carga_completa_cada = carga_completa_cada
+        self.incremental = incremental
+        self.df = None
+        self.marca = None
+        self.actualizaciones_incrementales = 0
+        self.ultimo_detalle = {}
+        self._pedir_completa = False
+
+    def pedir_carga_completa(self):
+        self._pedir_completa = True
+
+    def _marca_actual(self):
+        return self.pool.consultar(QUERY_MARCA, nombre="marca_ordenes")['MARCA'].iloc[0]
+
+    def cargar_completo(self):
+        # La marca se toma antes de la consulta: lo registrado durante la carga entra en la siguiente
+        marca = self._marca_actual()
+        df = self.pool.consultar_por_lotes(consulta_ordenes(), parametros_ordenes(), nombre="ordenes_servicio")
+        self.df, self.marca = df, marca
+        self.actualizaciones_incrementales = 0
+        self._pedir_completa = False
+        self.ultimo_detalle = {'tipo': 'completa', 'ordenes': len(df), 'ordenes_cambiadas': len(df)}
+        return df
+
+    def actualizar(self):
+        """Devuelve el DataFrame actualizado; nunca modifica el anterior, que otras sesiones pueden estar usando"""
+        if (not self.incremental or self._pedir_completa or self.df is None or pd.isna(self.marca)
+                or self.actualizaciones_incrementales >= self.carga_completa_cada):
+            return self.cargar_completo()
+
+        marca = self._marca_actual()
+        cambiados = self.pool.consultar(QUERY_CAMBIOS, parametros_cambios(self.marca),
+                                       nombre="cambios_ordenes")['ID_DOC'].tolist()
+        df = self.df
+        if cambiados:
+            partes = [
+                self.pool.consultar_por_lotes(consulta_ordenes(len(grupo)), parametros_ordenes(grupo),
+                                              nombre="ordenes_cambiadas")
+                for grupo in (cambiados[i:i + MAX_DOCUMENTOS_POR_CONSULTA]
+                              for i in range(0, len(cambiados), MAX_DOCUMENTOS_POR_CONSULTA))
+            ]
+            # Las órdenes que ya no están pendientes vuelven vacías y solo se quitan
+            df = pd.concat([df[~df['ID_DOC'].isin(cambiados)], *(parte for parte in partes if len(parte))],
+                           ignore_index=True)
+            df = df.sort_values('OS_OT', kind='stable', ignore_index=True)
+        self.df = recalcular_dias(df)
+        self.marca = marca if pd.notna(marca) else self.marca
+        self.actualizaciones_incrementales += 1
+        self.ultimo_detalle = {'tipo': 'incremental', 'ordenes': len(self.df), 'ordenes_cambiadas': len(cambiados)}
+        return self.df
+
+
+class ModeloOrdenes:
+    """Órdenes listas para el gráfico, con índices por proveedor, cliente y fecha de entrega"""
+
+    def __init__(self, df):
+        base = df.copy()
+        # Redondear MIN_PEND a enteros
+        base['MIN_PEND'] = base['MIN_PEND'].round().astype(int)
+        # Formatear MIN_SAL en formato corto (solo la fecha)
+        base['MIN_SAL'] = pd.to_datetime(base['MIN_SAL']).dt.strftime('%Y-%m-%d')
+        # Truncar los nombres de los clientes a los primeros 15 caracteres
+        base['CLIENTE'] = base['CLIENTE'].str.slice(0, 15)
+        base['F_ENT'] = pd.to_datetime(base['F_ENT'])
+        # Orden del gráfico: por proveedor y, dentro de cada uno, las salidas más antiguas primero
+        base = base.sort_values(by=['PROVEEDOR', 'DIAS_DESDE_MIN_SAL'], ascending=[True, False], ignore_index=True)
+        base['PROVEEDOR'] = base['PROVEEDOR'].astype('category')
+        base['CLIENTE'] = base['CLIENTE'].astype('category')
+        self.base = base
+
+        self._por_proveedor = base.groupby('PROVEEDOR', observed=True).indices
+        self._por_cliente = base.groupby('CLIENTE', observed=True).indices
+        f_ent = base['F_ENT'].to_numpy()
+        # Las fechas vacías (NaT) quedan al final y no entran en ningún rango
+        self._orden_f_ent = np.argsort(f_ent, kind='stable')
+        self._f_ent_ordenadas = f_ent[self._orden_f_ent]
+
+    @property
+    def proveedores(self):
+        return sorted(self._por_proveedor)
+
+    @property
+    def clientes(self):
+        return sorted(self._por_cliente)
+
+    def rango_f_ent(self):
+        fechas = self.base['F_ENT'].dropna()
+        return (fechas.min().date(), fechas.max().date()) if len(fechas) else (None, None)
+
+    def _posiciones(self, indice, valores):
+        partes = [indice[valor] for valor in valores if valor in indice]
+        return np.concatenate(partes) if partes else np.array([], dtype=np.intp)
+
+    def filtrar(self, proveedores=None, clientes=None, desde=None, hasta=None):
+        """Órdenes que cumplen todos los filtros indicados, en el orden del gráfico"""
+        posiciones = None
+        if proveedores:
+            posiciones = self._posiciones(self._por_proveedor, proveedores)
+        if clientes:
+            del_cliente = self._posiciones(self._por_cliente, clientes)
+            posiciones = del_cliente if posiciones is None else np.intersect1d(posiciones, del_cliente)
+        if desde is not None or hasta is not None:
+            fechas = self._f_ent_ordenadas
+            inicio = 0 if desde is None else fechas.searchsorted(np.datetime64(pd.Timestamp(desde)), side='left')
+            if hasta is None:
+                fin = int((~np.isnat(fechas)).sum())
+            else:
+                # Hasta el final del día indicado
+                limite = pd.Timestamp(hasta).normalize() + pd.Timedelta(days=1)
+                fin = fechas.searchsorted(np.datetime64(limite), side='left')
+            en_rango = self._orden_f_ent[inicio:fin]
+            posiciones = en_rango if posiciones is None else np.intersect1d(posiciones, en_rango)
+        if posiciones is None:
+            return self.base
+        return self.base.iloc[np.sort(posiciones)]
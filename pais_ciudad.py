@@ -1,6 +1,37 @@
 import streamlit as st
 import pandas as pd
 
+from ingesta import file_fingerprint, load_table
+
+
+@st.cache_data(show_spinner=False, max_entries=20)
+def construir_indice(huella, _df):
+    """Agrupa una sola vez las ciudades únicas y ordenadas de cada país.
+    El caché se identifica por la huella del archivo, por lo que se comparte entre sesiones.
+    """
+    pares = _df[["País", "Ciudad"]].dropna().drop_duplicates()
+    pares = pares.sort_values(["País", "Ciudad"], key=lambda columna: columna.astype(str))
+    return {pais: grupo.to_numpy() for pais, grupo in pares.groupby("País", sort=False)["Ciudad"]}
+
+
+def mostrar_paginado(valores, nombre_columna, clave):
+    """Muestra una lista larga como tabla paginada"""
+    col1, col2 = st.columns(2)
+    with col1:
+        tamano_pagina = st.selectbox("Filas por página", [50, 100, 500, 1000], key=f"{clave}_tamano")
+    total_paginas = max(1, -(-len(valores) // tamano_pagina))
+    with col2:
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, key=f"{clave}_pagina")
+
+    inicio = (pagina - 1) * tamano_pagina
+    st.dataframe(
+        pd.DataFrame({nombre_columna: valores[inicio:inicio + tamano_pagina]}),
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption(f"Página {pagina} de {total_paginas} ({len(valores)} registros)")
+
+
 # Título de la aplicación
 st.title("Filtro de Ciudades por País")
 
@@ -10,19 +41,22 @@ uploaded_file = st.file_uploader("Sube un archivo Excel con dos columnas: País
 if uploaded_file:
     # Lectura del archivo Excel
     try:
-        df = pd.read_excel(uploaded_file)
-        
+        df = load_table(uploaded_file)
+
         # Validación de columnas
         if "País" in df.columns and "Ciudad" in df.columns:
+            # Índice país -> ciudades, calculado una vez por archivo
+            indice = construir_indice(file_fingerprint(uploaded_file), df)
+
             # Selección de país
-            pais_seleccionado = st.selectbox("Selecciona un país", df["País"].unique())
-            
-            # Filtrar ciudades por el país seleccionado
-            ciudades = df[df["País"] == pais_seleccionado]["Ciudad"].unique()
-            
+            pais_seleccionado = st.selectbox("Selecciona un país", list(indice))
+
+            # Ciudades del país seleccionado
+            ciudades = indice.get(pais_seleccionado, [])
+
             # Mostrar las ciudades
             st.write(f"Ciudades en **{pais_seleccionado}**:")
-            st.write(ciudades)
+            mostrar_paginado(ciudades, "Ciudad", "ciudades")
         else:
             st.error("El archivo debe contener las columnas 'País' y 'Ciudad'.")
     except Exception as e:
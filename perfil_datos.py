@@ -0,0 +1,87 @@
+"""
+Perfil precalculado de un DataFrame para el contexto del agente.
+
+Resume en texto el esquema, tipos, cardinalidades, mínimos y máximos, nulos,
+categorías más frecuentes y una pequeña muestra estratificada, para que el
+agente no tenga que gastar iteraciones en df.head(), df.dtypes o df.describe().
+"""
+import pandas as pd
+
+MAX_COLUMNAS = 50
+MAX_CATEGORIAS = 5
+FILAS_MUESTRA = 8
+MAX_GRUPOS_ESTRATO = 20
+LARGO_MAXIMO_VALOR = 40
+
+
+def _recortar(valor):
+    texto = str(valor)
+    return texto if len(texto) <= LARGO_MAXIMO_VALOR else texto[:LARGO_MAXIMO_VALOR - 1] + "…"
+
+
+def muestra_estratificada(df, filas=FILAS_MUESTRA, semilla=0):
+    """Toma unas pocas filas repartidas entre los grupos de la columna categórica de menor cardinalidad"""
+    if len(df) <= filas:
+        return df
+
+    candidatas = [
+        col for col in df.columns
+        if (pd.api.types.is_string_dtype(df[col]) or isinstance(df[col].dtype, pd.CategoricalDtype))
+        and 1 < df[col].nunique(dropna=True) <= MAX_GRUPOS_ESTRATO
+    ]
+    if not candidatas:
+        return df.sample(filas, random_state=semilla).sort_index()
+
+    estrato = min(candidatas, key=lambda col: df[col].nunique(dropna=True))
+    por_grupo = max(1, filas // df[estrato].nunique(dropna=True))
+    muestra = df.groupby(estrato, observed=True, group_keys=False).apply(
+        lambda grupo: grupo.sample(min(len(grupo), por_grupo), random_state=semilla)
+    )
+    return muestra.head(filas).sort_index()
+
+
+def perfilar(df):
+    """Calcula el perfil del DataFrame como diccionario"""
+    columnas = []
+    for col in list(df.columns)[:MAX_COLUMNAS]:
+        serie = df[col]
+        info = {
+            "columna": str(col),
+            "tipo": str(serie.dtype),
+            "nulos": int(serie.isna().sum()),
+            "distintos": int(serie.nunique(dropna=True)),
+        }
+        if pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie):
+            if serie.notna().any():
+                info["min"] = _recortar(serie.min())
+                info["max"] = _recortar(serie.max())
+        if not pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_datetime64_any_dtype(serie):
+            frecuentes = serie.value_counts(dropna=True).head(MAX_CATEGORIAS)
+            info["frecuentes"] = [f"{_recortar(valor)} ({cantidad})" for valor, cantidad in frecuentes.items()]
+        columnas.append(info)
+
+    return {
+        "filas": len(df),
+        "columnas_totales": len(df.columns),
+        "columnas": columnas,
+        "muestra": muestra_estratificada(df).to_markdown(index=False) if len(df) else "",
+    }
+
+
+def perfil_a_texto(perfil):
+    """Convierte el perfil en texto para el prompt del agente"""
+    lineas = [f"El DataFrame `df` tiene {perfil['filas']} filas y {perfil['columnas_totales']} columnas."]
+    if perfil["columnas_totales"] > len(perfil["columnas"]):
+        lineas.append(f"Se describen solo las primeras {len(perfil['columnas'])} columnas.")
+    lineas.append("Columnas (tipo, nulos, valores distintos, rango o valores frecuentes):")
+    for info in perfil["columnas"]:
+        detalle = f"- {info['columna']}: {info['tipo']}, {info['nulos']} nulos, {info['distintos']} distintos"
+        if "min" in info:
+            detalle += f", min {info['min']}, max {info['max']}"
+        if info.get("frecuentes"):
+            detalle += f", frecuentes: {', '.join(info['frecuentes'])}"
+        lineas.append(detalle)
+    if perfil["muestra"]:
+        lineas.append("Muestra de filas:")
+        lineas.append(perfil["muestra"])
+    return "\n".join(lineas)
@@ -1,8 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import difflib
 from io import BytesIO
 
+from ingesta import file_fingerprint, load_table, read_cached_table, store_table
+from upc_index import load_upc_index, normalize_text
+from workbook_reader import find_consolidation_sheets, iter_sheet_chunks, list_sheet_names, read_sheet
+
 
 def main():
     st.set_page_config(page_title="Consolidador de Packing List", layout="wide")
@@ -24,50 +29,48 @@ def main():
 
     if uploaded_file is not None:
         try:
-            # Leer las pestañas del Excel
+            # Listar las pestañas sin parsear su contenido
             with st.spinner("Procesando archivo..."):
-                excel_data = pd.read_excel(uploaded_file, sheet_name=None)
-
-                # Verificar que existan las pestañas necesarias
-                available_sheets = list(excel_data.keys())
+                available_sheets = list_sheet_names(uploaded_file)
 
                 st.sidebar.write("**Pestañas encontradas:**")
                 for sheet in available_sheets:
                     st.sidebar.write(f"- {sheet}")
 
             # Buscar las pestañas correctas (flexible con nombres)
-            packing_sheet = None
-            upc_sheet = None
-
-            for sheet_name in available_sheets:
-                if 'PL' in sheet_name.upper() or 'PACKING' in sheet_name.upper():
-                    packing_sheet = sheet_name
-                elif 'UPC' in sheet_name.upper():
-                    upc_sheet = sheet_name
+            packing_sheet, upc_sheet = find_consolidation_sheets(available_sheets)
 
             if packing_sheet and upc_sheet:
-                # Leer los datos
-                packing_data = excel_data[packing_sheet]
-                upc_data = excel_data[upc_sheet]
+                # Leer solo las pestañas necesarias
+                with st.spinner("Leyendo pestaña UPC..."):
+                    upc_data = load_table(uploaded_file, upc_sheet, parser=lambda f: read_sheet(f, upc_sheet))
+
+                # Los bloques del packing list alimentan el consolidado a medida que se leen
+                cached_packing = read_cached_table(uploaded_file, packing_sheet)
+                packing_chunks = []
+                packing_read = {'complete': False}
+
+                def stream_packing():
+                    if cached_packing is not None:
+                        chunks = [cached_packing]
+                    else:
+                        chunks = iter_sheet_chunks(uploaded_file, packing_sheet)
+                    for chunk in chunks:
+                        packing_chunks.append(chunk)
+                        yield chunk
+                    packing_read['complete'] = True
+
+                packing_stream = stream_packing()
 
                 # Mostrar pestañas
                 tab1, tab2, tab3 = st.tabs(["📋 Packing List", "🏷️ UPC Data", "📊 Consolidado"])
 
-                with tab1:
-                    st.header("Packing List Original")
-                    st.dataframe(packing_data, use_container_width=True)
-                    st.info(f"Total de registros: {len(packing_data)}")
-
-                with tab2:
-                    st.header("Datos UPC")
-                    st.dataframe(upc_data, use_container_width=True)
-                    st.info(f"Total de UPCs: {len(upc_data)}")
-
                 with tab3:
                     st.header("Resumen Consolidado")
 
                     # Procesar los datos para el consolidado
-                    consolidated_data = process_consolidation(packing_data, upc_data)
+                    consolidated_data = process_consolidation(packing_stream, upc_data,
+                                                              (file_fingerprint(uploaded_file), upc_sheet))
 
                     if consolidated_data is not None and not consolidated_data.empty:
                         st.dataframe(consolidated_data, use_container_width=True)
@@ -95,16 +98,38 @@ def main():
 
                         # Botón para descargar el consolidado
                         st.markdown("---")
-                        download_excel = create_download_file(consolidated_data)
+                        export_format = st.radio("Formato de descarga", list(EXPORT_FORMATS), horizontal=True)
+                        extension, mime = EXPORT_FORMATS[export_format]
+                        download_file = create_download_file(consolidated_data, export_format)
                         st.download_button(
                             label="📥 Descargar Consolidado",
-                            data=download_excel,
-                            file_name="consolidado_packing_list.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                            data=download_file,
+                            file_name=f"consolidado_packing_list.{extension}",
+                            mime=mime
                         )
                     else:
                         st.error("No se pudo generar el consolidado. Verifica la estructura de los datos.")
 
+                # Terminar de leer el packing list si el consolidado se detuvo antes
+                for _ in packing_stream:
+                    pass
+                packing_data = pd.concat(packing_chunks, ignore_index=True) if packing_chunks else pd.DataFrame()
+                # Solo se guarda una lectura completa: si el lector falló a mitad de la hoja no se cachea
+                if cached_packing is None and packing_read['complete']:
+                    store_table(uploaded_file, packing_data, packing_sheet)
+                elif not packing_read['complete']:
+                    st.warning("El packing list no se pudo leer completo; se muestran solo las filas leídas.")
+
+                with tab1:
+                    st.header("Packing List Original")
+                    st.dataframe(packing_data, use_container_width=True)
+                    st.info(f"Total de registros: {len(packing_data)}")
+
+                with tab2:
+                    st.header("Datos UPC")
+                    st.dataframe(upc_data, use_container_width=True)
+                    st.info(f"Total de UPCs: {len(upc_data)}")
+
             else:
                 st.error(f"No se encontraron las pestañas necesarias. Disponibles: {available_sheets}")
 
@@ -134,186 +159,324 @@ def main():
             """)
 
 
-def process_consolidation(packing_data, upc_data):
+# Tokens que identifican las columnas de tallas en el packing list
+SIZE_TOKENS = ['0/3M', '3/6M', '6/12M', '12/18M', '18/24M', '2Y', '3Y', '4Y', '5Y', '6Y', '7Y', '8Y', '10Y', '12Y',
+               '14Y']
+
+CONSOLIDATED_COLUMNS = ['UPC', 'style #', 'Description', 'Color', 'Talla', 'PO', 'Units']
+
+
+def find_column(df, possible_names):
     """
-    Procesa los datos del packing list y UPC para generar el consolidado
+    Busca de manera flexible la primera columna cuyo nombre contenga alguno de los nombres posibles
     """
-    try:
-        consolidated_rows = []
-
-        # Limpiar nombres de columnas
-        packing_data.columns = packing_data.columns.astype(str).str.strip()
-        upc_data.columns = upc_data.columns.astype(str).str.strip()
-
-        # Función para encontrar columnas de manera flexible
-        def find_column(df, possible_names):
-            for name in possible_names:
-                for col in df.columns:
-                    if name.lower() in col.lower():
-                        return col
-            return None
-
-        # Identificar columnas importantes en UPC data
-        upc_style_col = find_column(upc_data, ['style', 'estilo', 'style #'])
-        upc_color_col = find_column(upc_data, ['color', 'colour'])
-        upc_size_col = find_column(upc_data, ['talla', 'size', 'tall'])
-        upc_code_col = find_column(upc_data, ['upc', 'code'])
-        upc_po_col = find_column(upc_data, ['po', 'order'])  # Agregar búsqueda de PO en UPC data
-
-        # Identificar columnas importantes en packing data
-        packing_style_col = find_column(packing_data, ['style', 'estilo', 'style #'])
-        packing_color_col = find_column(packing_data, ['color', 'colour'])
-        packing_desc_col = find_column(packing_data, ['description', 'desc'])
-        packing_po_col = find_column(packing_data, ['po', 'order'])
-
-        # Verificar que se encontraron las columnas necesarias
-        if not all([upc_style_col, upc_color_col, upc_size_col, upc_code_col]):
-            st.error(
-                f"No se encontraron todas las columnas necesarias en UPC data. Columnas disponibles: {list(upc_data.columns)}")
-            return None
-
-        if not all([packing_style_col, packing_color_col]):
-            st.error(
-                f"No se encontraron todas las columnas necesarias en Packing data. Columnas disponibles: {list(packing_data.columns)}")
-            return None
-
-        # Identificar columnas de tallas en packing_data
-        size_columns = []
-        for col in packing_data.columns:
-            if any(size in str(col).upper() for size in
-                   ['0/3M', '3/6M', '6/12M', '12/18M', '18/24M', '2Y', '3Y', '4Y', '5Y', '6Y', '7Y', '8Y', '10Y', '12Y',
-                    '14Y']):
-                size_columns.append(col)
-
-        st.info(f"Columnas de tallas encontradas: {size_columns}")
-
-        # Procesar cada fila del packing list
-        for idx, row in packing_data.iterrows():
-            style = str(row.get(packing_style_col, '')).strip()
-            color = str(row.get(packing_color_col, '')).strip()
-            description = str(row.get(packing_desc_col, '')).strip() if packing_desc_col else ''
-            po_packing = str(row.get(packing_po_col, '912')).strip() if packing_po_col else '912'
-
-            # Procesar cada talla
-            for size_col in size_columns:
-                quantity = row.get(size_col, 0)
-
-                # Convertir cantidad a numérico de forma segura
-                try:
-                    quantity = float(quantity) if pd.notna(quantity) else 0
-                except:
-                    quantity = 0
-
-                if quantity > 0:
-                    # Extraer el tamaño del nombre de la columna
-                    size = str(size_col).strip()
-
-                    # Buscar el UPC correspondiente - convertir todo a string para comparación
-                    try:
-                        # Crear máscaras booleanas paso a paso para mejor debugging
-                        style_mask = upc_data[upc_style_col].astype(str).str.strip() == style
-                        color_mask = upc_data[upc_color_col].astype(str).str.strip().str.lower() == color.lower()
-                        size_mask = upc_data[upc_size_col].astype(str).str.strip() == size
-
-                        # Combinar todas las máscaras
-                        combined_mask = style_mask & color_mask & size_mask
-                        upc_match = upc_data[combined_mask]
-
-                    except Exception as match_error:
-                        st.error(f"Error al buscar UPC para {style}-{color}-{size}: {match_error}")
-                        continue
-
-                    if not upc_match.empty:
-                        upc_code = str(upc_match.iloc[0][upc_code_col]).strip()
-
-                        # Obtener el PO de la tabla UPC, si no existe usar el del packing
-                        if upc_po_col:
-                            po_from_upc = str(upc_match.iloc[0][upc_po_col]).strip()
-                        else:
-                            po_from_upc = po_packing
-
-                        consolidated_rows.append({
-                            'UPC': upc_code,
-                            'style #': style,
-                            'Description': description,
-                            'Color': color,
-                            'Talla': size,
-                            'PO': po_from_upc,  # Usar el PO de la tabla UPC
-                            'Units': int(quantity)
-                        })
-                    else:
-                        # Debug: mostrar información cuando no se encuentra match
-                        st.warning(f"No se encontró UPC para: {style} | {color} | {size}")
+    for name in possible_names:
+        for col in df.columns:
+            if name.lower() in col.lower():
+                return col
+    return None
 
-        # Crear DataFrame consolidado
-        if consolidated_rows:
-            consolidated_df = pd.DataFrame(consolidated_rows)
 
-            # Agrupar por UPC para sumar cantidades duplicadas
-            consolidated_df = consolidated_df.groupby(
-                ['UPC', 'style #', 'Description', 'Color', 'Talla', 'PO']
-            )['Units'].sum().reset_index()
+def find_size_columns(df):
+    """
+    Identifica las columnas de tallas del packing list
+    """
+    return [col for col in df.columns if any(size in str(col).upper() for size in SIZE_TOKENS)]
 
-            # Ordenar por Style, Color, Size
-            consolidated_df = consolidated_df.sort_values(['style #', 'Color', 'Talla'])
 
-            return consolidated_df
-        else:
-            st.warning(
-                "No se encontraron datos para consolidar. Verifica que las columnas de tallas tengan valores y que existan UPCs coincidentes.")
+def melt_packing(packing_data, style_col, color_col, desc_col, po_col, size_columns):
+    """
+    Convierte el packing list a formato largo (una fila por estilo/color/talla con cantidad > 0)
+    conservando el orden original: fila por fila y talla por talla.
+    """
+    n_rows = len(packing_data)
+    n_sizes = len(size_columns)
+
+    # Convertir cantidades a numérico de forma segura (lo no numérico cuenta como 0)
+    quantities = packing_data[size_columns].apply(pd.to_numeric, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    style = normalize_text(packing_data[style_col]).to_numpy()
+    color = normalize_text(packing_data[color_col]).to_numpy()
+    description = normalize_text(packing_data[desc_col]).to_numpy() if desc_col else np.full(n_rows, '', dtype=object)
+    po = normalize_text(packing_data[po_col]).to_numpy() if po_col else np.full(n_rows, '912', dtype=object)
+
+    long_data = pd.DataFrame({
+        'style #': np.repeat(style, n_sizes),
+        'Description': np.repeat(description, n_sizes),
+        'Color': np.repeat(color, n_sizes),
+        'Talla': np.tile([str(col).strip() for col in size_columns], n_rows),
+        'PO_packing': np.repeat(po, n_sizes),
+        'Units': quantities.ravel(),
+    })
+    long_data = long_data[long_data['Units'] > 0].reset_index(drop=True)
+    long_data['Units'] = long_data['Units'].astype(int)
+    long_data['color_key'] = long_data['Color'].str.lower()
+    return long_data
+
+
+# Límite de combinaciones sin UPC para las que se buscan candidatos cercanos
+MAX_DIAGNOSED_MISSES = 200
 
-            # Mostrar algunos ejemplos para debugging
-            st.write("**Ejemplos de datos en Packing List:**")
-            sample_packing = packing_data.head(3)[[packing_style_col, packing_color_col] + size_columns[:3]]
-            st.dataframe(sample_packing)
+UNMATCHED_COLUMNS = ['style #', 'Color', 'Talla', 'Celdas', 'Units', 'Candidatos']
 
-            st.write("**Ejemplos de datos en UPC:**")
-            sample_upc = upc_data.head(10)[[upc_style_col, upc_color_col, upc_size_col, upc_code_col]]
-            st.dataframe(sample_upc)
 
-            return pd.DataFrame()
+def summarize_unmatched(unmatched, upc_keys, max_candidates=3):
+    """
+    Agrupa las celdas sin UPC por estilo/color/talla (ordenadas por unidades) y agrega
+    las llaves UPC más parecidas como candidatas
+    """
+    if unmatched.empty:
+        return pd.DataFrame(columns=UNMATCHED_COLUMNS)
+
+    report = unmatched.groupby(['style #', 'Color', 'Talla'], sort=False).agg(
+        Celdas=('Units', 'size'),
+        Units=('Units', 'sum'),
+    ).reset_index().sort_values('Units', ascending=False, kind='stable').reset_index(drop=True)
+
+    # Llaves "color | talla" disponibles por estilo
+    keys_by_style = (upc_keys['color_key'] + ' | ' + upc_keys['Talla']).groupby(upc_keys['style #']).agg(list).to_dict()
+    styles = list(keys_by_style)
+
+    candidates = []
+    for position, (style, color, size, _, _) in enumerate(report.itertuples(index=False, name=None)):
+        if position >= MAX_DIAGNOSED_MISSES:
+            candidates.append('')
+            continue
+
+        near_styles = [style] if style in keys_by_style else difflib.get_close_matches(style, styles, n=2)
+        target = f"{color.lower()} | {size}"
+        options = []
+        for near_style in near_styles:
+            options.extend(f"{near_style} | {key}" for key in
+                           difflib.get_close_matches(target, keys_by_style[near_style], n=max_candidates, cutoff=0.5))
+        candidates.append(', '.join(options[:max_candidates]))
 
+    report['Candidatos'] = candidates
+    return report
+
+
+def consolidate_packing_list(packing_data, upc_data, upc_source=None):
+    """
+    Núcleo del consolidado, sin interfaz: lo usan la aplicación Streamlit y el proceso por lotes.
+    Las tallas se pasan a formato largo una sola vez y se cruzan con el índice UPC
+    persistente mediante un único merge por (estilo, color, talla).
+    `packing_data` puede ser un DataFrame o un iterable de bloques (DataFrames) del packing list.
+    `upc_source` (huella del archivo, pestaña UPC) permite reutilizar el índice UPC sin recorrer la pestaña.
+    Devuelve el consolidado (vacío si no hubo coincidencias) y un diccionario con los detalles
+    del proceso. Lanza ValueError si faltan columnas necesarias.
+    """
+    # Las columnas se detectan con el primer bloque del packing list
+    packing_chunks = iter([packing_data] if isinstance(packing_data, pd.DataFrame) else packing_data)
+    packing_data = next(packing_chunks, pd.DataFrame())
+
+    # Limpiar nombres de columnas
+    packing_data.columns = packing_data.columns.astype(str).str.strip()
+    upc_data.columns = upc_data.columns.astype(str).str.strip()
+
+    # Identificar columnas importantes en UPC data
+    upc_columns = {
+        'style': find_column(upc_data, ['style', 'estilo', 'style #']),
+        'color': find_column(upc_data, ['color', 'colour']),
+        'size': find_column(upc_data, ['talla', 'size', 'tall']),
+        'code': find_column(upc_data, ['upc', 'code']),
+        'po': find_column(upc_data, ['po', 'order']),  # Agregar búsqueda de PO en UPC data
+    }
+
+    # Identificar columnas importantes en packing data
+    packing_style_col = find_column(packing_data, ['style', 'estilo', 'style #'])
+    packing_color_col = find_column(packing_data, ['color', 'colour'])
+    packing_desc_col = find_column(packing_data, ['description', 'desc'])
+    packing_po_col = find_column(packing_data, ['po', 'order'])
+
+    # Verificar que se encontraron las columnas necesarias
+    if not all([upc_columns['style'], upc_columns['color'], upc_columns['size'], upc_columns['code']]):
+        raise ValueError(
+            f"No se encontraron todas las columnas necesarias en UPC data. Columnas disponibles: {list(upc_data.columns)}")
+
+    if not all([packing_style_col, packing_color_col]):
+        raise ValueError(
+            f"No se encontraron todas las columnas necesarias en Packing data. Columnas disponibles: {list(packing_data.columns)}")
+
+    # Identificar columnas de tallas en packing_data
+    size_columns = find_size_columns(packing_data)
+
+    # Formato largo del packing list y llaves normalizadas de UPC
+    long_parts = [melt_packing(packing_data, packing_style_col, packing_color_col, packing_desc_col,
+                               packing_po_col, size_columns)]
+    for chunk in packing_chunks:
+        chunk.columns = chunk.columns.astype(str).str.strip()
+        long_parts.append(melt_packing(chunk, packing_style_col, packing_color_col, packing_desc_col,
+                                       packing_po_col, size_columns))
+    long_data = pd.concat(long_parts, ignore_index=True) if len(long_parts) > 1 else long_parts[0]
+    upc_keys, index_stats = load_upc_index(upc_data, upc_columns, source=upc_source)
+
+    # Buscar el UPC correspondiente con un solo hash join
+    merged = long_data.merge(upc_keys, on=['style #', 'color_key', 'Talla'], how='left', sort=False)
+    matched = merged['UPC'].notna()
+
+    details = {
+        'size_columns': size_columns,
+        'index_stats': index_stats,
+        'unmatched': summarize_unmatched(merged.loc[~matched, ['style #', 'Color', 'Talla', 'Units']], upc_keys),
+        'packing_sample': packing_data.head(3)[[packing_style_col, packing_color_col] + size_columns[:3]],
+        'upc_sample': upc_data.head(10)[[upc_columns['style'], upc_columns['color'], upc_columns['size'],
+                                         upc_columns['code']]],
+    }
+
+    merged = merged[matched]
+
+    # Obtener el PO de la tabla UPC, si no existe usar el del packing
+    if not upc_columns['po']:
+        merged = merged.assign(PO=merged['PO_packing'])
+
+    if merged.empty:
+        return pd.DataFrame(), details
+
+    # Agrupar por UPC para sumar cantidades duplicadas
+    consolidated_df = merged[CONSOLIDATED_COLUMNS].groupby(
+        ['UPC', 'style #', 'Description', 'Color', 'Talla', 'PO']
+    )['Units'].sum().reset_index()
+
+    # Ordenar por Style, Color, Size
+    consolidated_df = consolidated_df.sort_values(['style #', 'Color', 'Talla'])
+
+    return consolidated_df, details
+
+
+def render_unmatched_report(report):
+    """
+    Muestra una sola vez el resumen de combinaciones sin UPC y permite descargarlo
+    """
+    if report.empty:
+        return
+
+    st.warning(f"No se encontró UPC para {len(report)} combinaciones estilo/color/talla "
+               f"({int(report['Celdas'].sum())} celdas, {int(report['Units'].sum()):,} unidades).")
+
+    with st.expander("🔍 Ver combinaciones sin UPC"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Por estilo**")
+            st.dataframe(report.groupby('style #')['Units'].agg(['size', 'sum'])
+                         .rename(columns={'size': 'Combinaciones', 'sum': 'Units'})
+                         .sort_values('Units', ascending=False), use_container_width=True)
+        with col2:
+            st.write("**Por talla**")
+            st.dataframe(report.groupby('Talla')['Units'].agg(['size', 'sum'])
+                         .rename(columns={'size': 'Combinaciones', 'sum': 'Units'})
+                         .sort_values('Units', ascending=False), use_container_width=True)
+
+        st.dataframe(report, use_container_width=True)
+        st.download_button(
+            label="📥 Descargar combinaciones sin UPC",
+            data=report.to_csv(index=False).encode('utf-8'),
+            file_name="sin_upc.csv",
+            mime="text/csv"
+        )
+
+
+def process_consolidation(packing_data, upc_data, upc_source=None):
+    """
+    Procesa los datos del packing list y UPC para generar el consolidado y muestra
+    en la interfaz los detalles del proceso
+    """
+    try:
+        consolidated_df, details = consolidate_packing_list(packing_data, upc_data, upc_source)
+    except ValueError as e:
+        st.error(str(e))
+        return None
     except Exception as e:
         st.error(f"Error en el procesamiento: {str(e)}")
         st.error(f"Columnas en UPC data: {list(upc_data.columns)}")
-        st.error(f"Columnas en Packing data: {list(packing_data.columns)}")
         return None
 
+    index_stats = details['index_stats']
+    st.info(f"Columnas de tallas encontradas: {details['size_columns']}")
+    st.caption(f"Índice UPC: {index_stats['status']} "
+               f"({index_stats['reused']} filas reutilizadas, {index_stats['normalized']} normalizadas)")
+
+    render_unmatched_report(details['unmatched'])
+
+    if consolidated_df.empty:
+        st.warning(
+            "No se encontraron datos para consolidar. Verifica que las columnas de tallas tengan valores y que existan UPCs coincidentes.")
 
-def create_download_file(dataframe):
+        # Mostrar algunos ejemplos para debugging
+        st.write("**Ejemplos de datos en Packing List:**")
+        st.dataframe(details['packing_sample'])
+
+        st.write("**Ejemplos de datos en UPC:**")
+        st.dataframe(details['upc_sample'])
+
+    return consolidated_df
+
+
+# Formatos de descarga: extensión y tipo MIME
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'CSV': ('csv', "text/csv"),
+    'Parquet': ('parquet', "application/octet-stream"),
+}
+
+EXPORT_CHUNK_SIZE = 10000
+
+
+def compute_column_widths(dataframe, max_width=50):
+    """
+    Calcula el ancho de cada columna con operaciones vectorizadas sobre el largo del texto
+    """
+    widths = []
+    for col in dataframe.columns:
+        lengths = dataframe[col].astype(str).str.len()
+        max_length = max(len(str(col)), int(lengths.max()) if len(lengths) else 0)
+        widths.append(min(max_length + 2, max_width))
+    return widths
+
+
+def write_excel_streaming(dataframe, output, sheet_name='Consolidado'):
+    """
+    Escribe el DataFrame con openpyxl en modo write-only, por bloques de filas
+    """
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(sheet_name)
+
+    # En modo write-only los anchos se definen antes de escribir filas
+    for position, width in enumerate(compute_column_widths(dataframe), start=1):
+        worksheet.column_dimensions[get_column_letter(position)].width = width
+
+    worksheet.append([str(col) for col in dataframe.columns])
+    for start in range(0, len(dataframe), EXPORT_CHUNK_SIZE):
+        chunk = dataframe.iloc[start:start + EXPORT_CHUNK_SIZE]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.append(row)
+
+    workbook.save(output)
+
+
+def create_download_file(dataframe, file_format='Excel'):
     """
-    Crea un archivo Excel para descargar usando openpyxl en lugar de xlsxwriter
+    Crea el archivo para descargar en Excel (openpyxl write-only), CSV o Parquet
     """
     output = BytesIO()
 
     try:
-        # Usar openpyxl que viene incluido con pandas
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            dataframe.to_excel(writer, sheet_name='Consolidado', index=False)
-
-            # Obtener el workbook y worksheet
-            workbook = writer.book
-            worksheet = writer.sheets['Consolidado']
-
-            # Ajustar ancho de columnas
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        if file_format == 'CSV':
+            dataframe.to_csv(output, index=False, encoding='utf-8')
+        elif file_format == 'Parquet':
+            dataframe.to_parquet(output, index=False)
+        else:
+            write_excel_streaming(dataframe, output)
 
         output.seek(0)
         return output.read()
 
     except ImportError:
-        # Si openpyxl no está disponible, usar un método más simple
-        st.warning("Openpyxl no está disponible. Generando archivo CSV en su lugar.")
+        # Si openpyxl o pyarrow no están disponibles, usar un método más simple
+        st.warning(f"No se puede generar el archivo {file_format}. Generando archivo CSV en su lugar.")
         output = BytesIO()
         csv_data = dataframe.to_csv(index=False)
         output.write(csv_data.encode('utf-8'))
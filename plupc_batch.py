@@ -0,0 +1,256 @@
+"""
+Consolidación por lotes de packing lists, sin interfaz Streamlit.
+
+Uso:
+    python plupc_batch.py "cierre/*.xlsx" otra_carpeta --output salida --workers 8
+
+Cada libro se procesa en un proceso independiente con consolidate_packing_list.
+Se escribe un consolidado por PO, un consolidado general y un reporte con el
+tiempo y el estado de cada archivo. Un libro con errores queda registrado en el
+reporte y no detiene el resto del lote: cada libro tiene un tiempo máximo y, si
+un proceso del pool muere, el pool se vuelve a crear y los libros que estaban
+en curso se repiten de a uno para marcar con error solo al que lo provocó.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from plupc import EXPORT_FORMATS, consolidate_packing_list, create_download_file
+from workbook_reader import find_consolidation_sheets, iter_sheet_chunks, list_sheet_names, read_sheet
+
+WORKBOOK_PATTERNS = ['*.xlsx', '*.xls']
+# Tiempo máximo por libro, en segundos
+TIMEOUT_SECONDS = float(os.environ.get('PLUPC_TIMEOUT', '600'))
+REPORT_COLUMNS = ['Archivo', 'Estado', 'Filas', 'Unidades', 'Sin UPC', 'Segundos', 'Error']
+
+
+def collect_workbooks(inputs):
+    """
+    Expande carpetas y patrones glob a la lista ordenada de libros Excel
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in WORKBOOK_PATTERNS:
+                paths.update(glob.glob(os.path.join(item, pattern)))
+        else:
+            paths.update(glob.glob(item, recursive=True))
+    # Ignorar archivos temporales de Excel (~$libro.xlsx)
+    return sorted(path for path in paths if not os.path.basename(path).startswith('~$'))
+
+
+def consolidate_workbook(path):
+    """
+    Consolida un libro. Se ejecuta en un proceso del pool y nunca lanza excepciones:
+    el error se devuelve en el resultado.
+    """
+    start = time.perf_counter()
+    result = {'Archivo': path, 'Estado': 'OK', 'Filas': 0, 'Unidades': 0, 'Sin UPC': 0, 'Error': ''}
+
+    try:
+        with open(path, 'rb') as workbook_file:
+            packing_sheet, upc_sheet = find_consolidation_sheets(list_sheet_names(workbook_file))
+            if not (packing_sheet and upc_sheet):
+                raise ValueError("No se encontraron las pestañas de Packing List y UPC")
+
+            upc_data = read_sheet(workbook_file, upc_sheet)
+            consolidated_df, details = consolidate_packing_list(
+                iter_sheet_chunks(workbook_file, packing_sheet), upc_data)
+
+        consolidated_df.insert(0, 'Archivo', os.path.basename(path))
+        result.update({
+            'Filas': len(consolidated_df),
+            'Unidades': int(consolidated_df['Units'].sum()) if not consolidated_df.empty else 0,
+            'Sin UPC': len(details['unmatched']),
+            'data': consolidated_df,
+        })
+        if consolidated_df.empty:
+            result['Estado'] = 'VACIO'
+
+    except Exception as e:
+        result.update({'Estado': 'ERROR', 'Error': f"{type(e).__name__}: {e}"})
+
+    result['Segundos'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def _safe_name(value):
+    return re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or 'SIN_PO'
+
+
+def write_output(dataframe, path, file_format):
+    with open(path, 'wb') as f:
+        f.write(create_download_file(dataframe, file_format))
+
+
+def write_outputs(frames, output_dir, file_format):
+    """
+    Escribe un consolidado por PO y el consolidado general del lote
+    """
+    extension, _ = EXPORT_FORMATS[file_format]
+    merged = pd.concat(frames, ignore_index=True)
+
+    written = []
+    for po, po_data in merged.groupby('PO', sort=True):
+        path = os.path.join(output_dir, f"consolidado_PO_{_safe_name(po)}.{extension}")
+        write_output(po_data.drop(columns='Archivo'), path, file_format)
+        written.append(path)
+
+    # Consolidado general: suma de unidades por UPC en todos los libros
+    rollup = merged.groupby(
+        ['UPC', 'style #', 'Description', 'Color', 'Talla', 'PO']
+    )['Units'].sum().reset_index().sort_values(['PO', 'style #', 'Color', 'Talla'])
+    path = os.path.join(output_dir, f"consolidado_general.{extension}")
+    write_output(rollup, path, file_format)
+    written.append(path)
+
+    return written
+
+
+def _error_result(path, error, seconds=0):
+    return {'Archivo': path, 'Estado': 'ERROR', 'Filas': 0, 'Unidades': 0, 'Sin UPC': 0, 'Error': error,
+            'Segundos': round(seconds, 3)}
+
+
+def _terminate_workers(executor):
+    """Termina los procesos del pool (un libro colgado no termina solo); el pool queda inservible"""
+    if hasattr(executor, 'terminate_workers'):
+        executor.terminate_workers()
+        return
+    for process in list((executor._processes or {}).values()):
+        process.terminate()
+
+
+def _future_result(future, path, start):
+    """Resultado de un libro, o None si se interrumpió porque un proceso del pool murió"""
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return None
+    except Exception as e:
+        return _error_result(path, f"{type(e).__name__}: {e}", time.monotonic() - start)
+
+
+def _run_pool(paths, workers, timeout, on_result):
+    """
+    Consolida los libros en un pool de `workers` procesos y entrega cada resultado a on_result.
+    Devuelve los libros que quedaron interrumpidos porque un proceso del pool murió.
+    """
+    pending = deque(paths)
+    running = {}
+    interrupted = []
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while pending or running:
+            # Se envían solo tantos libros como procesos, así el tiempo de cada uno corre desde que empieza
+            while pending and len(running) < workers:
+                path = pending.popleft()
+                running[executor.submit(consolidate_workbook, path)] = (path, time.monotonic())
+
+            done, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path, start = running.pop(future)
+                result = _future_result(future, path, start)
+                if result is None:
+                    broken = True
+                    interrupted.append(path)
+                else:
+                    on_result(result)
+
+            now = time.monotonic()
+            expired = [future for future, (_, start) in running.items() if now - start > timeout]
+            for future in expired:
+                path, start = running.pop(future)
+                on_result(_error_result(path, f"TimeoutError: superó el tiempo máximo de {timeout:.0f} s",
+                                        now - start))
+            if expired:
+                _terminate_workers(executor)
+                broken = True
+
+            if broken:
+                # Los demás libros en curso también se pierden: se repiten después, de a uno
+                for future in wait(running).done:
+                    path, start = running[future]
+                    result = _future_result(future, path, start)
+                    if result is None:
+                        interrupted.append(path)
+                    else:
+                        on_result(result)
+                running = {}
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return interrupted
+
+
+def run_batch(paths, output_dir, workers=None, file_format='Excel', timeout=TIMEOUT_SECONDS):
+    """
+    Consolida los libros en un pool de procesos y devuelve el reporte por archivo
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    results = []
+    frames = []
+
+    def on_result(result):
+        data = result.pop('data', None)
+        if data is not None and not data.empty:
+            frames.append(data)
+        results.append(result)
+        print(f"[{result['Estado']:>5}] {result['Segundos']:8.2f}s  {result['Archivo']}"
+              + (f"  -> {result['Error']}" if result['Error'] else ''), flush=True)
+
+    interrupted = _run_pool(paths, workers, timeout, on_result)
+    # Solo, cada libro interrumpido termina bien o demuestra que es el que hace caer el proceso
+    for path in interrupted:
+        if _run_pool([path], 1, timeout, on_result):
+            on_result(_error_result(path, "BrokenProcessPool: el proceso terminó inesperadamente "
+                                          "(posible falta de memoria)"))
+
+    report = pd.DataFrame(results, columns=REPORT_COLUMNS)
+    report = report.sort_values('Archivo').reset_index(drop=True)
+    report.to_csv(os.path.join(output_dir, 'reporte_lote.csv'), index=False, encoding='utf-8')
+
+    if frames:
+        write_outputs(frames, output_dir, file_format)
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consolida muchos packing lists en paralelo")
+    parser.add_argument('inputs', nargs='+', help="Carpetas o patrones glob de libros Excel")
+    parser.add_argument('--output', default='consolidado_lote', help="Carpeta de salida")
+    parser.add_argument('--workers', type=int, default=None, help="Número de procesos (por defecto, CPUs)")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='Excel', dest='file_format',
+                        help="Formato de los archivos de salida")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT_SECONDS, help="Segundos máximos por libro")
+    args = parser.parse_args(argv)
+
+    paths = collect_workbooks(args.inputs)
+    if not paths:
+        print("No se encontraron libros Excel para procesar", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    report = run_batch(paths, args.output, args.workers, args.file_format, args.timeout)
+    failed = report[report['Estado'] == 'ERROR']
+
+    print(f"\n{len(report)} libros en {time.perf_counter() - start:.1f}s: "
+          f"{len(report) - len(failed)} correctos, {len(failed)} con error")
+    print(f"Resultados en {os.path.abspath(args.output)}")
+    return 1 if len(failed) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
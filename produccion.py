@@ -0,0 +1,457 @@
+"""
+Consulta de producción diaria por proceso y almacén local por día.
+
+CONSULTA_PRODUCCION devuelve filas Fecha / Proceso / Cantidad (la suma del
+día por proceso, una fila por día y proceso) para un rango de fechas. AlmacenProduccion guarda esas filas
+en SQLite, particionadas por día: una carga nueva consulta solo los días que
+faltan y vuelve a consultar los días recientes, que todavía pueden cambiar;
+el resto del rango se lee del almacén. Cada día del almacén tiene el día
+completo, hasta las 23:59:59.997.
+
+CONSULTAS_POR_PROCESO tiene cada rama de la consulta como una consulta
+propia; consultar_produccion_paralela las ejecuta a la vez en hilos y arma en
+pandas el mismo resultado que CONSULTA_PRODUCCION.
+"""
+import datetime
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+
+RUTA_POR_DEFECTO = os.path.join('.cache', 'produccion.sqlite')
+DIAS_RECIENTES_POR_DEFECTO = int(os.environ.get('PRODUCCION_DIAS_RECIENTES', '3'))
+COLUMNAS = ['Fecha', 'Proceso', 'Cantidad']
+
+# Orden de las ramas de la consulta, cada una con su par de fechas
+PROCESOS = [
+    'Produccion_Hilado',
+    'Produccion_Tejido',
+    'Produccion_Armado',
+    'Produccion_Teñido',
+    'Produccion_Corte',
+    'Produccion_Costura',
+]
+
+CONSULTA_PRODUCCION = """
+;WITH ProductionCTE AS (
+    Select 
+        convert(date,sc.Fecha) as Fecha, 
+        convert(int,sum(sc.Kg_Hilado)) AS Produccion_Hilado,
+        convert(int,sum(sc.Kg_Tejido)) AS Produccion_Tejido,
+        convert(int,sum(sc.Kg_Armados)) AS Produccion_Armado,
+        convert(int,sum(sc.Kg_Teñidos)) AS Produccion_Teñido,
+        convert(int,sum(sc.Unid_Cortadas)) AS Produccion_Corte,
+        convert(int,sum(Unid_Cosidas)) AS Produccion_Costura
+    From
+    (
+        -- Hilado
+        select 
+            b.dtFechaRegistro AS Fecha, 
+            a.dCantidadIng AS Kg_Hilado, 
+            0 AS Kg_Tejido, 
+            0 AS Kg_Armados,
+            0 AS Kg_Teñidos,
+            0 AS Unid_Cortadas,
+            0 AS Unid_Cosidas
+        from docNotaInventarioItem a 
+        inner join docNotaInventario b
+        on b.IdDocumento_NotaInventario = a.IdDocumento_NotaInventario
+        where a.IdtdItemForm=19 
+        and a.dCantidadIng>0 
+        and a.IdmaeCentroCosto=7 
+        and b.IdtdDocumentoForm=1 
+        and b.IdmaeArea_Almacen=6 
+        and b.dtFechaRegistro BETWEEN ? AND ?
+
+        union all
+
+        -- Tejido
+        select 
+            dtFechaEmision, 
+            0 AS Kg_Hilado, 
+            dpeso as Kg_Tejido, 
+            0 AS Kg_Armados,
+            0 AS Kg_Teñidos,
+            0 AS Unid_Cortadas,
+            0 AS Unid_Cosidas
+        from docOrdenProduccionRollo
+        where dtFechaEmision BETWEEN ? AND ?
+
+        union all
+
+        -- Partidas armadas
+        select 
+            dtFechaEmision,  
+            0 AS Kg_Hilado, 
+            0 as Kg_Tejido, 
+            dCantidad AS Kg_Armados,
+            0 AS Kg_Teñidos,
+            0 AS Unid_Cortadas,
+            0 AS Unid_Cosidas
+        from docOrdenProduccion
+        where IdtdDocumentoForm=138 
+        and bAnulado=0
+        and dtFechaEmision BETWEEN ? AND ?
+
+        union all
+
+        -- Teñido
+        select  
+            cast(convert(char(8), Fechacerrado, 112) as datetime) AS Fecha, 
+            0 AS Kg_Hilado, 
+            0 as Kg_Tejido, 
+            0 AS Kg_Armados,
+            dCantidad AS Kg_Teñidos,
+            0 AS Unid_Cortadas,
+            0 AS Unid_Cosidas
+        from docOrdenProduccion
+        where IdtdDocumentoForm=138 
+        and bAnulado=0 
+        and bCerrado=1
+        and cast(convert(char(8), Fechacerrado, 112) as datetime) BETWEEN ? AND ?
+
+        union all
+
+        -- Corte
+        SELECT  
+            a.dtFechaRegistro,
+            0 AS Kg_Hilado, 
+            0 as Kg_Tejido, 
+            0 AS Kg_Armados,
+            0 AS Kg_Teñidos,
+            b.dCantidadIng AS Unid_Cortadas,
+            0 AS Unid_Cosidas
+        FROM dbo.docNotaInventario a 
+        INNER JOIN dbo.docNotaInventarioItem b      
+            ON a.IdDocumento_NotaInventario = b.IdDocumento_NotaInventario     
+            AND b.dCantidadIng <> 0     
+        INNER JOIN dbo.docOrdenProduccion c    
+            ON a.IdDocumento_OrdenProduccion = c.IdDocumento_OrdenProduccion    
+            AND c.bCerrado = 0      
+            AND c.bAnulado = 0    
+            AND c.IdtdDocumentoForm = 127
+        WHERE (a.IdtdDocumentoForm = 131)
+            AND (a.bDevolucion = 0)      
+            AND (a.bDesactivado = 0)      
+            AND (a.bAnulado = 0)      
+            AND (a.IdDocumento_OrdenProduccion <> 0) 
+            and a.dtFechaRegistro BETWEEN ? AND ?
+            and a.IdmaeCentroCosto=29
+
+        union all
+
+        -- Costura
+        SELECT  
+            a.dtFechaRegistro, 
+            0 AS Kg_Hilado, 
+            0 as Kg_Tejido, 
+            0 AS Kg_Armados,
+            0 AS Kg_Teñidos,
+            0 AS Unid_Cortadas,
+            b.dCantidadIng AS Unid_Cosidas  
+        FROM dbo.docNotaInventario a 
+        INNER JOIN dbo.docNotaInventarioItem b      
+            ON a.IdDocumento_NotaInventario = b.IdDocumento_NotaInventario     
+            AND b.dCantidadIng <> 0     
+        INNER JOIN dbo.docOrdenProduccion c    
+            ON a.IdDocumento_OrdenProduccion = c.IdDocumento_OrdenProduccion    
+            AND c.bCerrado = 0      
+            AND c.bAnulado = 0    
+            AND c.IdtdDocumentoForm = 127
+        WHERE (a.IdtdDocumentoForm = 131)
+            AND (a.bDevolucion = 0)      
+            AND (a.bDesactivado = 0)      
+            AND (a.bAnulado = 0)      
+            AND (a.IdDocumento_OrdenProduccion <> 0) 
+            and a.dtFechaRegistro BETWEEN ? AND ?
+            and a.IdmaeCentroCosto=47
+    ) sc
+    -- Un día por fila, igual que las consultas por proceso (las fechas traen hora)
+    group by convert(date,sc.Fecha)
+)
+SELECT 
+    Fecha,
+    Proceso,
+    Cantidad
+FROM ProductionCTE
+UNPIVOT
+(
+    Cantidad FOR Proceso IN 
+    (
+        Produccion_Hilado,
+        Produccion_Tejido,
+        Produccion_Armado,
+        Produccion_Teñido,
+        Produccion_Corte,
+        Produccion_Costura
+    )
+) AS UnpivotedData
+ORDER BY Fecha, Proceso;
+"""
+
+# Cada rama por separado: suma diaria del proceso entre dos fechas
+CONSULTAS_POR_PROCESO = {
+    'Produccion_Hilado': """
+        select
+            convert(date, b.dtFechaRegistro) AS Fecha,
+            convert(int, sum(a.dCantidadIng)) AS Cantidad
+        from docNotaInventarioItem a
+        inner join docNotaInventario b
+        on b.IdDocumento_NotaInventario = a.IdDocumento_NotaInventario
+        where a.IdtdItemForm=19
+        and a.dCantidadIng>0
+        and a.IdmaeCentroCosto=7
+        and b.IdtdDocumentoForm=1
+        and b.IdmaeArea_Almacen=6
+        and b.dtFechaRegistro BETWEEN ? AND ?
+        group by convert(date, b.dtFechaRegistro)
+    """,
+    'Produccion_Tejido': """
+        select
+            convert(date, dtFechaEmision) AS Fecha,
+            convert(int, sum(dpeso)) AS Cantidad
+        from docOrdenProduccionRollo
+        where dtFechaEmision BETWEEN ? AND ?
+        group by convert(date, dtFechaEmision)
+    """,
+    'Produccion_Armado': """
+        select
+            convert(date, dtFechaEmision) AS Fecha,
+            convert(int, sum(dCantidad)) AS Cantidad
+        from docOrdenProduccion
+        where IdtdDocumentoForm=138
+        and bAnulado=0
+        and dtFechaEmision BETWEEN ? AND ?
+        group by convert(date, dtFechaEmision)
+    """,
+    'Produccion_Teñido': """
+        select
+            convert(date, cast(convert(char(8), Fechacerrado, 112) as datetime)) AS Fecha,
+            convert(int, sum(dCantidad)) AS Cantidad
+        from docOrdenProduccion
+        where IdtdDocumentoForm=138
+        and bAnulado=0
+        and bCerrado=1
+        and cast(convert(char(8), Fechacerrado, 112) as datetime) BETWEEN ? AND ?
+        group by convert(date, cast(convert(char(8), Fechacerrado, 112) as datetime))
+    """,
+}
+
+_CONSULTA_NOTAS_PRODUCCION = """
+    SELECT
+        convert(date, a.dtFechaRegistro) AS Fecha,
+        convert(int, sum(b.dCantidadIng)) AS Cantidad
+    FROM dbo.docNotaInventario a
+    INNER JOIN dbo.docNotaInventarioItem b
+        ON a.IdDocumento_NotaInventario = b.IdDocumento_NotaInventario
+        AND b.dCantidadIng <> 0
+    INNER JOIN dbo.docOrdenProduccion c
+        ON a.IdDocumento_OrdenProduccion = c.IdDocumento_OrdenProduccion
+        AND c.bCerrado = 0
+        AND c.bAnulado = 0
+        AND c.IdtdDocumentoForm = 127
+    WHERE (a.IdtdDocumentoForm = 131)
+        AND (a.bDevolucion = 0)
+        AND (a.bDesactivado = 0)
+        AND (a.bAnulado = 0)
+        AND (a.IdDocumento_OrdenProduccion <> 0)
+        and a.dtFechaRegistro BETWEEN ? AND ?
+        and a.IdmaeCentroCosto={centro_costo}
+    group by convert(date, a.dtFechaRegistro)
+"""
+CONSULTAS_POR_PROCESO['Produccion_Corte'] = _CONSULTA_NOTAS_PRODUCCION.format(centro_costo=29)
+CONSULTAS_POR_PROCESO['Produccion_Costura'] = _CONSULTA_NOTAS_PRODUCCION.format(centro_costo=47)
+
+
+def fin_del_dia(fecha):
+    """Último instante del día que distingue el tipo datetime de SQL Server"""
+    return datetime.datetime.combine(fecha, datetime.time(23, 59, 59, 997000))
+
+
+def consultar_produccion(pool, fecha_inicio, fecha_fin, nombre="produccion"):
+    """Ejecuta la consulta completa para el rango (6 pares de fechas) y devuelve un DataFrame"""
+    params = [fecha_inicio, fecha_fin] * len(PROCESOS)
+    return pool.consultar_por_lotes(CONSULTA_PRODUCCION, params, nombre=nombre)
+
+
+def consultar_rama(pool, proceso, fecha_inicio, fecha_fin):
+    """Suma diaria de un proceso (columnas Fecha, Cantidad)"""
+    return pool.consultar_por_lotes(CONSULTAS_POR_PROCESO[proceso], [fecha_inicio, fecha_fin], nombre=proceso)
+
+
+def combinar_ramas(ramas):
+    """
+    Une los resultados por proceso en el formato de CONSULTA_PRODUCCION. Como en la consulta
+    original, un día con datos de algún proceso tiene fila para todos (en 0 si no produjeron);
+    una suma nula solo se descarta si ningún otro proceso tuvo filas ese día.
+    """
+    partes = [rama.assign(Proceso=proceso) for proceso, rama in ramas.items() if len(rama)]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS)
+    combinado = pd.concat(partes, ignore_index=True)
+    ancho = combinado.pivot(index='Fecha', columns='Proceso', values='Cantidad')
+    ancho = ancho.reindex(columns=PROCESOS).astype('float64')
+    presente = combinado.assign(presente=True).pivot(index='Fecha', columns='Proceso', values='presente')
+    presente = presente.reindex(columns=PROCESOS).notna()
+    unico = presente.sum(axis=1) == 1
+    nulo = ancho.isna() & presente & unico.to_numpy()[:, None]
+    ancho = ancho.fillna(0).mask(nulo)
+
+    largo = ancho.stack(future_stack=True).dropna().rename('Cantidad').reset_index()
+    largo = largo.sort_values(['Fecha', 'Proceso'], kind='stable', ignore_index=True)
+    largo['Cantidad'] = largo['Cantidad'].astype('int64')
+    return largo[COLUMNAS]
+
+
+def consultar_produccion_paralela(consultar, fecha_inicio, fecha_fin, trabajadores=len(PROCESOS)):
+    """
+    Ejecuta consultar(proceso, inicio, fin) para cada proceso en paralelo y devuelve
+    (df, segundos por proceso). `consultar` puede tener su propio caché por proceso.
+    """
+    def medir(proceso):
+        inicio = time.perf_counter()
+        rama = consultar(proceso, fecha_inicio, fecha_fin)
+        return rama, time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=trabajadores) as ejecutor:
+        resultados = dict(zip(PROCESOS, ejecutor.map(medir, PROCESOS)))
+    ramas = {proceso: rama for proceso, (rama, _) in resultados.items()}
+    segundos = {proceso: round(tiempo, 3) for proceso, (_, tiempo) in resultados.items()}
+    return combinar_ramas(ramas), segundos
+
+
+def _como_fecha(valor):
+    return pd.Timestamp(valor).date()
+
+
+def tramos_continuos(dias):
+    """Agrupa una lista ordenada de días en tramos (inicio, fin) sin huecos"""
+    tramos = []
+    for dia in dias:
+        if tramos and dia - tramos[-1][1] == datetime.timedelta(days=1):
+            tramos[-1][1] = dia
+        else:
+            tramos.append([dia, dia])
+    return [tuple(tramo) for tramo in tramos]
+
+
+class AlmacenProduccion:
+    """Filas de producción guardadas por día en SQLite, con registro de los días ya cargados"""
+
+    def __init__(self, ruta=RUTA_POR_DEFECTO, dias_recientes=DIAS_RECIENTES_POR_DEFECTO):
+        self.ruta = ruta
+        self.dias_recientes = dias_recientes
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS produccion (
+                    Fecha TEXT NOT NULL,
+                    Proceso TEXT NOT NULL,
+                    Cantidad INTEGER,
+                    PRIMARY KEY (Fecha, Proceso)
+                )
+            """)
+            # Un día cargado sin producción no tiene filas, por eso los días se registran aparte
+            conn.execute("CREATE TABLE IF NOT EXISTS dias (Fecha TEXT PRIMARY KEY, actualizado REAL NOT NULL)")
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def dias_por_consultar(self, fecha_inicio, fecha_fin, hoy=None):
+        """Días del rango que faltan en el almacén o que son recientes y pueden cambiar"""
+        fecha_inicio, fecha_fin = _como_fecha(fecha_inicio), _como_fecha(fecha_fin)
+        hoy = _como_fecha(hoy or datetime.date.today())
+        limite_reciente = hoy - datetime.timedelta(days=self.dias_recientes)
+        with self._conectar() as conn:
+            cargados = {
+                fila[0] for fila in conn.execute(
+                    "SELECT Fecha FROM dias WHERE Fecha BETWEEN ? AND ?",
+                    (fecha_inicio.isoformat(), fecha_fin.isoformat())
+                )
+            }
+        dias = pd.date_range(fecha_inicio, fecha_fin, freq='D').date
+        return [dia for dia in dias if dia.isoformat() not in cargados or dia >= limite_reciente]
+
+    def guardar(self, fecha_inicio, fecha_fin, df, hoy=None):
+        """
+        Reemplaza los días del tramo con las filas de `df`. Solo se marcan como cargados los días
+        que ya no pueden cambiar: los recientes y los futuros se vuelven a consultar siempre.
+        """
+        fecha_inicio, fecha_fin = _como_fecha(fecha_inicio), _como_fecha(fecha_fin)
+        hoy = _como_fecha(hoy or datetime.date.today())
+        limite_reciente = hoy - datetime.timedelta(days=self.dias_recientes)
+        filas = []
+        if len(df):
+            # La llave del almacén es (día, proceso): varias filas del mismo día se suman en vez de
+            # reemplazarse; una suma sin ningún valor queda nula
+            por_dia = pd.DataFrame({
+                'Fecha': pd.to_datetime(df['Fecha']).dt.strftime('%Y-%m-%d'),
+                'Proceso': df['Proceso'].to_numpy(),
+                'Cantidad': pd.to_numeric(df['Cantidad'], errors='coerce').to_numpy(),
+            }).groupby(['Fecha', 'Proceso'], as_index=False, sort=False)['Cantidad'].sum(min_count=1)
+            cantidades = por_dia['Cantidad'].round().astype('Int64')
+            filas = [
+                (fecha, proceso, None if pd.isna(cantidad) else int(cantidad))
+                for fecha, proceso, cantidad in zip(por_dia['Fecha'], por_dia['Proceso'], cantidades)
+            ]
+        dias = [
+            (dia.isoformat(), time.time())
+            for dia in pd.date_range(fecha_inicio, fecha_fin, freq='D').date if dia < limite_reciente
+        ]
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM produccion WHERE Fecha BETWEEN ? AND ?",
+                         (fecha_inicio.isoformat(), fecha_fin.isoformat()))
+            conn.executemany("INSERT OR REPLACE INTO produccion (Fecha, Proceso, Cantidad) VALUES (?, ?, ?)", filas)
+            conn.executemany("INSERT OR REPLACE INTO dias (Fecha, actualizado) VALUES (?, ?)", dias)
+
+    def leer(self, fecha_inicio, fecha_fin):
+        """Filas guardadas del rango, ordenadas por Fecha y Proceso como la consulta original"""
+        with self._conectar() as conn:
+            filas = conn.execute(
+                "SELECT Fecha, Proceso, Cantidad FROM produccion WHERE Fecha BETWEEN ? AND ? ORDER BY Fecha, Proceso",
+                (_como_fecha(fecha_inicio).isoformat(), _como_fecha(fecha_fin).isoformat())
+            ).fetchall()
+        df = pd.DataFrame.from_records(filas, columns=COLUMNAS)
+        df['Fecha'] = [datetime.date.fromisoformat(fecha) for fecha in df['Fecha']]
+        return df
+
+    def cargar(self, fecha_inicio, fecha_fin, consultar, hoy=None):
+        """
+        Devuelve (df, detalle) para el rango. `consultar(inicio, fin)` trae de la base de datos
+        las filas entre dos instantes; se llama una vez por tramo continuo de días por consultar.
+        """
+        dias = self.dias_por_consultar(fecha_inicio, fecha_fin, hoy)
+        tramos = tramos_continuos(dias)
+        for inicio, fin in tramos:
+            self.guardar(inicio, fin, consultar(inicio, fin_del_dia(fin)), hoy)
+        total_dias = (_como_fecha(fecha_fin) - _como_fecha(fecha_inicio)).days + 1
+        detalle = {
+            'tramos': tramos,
+            'dias_consultados': len(dias),
+            'dias_almacen': max(total_dias - len(dias), 0),
+        }
+        return self.leer(fecha_inicio, fecha_fin), detalle
+
+    def estadisticas(self):
+        with self._conectar() as conn:
+            dias, primero, ultimo = conn.execute("SELECT COUNT(*), MIN(Fecha), MAX(Fecha) FROM dias").fetchone()
+            filas = conn.execute("SELECT COUNT(*) FROM produccion").fetchone()[0]
+        return {'dias': dias, 'filas': filas, 'primer_dia': primero, 'ultimo_dia': ultimo}
+
+    def limpiar(self):
+        """Borra todos los días guardados"""
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM produccion")
+            conn.execute("DELETE FROM dias")
@@ -0,0 +1,189 @@
+"""
+Respuestas directas para preguntas frecuentes sobre la producción.
+
+Reconoce preguntas simples sobre el DataFrame Fecha / Proceso / Cantidad
+(totales por proceso, tendencia diaria, totales semanales, mejor y peor día,
+variación semana contra semana, promedio diario) y las responde con pandas
+vectorizado, sin llamar al LLM, siempre sobre todo el rango cargado. Si la
+pregunta no encaja con ninguna ruta, o menciona una fecha, un número o una
+condición, se devuelve None y la aplicación usa el agente.
+"""
+import re
+
+import pandas as pd
+
+from cache_respuestas import normalizar_texto
+
+# Raíz de la palabra (sin tildes, al inicio de una palabra) -> valor de la columna Proceso
+PROCESOS = {
+    r'hil(ad|o\b|aron|amos)': 'Produccion_Hilado',
+    r'tej(id|io\b|ieron|er\b)': 'Produccion_Tejido',
+    r'arm(ad|o\b|aron)': 'Produccion_Armado',
+    r'ten(id|ir\b|imos)': 'Produccion_Teñido',
+    r'tin(o|e|en|eron)\b': 'Produccion_Teñido',
+    r'cort(e|ad|o\b|aron|amos)': 'Produccion_Corte',
+    r'cos(tura|id|io\b|ieron|er\b)': 'Produccion_Costura',
+}
+
+# Preguntas abiertas que siempre van al agente
+PATRON_ABIERTA = re.compile(r'por que|porque|explic|recomiend|predic|pronostic|proyecc|correlac|causa|deberia')
+
+# Las rutas rápidas responden sobre todo el rango cargado: una fecha, un número o una condición
+# cambian la pregunta y la respuesta queda para el agente
+MESES = r'enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre'
+PATRON_FECHA = re.compile(
+    rf'\b({MESES}|lunes|martes|miercoles|jueves|viernes|sabado|domingo|ayer|anteayer|hoy|manana)\b'
+    r'|\b(mes|meses|ano|anos|trimestre|quincena|fecha|desde|hasta)\b'
+    r'|\b(esta|este|ultim[oa]s?|pasad[oa]s?|anterior|proxim[oa]s?) (semana|semanas|dias|mes|meses|ano)\b'
+    r'|\b(semana|mes|ano) (pasad[oa]|anterior|actual)\b'
+)
+PATRON_NUMERO = re.compile(r'\d|\b(un|una|uno|dos|tres|cuatro|cinco|seis|siete|ocho|nueve|diez|mil|cien|cientos?)\b')
+PATRON_CONDICION = re.compile(
+    r'\bsuper|\bexced|\bsobrepas|\bmas de\b|\bmenos de\b|\b(mayor|menor)(es)? (a|que|de)\b|\bsin\b|\bentre\b'
+    r'|\bencima\b|\bdebajo\b|\bal menos\b|\bigual|\bumbral|\bsolo\b|\bcuant[oa]s (dias|veces|semanas)\b'
+    r'|\bsi\b|\bcuando\b|\bdonde\b'
+)
+
+PATRON_VARIACION = re.compile(r'variacion|cambio semanal|semana contra semana|comparad[oa] con la semana|vs semana')
+PATRON_MEJOR = re.compile(r'mejor dia|dia con mas|dia de mayor|dia mas productivo')
+PATRON_PEOR = re.compile(r'peor dia|dia con menos|dia de menor|dia menos productivo')
+PATRON_SEMANA = re.compile(r'\bpor semana\b|semanal')
+PATRON_DIARIO = re.compile(r'diari|por dia|tendencia|evolucion')
+PATRON_PROMEDIO = re.compile(r'promedio')
+PATRON_TOTAL = re.compile(r'\btotal|\bsuma\b|produccion por proceso')
+
+
+def etiqueta_proceso(proceso):
+    return str(proceso).replace('Produccion_', '')
+
+
+def preparar_datos(df):
+    """Convierte Fecha a datetime una sola vez para las respuestas rápidas"""
+    preparado = df[['Fecha', 'Proceso', 'Cantidad']].copy()
+    preparado['Fecha'] = pd.to_datetime(preparado['Fecha'])
+    preparado['Cantidad'] = pd.to_numeric(preparado['Cantidad'], errors='coerce').fillna(0)
+    return preparado
+
+
+def _procesos_mencionados(texto):
+    return sorted({proceso for raiz, proceso in PROCESOS.items() if re.search(r'\b' + raiz, texto)})
+
+
+def _pivote(df, frecuencia):
+    tabla = df.pivot_table(index=pd.Grouper(key='Fecha', freq=frecuencia), columns='Proceso',
+                           values='Cantidad', aggfunc='sum', fill_value=0)
+    tabla.columns = [etiqueta_proceso(col) for col in tabla.columns]
+    return tabla
+
+
+def _respuesta(texto, tabla=None, grafico=None, tipo_grafico=None):
+    return {'texto': texto, 'tabla': tabla, 'grafico': grafico, 'tipo_grafico': tipo_grafico}
+
+
+def _totales(df):
+    totales = df.groupby('Proceso')['Cantidad'].sum().sort_values(ascending=False)
+    totales.index = [etiqueta_proceso(proceso) for proceso in totales.index]
+    tabla = totales.rename('Total').to_frame()
+    lineas = [f"- **{proceso}**: {total:,.0f}" for proceso, total in totales.items()]
+    return _respuesta("Producción total por proceso:\n\n" + "\n".join(lineas), tabla, tabla, 'bar')
+
+
+def _promedio_diario(df):
+    diario = _pivote(df, 'D')
+    promedio = diario.mean().sort_values(ascending=False).rename('Promedio diario').to_frame()
+    lineas = [f"- **{proceso}**: {valor:,.1f}" for proceso, valor in promedio['Promedio diario'].items()]
+    return _respuesta(f"Promedio diario por proceso ({len(diario)} días):\n\n" + "\n".join(lineas), promedio,
+                      promedio, 'bar')
+
+
+def _tendencia_diaria(df):
+    diario = _pivote(df, 'D')
+    texto = (f"Producción diaria por proceso del {diario.index.min():%d/%m/%Y} "
+             f"al {diario.index.max():%d/%m/%Y} ({len(diario)} días).")
+    return _respuesta(texto, diario, diario, 'line')
+
+
+def _totales_semanales(df):
+    semanal = _pivote(df, 'W-SUN')
+    semanal.index = semanal.index.strftime('Semana al %d/%m/%Y')
+    return _respuesta("Producción por semana (de lunes a domingo):", semanal, semanal, 'bar')
+
+
+def _extremo_diario(df, mejor):
+    diario = _pivote(df, 'D')
+    fechas = diario.idxmax() if mejor else diario.idxmin()
+    valores = diario.max() if mejor else diario.min()
+    tabla = pd.DataFrame({'Fecha': fechas.dt.strftime('%d/%m/%Y'), 'Cantidad': valores})
+    titulo = "Mejor día" if mejor else "Peor día"
+    lineas = [f"- **{proceso}**: {fila.Fecha} ({fila.Cantidad:,.0f})" for proceso, fila in tabla.iterrows()]
+    return _respuesta(f"{titulo} por proceso:\n\n" + "\n".join(lineas), tabla)
+
+
+def _variacion_semanal(df):
+    # La última semana puede estar incompleta: se compara con los mismos días de la semana
+    # anterior para que las dos ventanas tengan el mismo largo
+    ultimo = df['Fecha'].max().normalize() if len(df) else pd.NaT
+    inicio = ultimo - pd.Timedelta(days=ultimo.weekday()) if pd.notna(ultimo) else pd.NaT
+    if pd.isna(ultimo) or df['Fecha'].min() >= inicio:
+        return _respuesta("No hay al menos dos semanas en el rango cargado para comparar.")
+    dias = (ultimo - inicio).days + 1
+    semana = pd.Timedelta(days=7)
+    fin = ultimo + pd.Timedelta(days=1)
+    procesos = [etiqueta_proceso(proceso) for proceso in sorted(df['Proceso'].unique())]
+
+    def ventana(desde, hasta):
+        filas = df[(df['Fecha'] >= desde) & (df['Fecha'] < hasta)]
+        totales = filas.groupby('Proceso')['Cantidad'].sum()
+        totales.index = [etiqueta_proceso(proceso) for proceso in totales.index]
+        return totales.reindex(procesos, fill_value=0)
+
+    anterior, actual = ventana(inicio - semana, fin - semana), ventana(inicio, fin)
+    tabla = pd.DataFrame({
+        f"{ultimo - semana:%d/%m}": anterior,
+        f"{ultimo:%d/%m}": actual,
+        'Diferencia': actual - anterior,
+        'Variación %': ((actual - anterior) / anterior.where(anterior != 0) * 100).round(1),
+    })
+    lineas = [
+        f"- **{proceso}**: {fila['Diferencia']:+,.0f}"
+        + (f" ({fila['Variación %']:+.1f}%)" if pd.notna(fila['Variación %']) else "")
+        for proceso, fila in tabla.iterrows()
+    ]
+    titulo = ("Variación de la última semana contra la anterior" if dias == 7 else
+              f"Variación de la última semana ({dias} días cargados) contra los mismos días de la anterior")
+    return _respuesta(titulo + ":\n\n" + "\n".join(lineas), tabla,
+                      tabla[['Diferencia']], 'bar')
+
+
+def responder_rapido(pregunta, df):
+    """
+    Devuelve un diccionario con texto, tabla y gráfico si la pregunta tiene una ruta directa,
+    o None si debe responderla el agente. `df` debe venir de preparar_datos.
+    """
+    texto = normalizar_texto(pregunta)
+    if PATRON_ABIERTA.search(texto) or PATRON_FECHA.search(texto) or PATRON_NUMERO.search(texto):
+        return None
+    if PATRON_CONDICION.search(texto):
+        return None
+
+    procesos = _procesos_mencionados(texto)
+    if procesos:
+        df = df[df['Proceso'].isin(procesos)]
+    if df.empty:
+        return None
+
+    if PATRON_VARIACION.search(texto):
+        return _variacion_semanal(df)
+    if PATRON_MEJOR.search(texto):
+        return _extremo_diario(df, mejor=True)
+    if PATRON_PEOR.search(texto):
+        return _extremo_diario(df, mejor=False)
+    if PATRON_PROMEDIO.search(texto):
+        return _promedio_diario(df)
+    if PATRON_SEMANA.search(texto):
+        return _totales_semanales(df)
+    if PATRON_DIARIO.search(texto):
+        return _tendencia_diaria(df)
+    if PATRON_TOTAL.search(texto):
+        return _totales(df)
+    return None
@@ -0,0 +1,118 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from base_datos import PoolConexiones, conector_sqlite
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    ruta = str(tmp_path / 'bd.sqlite')
+    conexion = sqlite3.connect(ruta)
+    conexion.execute("CREATE TABLE ordenes (id INTEGER, cliente TEXT, minutos REAL)")
+    conexion.executemany("INSERT INTO ordenes VALUES (?, ?, ?)",
+                         [(i, f"C{i % 3}", i * 1.5) for i in range(25)])
+    conexion.commit()
+    conexion.close()
+    return ruta
+
+
+def _falla_las_primeras(conectar, fallas):
+    intentos = []
+
+    def conectar_inestable():
+        intentos.append(1)
+        if len(intentos) <= fallas:
+            raise sqlite3.OperationalError("red caída")
+        return conectar()
+    return conectar_inestable, intentos
+
+
+def test_reintenta_al_conectar(ruta):
+    conectar, intentos = _falla_las_primeras(conector_sqlite(ruta), fallas=2)
+    pool = PoolConexiones(conectar, intentos=3, espera_inicial=0)
+
+    df = pool.consultar("SELECT * FROM ordenes WHERE cliente = ?", ["C0"], nombre="ordenes C0")
+
+    assert len(df) == 9
+    assert len(intentos) == 3
+    assert pool.conexiones_creadas == 1
+    assert pool.historial[-1]["filas"] == 9
+    assert pool.historial[-1]["error"] is None
+
+
+def test_sin_conexion_registra_el_error(ruta):
+    conectar, intentos = _falla_las_primeras(conector_sqlite(ruta), fallas=5)
+    pool = PoolConexiones(conectar, intentos=2, espera_inicial=0)
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.consultar("SELECT * FROM ordenes", nombre="ordenes")
+
+    assert len(intentos) == 2
+    assert pool.historial[-1]["consulta"] == "ordenes"
+    assert "red caída" in pool.historial[-1]["error"]
+
+
+def test_error_de_la_consulta_no_se_reintenta(ruta):
+    pool = PoolConexiones(conector_sqlite(ruta), intentos=3, espera_inicial=0)
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.consultar("SELECT * FROM no_existe")
+
+    assert pool.historial[-1]["intentos"] == 1
+    # La conexión seguía sana y vuelve al grupo
+    assert pool.estadisticas()["conexiones_libres"] == 1
+    assert pool.conexiones_descartadas == 0
+
+
+def test_conexion_rota_durante_la_consulta_se_reintenta(ruta):
+    pool = PoolConexiones(conector_sqlite(ruta), intentos=3, espera_inicial=0)
+    llamadas = []
+
+    def leer(conexion):
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            conexion.close()
+            raise sqlite3.ProgrammingError("conexión perdida")
+        return pd.read_sql("SELECT * FROM ordenes", conexion)
+
+    df = pool.ejecutar(leer, nombre="ordenes")
+
+    assert len(df) == 25
+    assert pool.historial[-1]["intentos"] == 2
+    assert pool.conexiones_descartadas == 1
+    assert pool.conexiones_creadas == 2
+
+
+def test_verifica_las_conexiones_inactivas(ruta):
+    pool = PoolConexiones(conector_sqlite(ruta), verificar_tras=0, espera_inicial=0)
+    pool.consultar("SELECT * FROM ordenes")
+    # La conexión libre se corta mientras está inactiva
+    pool._libres.queue[0].conexion.close()
+
+    df = pool.consultar("SELECT * FROM ordenes")
+
+    assert len(df) == 25
+    assert pool.conexiones_descartadas == 1
+    assert pool.conexiones_creadas == 2
+
+
+def test_reutiliza_conexiones_activas(ruta):
+    pool = PoolConexiones(conector_sqlite(ruta))
+    for _ in range(3):
+        pool.consultar("SELECT * FROM ordenes")
+
+    assert pool.conexiones_creadas == 1
+    assert pool.estadisticas()["consultas"] == 3
+
+
+def test_por_lotes_igual_que_consultar(ruta):
+    pool = PoolConexiones(conector_sqlite(ruta))
+    sql = "SELECT * FROM ordenes ORDER BY id"
+
+    por_lotes = pool.consultar_por_lotes(sql, tamano_lote=7)
+
+    pd.testing.assert_frame_equal(por_lotes, pool.consultar(sql))
+    assert sum(lote.num_rows for lote in pool.iterar_lotes(sql, tamano_lote=7)) == 25
+    assert [entrada["filas"] for entrada in pool.historial] == [25, 25, 25]
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("langchain_experimental")
+pytest.importorskip("langchain_groq")
+
+from benchmark_agente import PREGUNTAS_POR_DEFECTO, datos_sinteticos, ejecutar_benchmark, resumen  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def datos():
+    return datos_sinteticos(dias=30)
+
+
+@pytest.mark.parametrize("usar_memoria", [False, True])
+def test_cada_pregunta_sigue_su_guion(datos, usar_memoria):
+    resultados = ejecutar_benchmark(datos, PREGUNTAS_POR_DEFECTO, usar_memoria=usar_memoria)
+
+    esperadas = [sum(1 for paso in item["pasos"] if "Action:" in paso) for item in PREGUNTAS_POR_DEFECTO]
+    assert list(resultados["iteraciones"]) == esperadas == [1, 1, 2, 1]
+    assert list(resultados["llamadas_llm"]) == [n + 1 for n in esperadas]
+    assert (resultados["tokens_prompt"] > resultados["tokens_contexto"]).all()
+
+
+def test_memoria_envia_mas_contexto_con_el_mismo_guion(datos):
+    sin_memoria = ejecutar_benchmark(datos, PREGUNTAS_POR_DEFECTO)
+    con_memoria = ejecutar_benchmark(datos, PREGUNTAS_POR_DEFECTO, usar_memoria=True)
+
+    assert list(con_memoria["tokens_salida"]) == list(sin_memoria["tokens_salida"])
+    assert con_memoria["tokens_contexto"].iloc[-1] > sin_memoria["tokens_contexto"].iloc[-1]
+
+
+def test_cache_responde_la_segunda_repeticion(datos):
+    resultados = ejecutar_benchmark(datos, PREGUNTAS_POR_DEFECTO, repeticiones=2, usar_cache=True)
+
+    assert not resultados.loc[resultados["repeticion"] == 1, "desde_cache"].any()
+    segunda = resultados[resultados["repeticion"] == 2]
+    assert segunda["desde_cache"].all()
+    assert (segunda["tokens_prompt"] == 0).all()
+    assert list(resumen(resultados)["aciertos_cache"]) == [1, 1, 1, 1]
@@ -0,0 +1,113 @@
+import pytest
+
+import cache_respuestas
+from cache_respuestas import CacheRespuestas
+from memoria_chat import PREFIJO_RESUMEN
+
+
+class LLMLocal:
+    """Generador local que cuenta cuántas veces se le llamó"""
+
+    def __init__(self):
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        return f"respuesta {self.llamadas}"
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_respuestas.time, 'time', reloj)
+    return reloj
+
+
+@pytest.fixture
+def cache(tmp_path, reloj):
+    return CacheRespuestas(str(tmp_path / 'respuestas.sqlite'), ttl_segundos=60, max_entradas=2)
+
+
+def test_fallo_y_luego_acierto(cache):
+    llm = LLMLocal()
+    llave = cache.llave('huella', '¿Cuántas órdenes hay?')
+
+    assert cache.responder(llave, llm) == ("respuesta 1", False)
+    # La misma pregunta escrita distinto da la misma llave
+    assert cache.responder(cache.llave('huella', 'cuantas ordenes hay'), llm) == ("respuesta 1", True)
+    assert llm.llamadas == 1
+    assert cache.estadisticas() == {'aciertos': 1, 'fallos': 1, 'entradas': 1}
+
+
+def test_otra_huella_es_fallo(cache):
+    llm = LLMLocal()
+    cache.responder(cache.llave('huella 1', 'pregunta'), llm)
+
+    assert cache.responder(cache.llave('huella 2', 'pregunta'), llm) == ("respuesta 2", False)
+    assert cache.estadisticas()['fallos'] == 2
+
+
+def test_ignorar_cache_vuelve_a_generar(cache):
+    llm = LLMLocal()
+    llave = cache.llave('huella', 'pregunta')
+    cache.responder(llave, llm)
+
+    assert cache.responder(llave, llm, ignorar_cache=True) == ("respuesta 2", False)
+    assert cache.obtener(llave) == "respuesta 2"
+
+
+def test_vence_por_ttl(cache, reloj):
+    llm = LLMLocal()
+    llave = cache.llave('huella', 'pregunta')
+    cache.responder(llave, llm)
+
+    reloj.ahora += 59
+    assert cache.obtener(llave) == "respuesta 1"
+    reloj.ahora += 2
+    assert cache.obtener(llave) is None
+    assert cache.responder(llave, llm) == ("respuesta 2", False)
+    assert cache.estadisticas() == {'aciertos': 1, 'fallos': 3, 'entradas': 1}
+
+
+def test_descarta_la_usada_hace_mas_tiempo(cache, reloj):
+    llaves = [cache.llave('huella', f'pregunta {i}') for i in range(3)]
+    cache.guardar(llaves[0], 'a')
+    reloj.ahora += 1
+    cache.guardar(llaves[1], 'b')
+    reloj.ahora += 1
+    # Usar la primera la vuelve la más reciente; al guardar la tercera sale la segunda
+    assert cache.obtener(llaves[0]) == 'a'
+    reloj.ahora += 1
+    cache.guardar(llaves[2], 'c')
+
+    assert cache.obtener(llaves[1]) is None
+    assert cache.obtener(llaves[0]) == 'a'
+    assert cache.obtener(llaves[2]) == 'c'
+    assert cache.estadisticas()['entradas'] == 2
+
+
+def test_limpiar(cache):
+    cache.guardar(cache.llave('huella', 'pregunta'), 'a')
+    cache.limpiar()
+    assert cache.estadisticas()['entradas'] == 0
+
+
+def test_llave_omite_solo_el_prompt_de_sistema():
+    pregunta = {"role": "user", "content": "pregunta"}
+    base = [{"role": "system", "content": "Eres un analista."}, pregunta]
+    otro_prompt = [{"role": "system", "content": "Eres otro analista."}, pregunta]
+    assert CacheRespuestas.llave('h', 'actual', base) == CacheRespuestas.llave('h', 'actual', otro_prompt)
+
+    # El resumen de memoria_chat también es de sistema, pero distingue conversaciones
+    con_resumen = [base[0], {"role": "system", "content": PREFIJO_RESUMEN + "se habló de ventas"}, pregunta]
+    otro_resumen = [base[0], {"role": "system", "content": PREFIJO_RESUMEN + "se habló de compras"}, pregunta]
+    assert CacheRespuestas.llave('h', 'actual', con_resumen) != CacheRespuestas.llave('h', 'actual', otro_resumen)
+    assert CacheRespuestas.llave('h', 'actual', con_resumen) != CacheRespuestas.llave('h', 'actual', base)
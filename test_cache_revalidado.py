@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+import cache_revalidado
+from cache_revalidado import CacheRevalidado
+
+
+class Cargador:
+    """Devuelve v1, v2, ...; puede quedar bloqueado hasta que se libere o fallar a pedido"""
+
+    def __init__(self):
+        self.llamadas = 0
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.liberar = threading.Event()
+        self.liberar.set()
+        self.empezo = threading.Event()
+        self.error = None
+        self._candado = threading.Lock()
+
+    def __call__(self):
+        with self._candado:
+            self.llamadas += 1
+            self.en_curso += 1
+            self.max_en_curso = max(self.max_en_curso, self.en_curso)
+            numero = self.llamadas
+        self.empezo.set()
+        try:
+            assert self.liberar.wait(5)
+            if self.error:
+                raise self.error
+            return f"v{numero}"
+        finally:
+            with self._candado:
+                self.en_curso -= 1
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cache_revalidado.time, 'time', reloj)
+    return reloj
+
+
+def _vencido(reloj, cargar):
+    """Caché con v1 cargado y ya vencido; la carga siguiente queda bloqueada"""
+    cache = CacheRevalidado(cargar, ttl_segundos=60)
+    assert cache.obtener()[0] == "v1"
+    reloj.ahora += 61
+    cargar.liberar.clear()
+    cargar.empezo.clear()
+    return cache
+
+
+def _terminar(cache, cargar):
+    cargar.liberar.set()
+    cache._hilo.join(5)
+    assert not cache.actualizando()
+
+
+def test_valor_vencido_mientras_se_actualiza(reloj):
+    cargar = Cargador()
+    cache = _vencido(reloj, cargar)
+
+    valor, estado = cache.obtener()
+    assert cargar.empezo.wait(5)
+    # Se entrega el valor anterior sin esperar la carga
+    assert valor == "v1"
+    assert cache.obtener()[0] == "v1"
+    assert cache.estado()['actualizando']
+
+    _terminar(cache, cargar)
+    valor, estado = cache.obtener()
+    assert valor == "v2"
+    assert estado['actualizaciones'] == 2
+    assert estado['edad'] == 0
+
+
+def test_error_conserva_el_valor_anterior(reloj):
+    cargar = Cargador()
+    cache = _vencido(reloj, cargar)
+    cargar.error = ConnectionError("sin conexión")
+
+    cache.obtener()
+    _terminar(cache, cargar)
+
+    estado = cache.estado()
+    assert estado['error'] == "ConnectionError: sin conexión"
+    assert estado['actualizaciones'] == 1
+
+    # El valor sigue vencido: la lectura siguiente entrega el anterior, reintenta y limpia el error
+    cargar.error = None
+    assert cache.obtener()[0] == "v1"
+    _terminar(cache, cargar)
+    valor, estado = cache.obtener()
+    assert (valor, estado['error']) == ("v3", None)
+
+
+def test_una_sola_actualizacion_a_la_vez(reloj):
+    cargar = Cargador()
+    cache = _vencido(reloj, cargar)
+
+    lectores = [threading.Thread(target=cache.obtener) for _ in range(8)]
+    for lector in lectores:
+        lector.start()
+    for lector in lectores:
+        lector.join(5)
+    assert cargar.empezo.wait(5)
+    assert cargar.llamadas == 2
+
+    # Forzar la carga espera a la que está en curso en vez de correr en paralelo
+    forzado = threading.Thread(target=cache.obtener, kwargs={'forzar': True})
+    forzado.start()
+    _terminar(cache, cargar)
+    forzado.join(5)
+
+    assert cargar.llamadas == 3
+    assert cargar.max_en_curso == 1
+    assert cache.obtener()[0] == "v3"
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import ejecutor_aislado
+from ejecutor_aislado import EjecutorAislado, _leer_publicado
+
+
+@pytest.fixture
+def ejecutor(tmp_path):
+    ejecutor = EjecutorAislado(trabajadores=1, tiempo_maximo=20, carpeta_datos=str(tmp_path / 'ejecutor'))
+    yield ejecutor
+    ejecutor.cerrar()
+
+
+def _datos():
+    return pd.DataFrame({'Proceso': ['Corte', 'Costura', 'Corte'], 'Cantidad': [10, 20, 30]})
+
+
+def test_ejecuta_sobre_los_datos_publicados(ejecutor):
+    ruta = ejecutor.publicar('abc', _datos())
+    assert ejecutor.ejecutar(ruta, "df.groupby('Proceso')['Cantidad'].sum()['Corte']") == '40'
+    assert ejecutor.ejecutar(ruta, "```python\nprint(df['Proceso'].str.upper().tolist())\n```") == \
+        "['CORTE', 'COSTURA', 'CORTE']\n"
+
+
+def test_texto_sin_copia_a_objetos(ejecutor):
+    df = _leer_publicado(ejecutor.publicar('abc', _datos()))
+    assert df['Proceso'].dtype == pd.StringDtype('pyarrow')
+    assert df['Cantidad'].dtype == 'int64'
+
+
+def test_cancelacion_reemplaza_el_trabajador(ejecutor):
+    ruta = ejecutor.publicar('abc', _datos())
+    cancelado = threading.Event()
+    threading.Timer(0.5, cancelado.set).start()
+
+    assert ejecutor.ejecutar(ruta, "while True: pass", cancelado=cancelado) == "Error: ejecución cancelada"
+    # El trabajador nuevo responde normalmente
+    assert ejecutor.ejecutar(ruta, "len(df)") == '3'
+
+
+def test_desaloja_los_archivos_menos_usados(ejecutor, monkeypatch):
+    monkeypatch.setattr(ejecutor_aislado, 'MAX_ARCHIVOS_PUBLICADOS', 2)
+    primera = ejecutor.publicar('a', _datos())
+    segunda = ejecutor.publicar('b', _datos())
+    os.utime(primera, (0, 0))
+    os.utime(segunda, (1, 1))
+    ejecutor.ejecutar(primera, "len(df)")
+
+    tercera = ejecutor.publicar('c', _datos())
+
+    assert os.path.exists(primera) and os.path.exists(tercera)
+    assert not os.path.exists(segunda)
+    assert ejecutor.ejecutar(segunda, "len(df)").startswith("Error: los datos publicados ya no están disponibles")
+
+
+def test_espera_por_trabajador_libre_tiene_tiempo_maximo(ejecutor):
+    ruta = ejecutor.publicar('abc', _datos())
+    ocupado = threading.Thread(target=ejecutor.ejecutar, args=(ruta, "import time; time.sleep(3)"))
+    ocupado.start()
+    time.sleep(0.5)
+
+    inicio = time.monotonic()
+    texto = ejecutor.ejecutar(ruta, "len(df)", tiempo_maximo=0.5)
+
+    assert texto.startswith("Error: no hubo un proceso de ejecución libre")
+    assert time.monotonic() - inicio < 2
+    ocupado.join()
+
+
+def test_herramienta_vuelve_a_publicar_lo_desalojado(ejecutor):
+    pytest.importorskip("langchain_groq")
+    from agente_datos import HerramientaAislada
+
+    df = _datos()
+    herramienta = HerramientaAislada(ejecutor=ejecutor, ruta_datos=ejecutor.publicar('abc', df), huella='abc',
+                                     datos=df)
+    os.remove(herramienta.ruta_datos)
+
+    assert herramienta.run("len(df)") == '3'
+    assert os.path.exists(herramienta.ruta_datos)
@@ -0,0 +1,70 @@
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from ganttserv import MAX_ETIQUETAS, crear_figura, crear_figura_resumen, resumir_ordenes
+from ordenes_servicio import ModeloOrdenes
+
+
+@pytest.fixture
+def modelo():
+    return ModeloOrdenes(pd.DataFrame({
+        'OS_OT': ['OS1', 'OS2', 'OS3', 'OS4', 'OS5'],
+        'PROVEEDOR': ['Taller B', 'Taller A', 'Taller A', 'Taller B', 'Taller A'],
+        'CLIENTE': ['Cliente con nombre largo', 'Norte', 'Norte', 'Sur', 'Sur'],
+        'MIN_PEND': [100.4, 50.6, 25.0, 10.0, 40.0],
+        'PENDIENT': [20, 10, 5, 8, 6],
+        'MIN_SAL': pd.date_range('2024-05-01 08:00', periods=5, freq='D'),
+        'OP': ['OP1', 'OP2', 'OP3', 'OP4', 'OP5'],
+        'F_ENT': ['2024-06-01', '2024-06-02', '2024-06-03', None, '2024-06-05'],
+        'DIAS_DESDE_MIN_SAL': [10, 9, 8, 7, 6],
+    }))
+
+
+def _barras(fig):
+    return sum(len(trace.x) for trace in fig.data)
+
+
+def test_resumen_una_barra_por_proveedor_y_cliente(modelo):
+    resumen = resumir_ordenes(modelo.filtrar())
+    fig = crear_figura_resumen(resumen)
+
+    assert all(isinstance(trace, go.Bar) for trace in fig.data)
+    assert fig.layout.barmode == 'stack'
+    # Cuatro combinaciones de proveedor y cliente para cinco órdenes
+    assert _barras(fig) == len(resumen) == 4
+    norte = next(trace for trace in fig.data if trace.name == 'Norte')
+    assert list(norte.y) == ['Taller A']
+    assert list(norte.x) == [76]
+    assert [list(fila) for fila in norte.customdata] == [[2, 15]]
+    assert list(fig.layout.yaxis.categoryarray) == ['Taller A', 'Taller B']
+
+
+def test_ordenes_de_un_proveedor(modelo):
+    df = modelo.filtrar(proveedores=['Taller A'])
+    fig = crear_figura(df)
+
+    assert _barras(fig) == 3
+    assert {y for trace in fig.data for y in trace.y} == {'Taller A'}
+    assert sorted(trace.name for trace in fig.data) == ['Norte', 'Sur']
+    assert sorted(text for trace in fig.data for text in trace.text) == ['OS2', 'OS3', 'OS5']
+    assert {trace.textposition for trace in fig.data} == {'inside'}
+
+
+def test_todas_las_ordenes(modelo):
+    df = modelo.filtrar()
+    fig = crear_figura(df)
+
+    assert _barras(fig) == 5
+    # Los nombres de cliente llegan truncados a 15 caracteres desde el modelo
+    assert sorted(trace.name for trace in fig.data) == ['Cliente con nom', 'Norte', 'Sur']
+    assert sorted(text for trace in fig.data for text in trace.text) == ['OS1', 'OS2', 'OS3', 'OS4', 'OS5']
+
+
+def test_muchas_ordenes_sin_etiquetas(modelo):
+    df = modelo.filtrar()
+    muchas = pd.concat([df] * (MAX_ETIQUETAS // len(df) + 1), ignore_index=True)
+    fig = crear_figura(muchas)
+
+    assert _barras(fig) == len(muchas)
+    assert {trace.textposition for trace in fig.data} == {'none'}
@@ -0,0 +1,48 @@
+import io
+
+import pandas as pd
+
+import ingesta
+from ingesta import compact_dataframe
+
+
+def test_fechas_dia_mes_no_se_invierten():
+    df = pd.DataFrame({'Fecha': ['05/02/2024', '31/01/2024', None]})
+    compacted, _ = compact_dataframe(df)
+    assert compacted['Fecha'].iloc[0] == pd.Timestamp('2024-02-05')
+    assert compacted['Fecha'].iloc[1] == pd.Timestamp('2024-01-31')
+
+
+def test_fechas_con_formato_mixto_quedan_como_texto():
+    df = pd.DataFrame({'Fecha': ['2024-02-05', '05/02/2024'] * 10})
+    compacted, _ = compact_dataframe(df)
+    assert not pd.api.types.is_datetime64_any_dtype(compacted['Fecha'])
+    assert list(compacted['Fecha'].astype(str)) == list(df['Fecha'])
+
+
+def test_compactar_no_pierde_valores():
+    df = pd.DataFrame({
+        'Proceso': ['Corte', 'Costura'] * 50,
+        'Cantidad': range(100),
+        'Peso': [0.5] * 100,
+    })
+    compacted, memoria = compact_dataframe(df)
+    assert isinstance(compacted['Proceso'].dtype, pd.CategoricalDtype)
+    assert compacted['Cantidad'].dtype == 'int8'
+    assert (compacted['Peso'] == df['Peso']).all()
+    assert memoria['after'] < memoria['before']
+
+
+def test_huellas_memorizadas_acotadas(monkeypatch):
+    monkeypatch.setattr(ingesta, '_fingerprints', {})
+
+    class Subido(io.BytesIO):
+        def __init__(self, contenido, file_id):
+            super().__init__(contenido)
+            self.file_id, self.name, self.size = file_id, 'datos.csv', len(contenido)
+
+    huellas = {ingesta.file_fingerprint(Subido(b'a,b\n1,2\n', f'id-{i}'))
+               for i in range(ingesta.MAX_FINGERPRINTS + 10)}
+
+    assert len(huellas) == 1
+    assert len(ingesta._fingerprints) == ingesta.MAX_FINGERPRINTS
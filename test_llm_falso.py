@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from llm_falso import RESPUESTA_SIN_GUION, ChatFalso, paso_accion, paso_final  # noqa: E402
+
+GUIONES = {
+    "Total por proceso": [paso_accion("df.groupby('Proceso')['Cantidad'].sum()"), paso_final("Listo.")],
+    "¿Qué día se cortaron más unidades?": [paso_final("El 5 de enero.")],
+}
+
+
+def _prompt(pregunta):
+    return [HumanMessage(content=f"Use the following format:\nQuestion: the input question\n\n"
+                                 f"Begin!\n\nQuestion: {pregunta}\nThought:")]
+
+
+def test_recorre_el_guion_en_llamadas_sucesivas():
+    llm = ChatFalso(guiones=GUIONES)
+    llm.reiniciar()
+    textos = [llm.invoke(_prompt("Total por proceso")).content for _ in range(3)]
+
+    assert textos == [GUIONES["Total por proceso"][0], "Thought: I now know the final answer\nFinal Answer: Listo.",
+                      "Thought: I now know the final answer\nFinal Answer: Listo."]
+    assert llm.llamadas == 3
+    assert llm.tokens_emitidos > 0
+
+
+def test_con_historial_usa_la_pregunta_actual():
+    historial = str([{"role": "user", "content": "Total por proceso"},
+                     {"role": "user", "content": "¿Qué día se cortaron más unidades?"}])
+    llm = ChatFalso(guiones=GUIONES)
+
+    llm.reiniciar()
+    assert "5 de enero" in llm.invoke(_prompt(historial)).content
+
+    llm.reiniciar("Total por proceso")
+    assert "python_repl_ast" in llm.invoke(_prompt(historial)).content
+
+
+def test_pregunta_sin_guion():
+    llm = ChatFalso(guiones=GUIONES)
+    llm.reiniciar()
+    assert llm.invoke(_prompt("Otra cosa")).content == RESPUESTA_SIN_GUION
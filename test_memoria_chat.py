@@ -0,0 +1,36 @@
+from memoria_chat import construir_contexto, nuevo_estado
+
+
+def _conversacion(turnos, largo=40):
+    mensajes = [{"role": "system", "content": "Eres un analista."}]
+    for i in range(turnos):
+        mensajes.append({"role": "user", "content": f"pregunta {i} " + "x" * largo})
+        mensajes.append({"role": "assistant", "content": f"respuesta {i} " + "y" * largo})
+    return mensajes
+
+
+def test_turnos_resumidos_no_se_reenvian():
+    estado = nuevo_estado()
+    mensajes = _conversacion(6, largo=400)
+    # Con poco presupuesto el corte avanza más allá de los turnos recientes
+    construir_contexto(mensajes + [{"role": "user", "content": "actual"}], estado, presupuesto_tokens=300)
+    resumidos = estado["resumidos"]
+    assert resumidos > 0
+
+    # En la pregunta siguiente, con presupuesto holgado, no se reenvía lo ya resumido
+    mensajes = mensajes + [{"role": "user", "content": "actual"}, {"role": "assistant", "content": "ok"}]
+    contexto, _ = construir_contexto(mensajes + [{"role": "user", "content": "otra"}], estado,
+                                     presupuesto_tokens=100000)
+    enviados = [m["content"] for m in contexto if m["role"] != "system"]
+    ya_resumidos = [m["content"] for m in mensajes[1:1 + resumidos]]
+    assert not set(enviados) & set(ya_resumidos)
+    assert enviados[-1] == "otra"
+
+
+def test_conversacion_corta_se_envia_completa():
+    estado = nuevo_estado()
+    mensajes = _conversacion(1) + [{"role": "user", "content": "actual"}]
+    contexto, tokens = construir_contexto(mensajes, estado)
+    assert contexto == mensajes
+    assert estado["resumidos"] == 0
+    assert tokens == estado["tokens_enviados"]
@@ -0,0 +1,195 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from base_datos import PoolConexiones, conector_sqlite
+from ordenes_servicio import (CENTRO_COSTO_COSTURA, FILTRO_DOCUMENTOS, QUERY_CAMBIOS, OrdenesIncrementales,
+                              parametros_cambios)
+
+# Consultas equivalentes en SQLite, con los mismos parámetros que las de SQL Server
+ORDENES_SQLITE = """
+SELECT
+    a.OS_OT,
+    MAX(a.OP) AS OP,
+    MAX(a.PROVEEDOR) AS PROVEEDOR,
+    MAX(a.MIN_COST) * SUM(a.prog - a.prod) AS MIN_PEND,
+    SUM(a.prog - a.prod) AS PENDIENT,
+    (SELECT MIN(n.dtFechaRegistro) FROM notas n
+     WHERE n.IdDocumento = a.IdDocumento AND n.IdtdDocumentoForm = 130) AS MIN_SAL,
+    0 AS DIAS_DESDE_MIN_SAL,
+    MAX(a.CLIENTE) AS CLIENTE,
+    MIN(a.F_ENT) AS F_ENT,
+    MAX(a.IdDocumento) AS ID_DOC
+FROM (SELECT * FROM items a {filtro}) a
+WHERE ? = ?
+GROUP BY a.OS_OT
+HAVING SUM(a.prog - a.prod) > ?
+ORDER BY a.OS_OT
+"""
+
+NOTAS_POSTERIORES = """
+EXISTS (SELECT 1 FROM notas n WHERE n.IdDocumento = a.IdDocumento AND n.IdmaeItem = a.IdmaeItem
+        AND n.IdtdDocumentoForm = {form} AND n.dtFechaRegistro > ?)
+"""
+
+CONSULTAS_SQLITE = {
+    'marca_ordenes': "SELECT MAX(dtFechaRegistro) AS MARCA FROM notas WHERE IdtdDocumentoForm IN (130, 131)",
+    'cambios_ordenes': ("SELECT DISTINCT a.IdDocumento AS ID_DOC FROM items a "
+                        "INNER JOIN (SELECT DISTINCT IdDocumento FROM notas WHERE dtFechaRegistro > ?) n "
+                        "ON n.IdDocumento = a.IdDocumento "
+                        "WHERE a.centro = ? AND (" + NOTAS_POSTERIORES.format(form=131) + " OR "
+                        + NOTAS_POSTERIORES.format(form=130) + ")"),
+}
+
+
+class PoolSustituto(PoolConexiones):
+    """Grupo sobre SQLite que traduce cada consulta de SQL Server por su nombre"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recibidas = []
+
+    def _traducir(self, sql, nombre):
+        if nombre in CONSULTAS_SQLITE:
+            return CONSULTAS_SQLITE[nombre]
+        documentos = sql.count('?') - 3
+        filtro = FILTRO_DOCUMENTOS.format(marcadores=", ".join("?" * documentos)) if documentos else ""
+        return ORDENES_SQLITE.replace("{filtro}", filtro)
+
+    def consultar(self, sql, params=None, nombre="consulta"):
+        self.recibidas.append((nombre, sql, list(params or [])))
+        return super().consultar(self._traducir(sql, nombre), params, nombre)
+
+    def consultar_por_lotes(self, sql, params=None, tamano_lote=1000, nombre="consulta"):
+        return super().consultar_por_lotes(self._traducir(sql, nombre), params, tamano_lote, nombre)
+
+
+class BaseSustituta:
+    def __init__(self, ruta):
+        self.conexion = sqlite3.connect(ruta)
+        self.conexion.executescript("""
+            CREATE TABLE items (IdDocumento INTEGER, IdmaeItem INTEGER, OS_OT TEXT, OP TEXT, PROVEEDOR TEXT,
+                                CLIENTE TEXT, F_ENT TEXT, MIN_COST REAL, prog REAL, prod REAL, centro INTEGER);
+            CREATE TABLE notas (IdDocumento INTEGER, IdmaeItem INTEGER, IdtdDocumentoForm INTEGER,
+                                dtFechaRegistro TEXT);
+        """)
+        for documento in range(1, 6):
+            for item in (1, 2):
+                self.conexion.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                      (documento, item, f"OS{documento:03d}", f"OP{documento}",
+                                       f"Taller {documento % 2}", f"Cliente {documento % 3}",
+                                       "2024-03-01", 10.0, 20.0, 0.0, CENTRO_COSTO_COSTURA))
+            self.nota(documento, 1, 130, "2024-01-01 08:00:00")
+
+    def nota(self, documento, item, form, fecha, producido=0):
+        self.conexion.execute("INSERT INTO notas VALUES (?, ?, ?, ?)", (documento, item, form, fecha))
+        self.conexion.execute("UPDATE items SET prod = prod + ? WHERE IdDocumento = ? AND IdmaeItem = ?",
+                              (producido, documento, item))
+        self.conexion.commit()
+
+
+@pytest.fixture
+def base(tmp_path):
+    ruta = str(tmp_path / 'ordenes.sqlite')
+    return ruta, BaseSustituta(ruta)
+
+
+def _ordenes(ruta, **opciones):
+    return OrdenesIncrementales(PoolSustituto(conector_sqlite(ruta)), **opciones)
+
+
+def test_incremental_reemplaza_solo_las_ordenes_cambiadas(base):
+    ruta, bd = base
+    ordenes = _ordenes(ruta)
+    inicial = ordenes.actualizar()
+    assert ordenes.ultimo_detalle['tipo'] == 'completa'
+    assert len(inicial) == 5
+    copia = inicial.copy()
+
+    bd.nota(2, 2, 131, "2024-01-02 09:00:00", producido=5)
+    df = ordenes.actualizar()
+
+    assert ordenes.ultimo_detalle == {'tipo': 'incremental', 'ordenes': 5, 'ordenes_cambiadas': 1}
+    assert df.set_index('OS_OT').loc['OS002', 'PENDIENT'] == 35
+    assert (df.set_index('OS_OT').drop('OS002')['PENDIENT'] == 40).all()
+    assert list(df['OS_OT']) == sorted(df['OS_OT'])
+    # El DataFrame anterior no se modifica: otras sesiones pueden estar usándolo
+    pd.testing.assert_frame_equal(inicial, copia)
+
+
+def test_incremental_igual_que_carga_completa(base):
+    ruta, bd = base
+    ordenes = _ordenes(ruta)
+    ordenes.actualizar()
+    bd.nota(3, 1, 131, "2024-01-02 09:00:00", producido=8)
+    bd.nota(4, 2, 130, "2023-12-20 10:00:00")
+    bd.nota(4, 1, 131, "2024-01-03 10:00:00")
+
+    incremental = ordenes.actualizar()
+    completa = _ordenes(ruta).actualizar()
+
+    assert ordenes.ultimo_detalle['ordenes_cambiadas'] == 2
+    columnas = ['OS_OT', 'PENDIENT', 'MIN_SAL', 'ID_DOC']
+    pd.testing.assert_frame_equal(incremental[columnas], completa[columnas])
+
+
+def test_orden_que_deja_de_estar_pendiente_sale_del_grafico(base):
+    ruta, bd = base
+    ordenes = _ordenes(ruta)
+    ordenes.actualizar()
+    bd.nota(5, 1, 131, "2024-01-02 09:00:00", producido=20)
+    bd.nota(5, 2, 131, "2024-01-02 09:00:00", producido=18)
+
+    df = ordenes.actualizar()
+
+    assert 'OS005' not in set(df['OS_OT'])
+    assert len(df) == 4
+
+
+def test_sin_cambios_no_consulta_ordenes(base):
+    ruta, _ = base
+    ordenes = _ordenes(ruta)
+    ordenes.actualizar()
+    df = ordenes.actualizar()
+
+    assert ordenes.ultimo_detalle['ordenes_cambiadas'] == 0
+    assert len(df) == 5
+    assert [c['consulta'] for c in ordenes.pool.historial][-2:] == ['marca_ordenes', 'cambios_ordenes']
+
+
+def test_carga_completa_periodica_y_a_pedido(base):
+    ruta, _ = base
+    ordenes = _ordenes(ruta, carga_completa_cada=1)
+    tipos = []
+    for _ in range(3):
+        ordenes.actualizar()
+        tipos.append(ordenes.ultimo_detalle['tipo'])
+    assert tipos == ['completa', 'incremental', 'completa']
+
+    ordenes.pedir_carga_completa()
+    ordenes.actualizar()
+    assert ordenes.ultimo_detalle['tipo'] == 'completa'
+
+    ordenes.incremental = False
+    ordenes.actualizar()
+    assert ordenes.ultimo_detalle['tipo'] == 'completa'
+
+
+def test_cambios_parten_de_las_notas_nuevas_del_centro_de_costo(base):
+    ruta, bd = base
+    ordenes = _ordenes(ruta)
+    ordenes.actualizar()
+    marca = ordenes.marca
+    bd.nota(1, 1, 131, "2024-01-02 09:00:00", producido=1)
+    ordenes.actualizar()
+
+    nombre, sql, params = ordenes.pool.recibidas[-1]
+    assert nombre == 'cambios_ordenes' and sql == QUERY_CAMBIOS
+    assert params == parametros_cambios(marca) == [marca, CENTRO_COSTO_COSTURA, marca, marca]
+    assert QUERY_CAMBIOS.count('?') == len(params)
+    # Las notas nuevas se filtran por la marca antes de las funciones por fila, y solo del centro de costo
+    notas = QUERY_CAMBIOS.index('dtFechaRegistro > ?')
+    assert notas < QUERY_CAMBIOS.index('fneFechaRegistroMaximo')
+    assert 'c.IdmaeCentroCosto = ?' in QUERY_CAMBIOS
+    assert 'INNER JOIN NotasNuevas' in QUERY_CAMBIOS
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import upc_index
+from plupc import SIZE_TOKENS, consolidate_packing_list
+
+
+def _consolidado_por_filas(packing_data, upc_data):
+    """Consolidado fila por fila, como lo hacía process_consolidation antes de vectorizarlo"""
+    def find_column(df, possible_names):
+        for name in possible_names:
+            for col in df.columns:
+                if name.lower() in col.lower():
+                    return col
+        return None
+
+    upc_style_col = find_column(upc_data, ['style', 'estilo', 'style #'])
+    upc_color_col = find_column(upc_data, ['color', 'colour'])
+    upc_size_col = find_column(upc_data, ['talla', 'size', 'tall'])
+    upc_code_col = find_column(upc_data, ['upc', 'code'])
+    upc_po_col = find_column(upc_data, ['po', 'order'])
+    packing_style_col = find_column(packing_data, ['style', 'estilo', 'style #'])
+    packing_color_col = find_column(packing_data, ['color', 'colour'])
+    packing_desc_col = find_column(packing_data, ['description', 'desc'])
+    packing_po_col = find_column(packing_data, ['po', 'order'])
+    size_columns = [col for col in packing_data.columns if any(size in str(col).upper() for size in SIZE_TOKENS)]
+
+    rows = []
+    for _, row in packing_data.iterrows():
+        style = str(row.get(packing_style_col, '')).strip()
+        color = str(row.get(packing_color_col, '')).strip()
+        description = str(row.get(packing_desc_col, '')).strip() if packing_desc_col else ''
+        po_packing = str(row.get(packing_po_col, '912')).strip() if packing_po_col else '912'
+        for size_col in size_columns:
+            quantity = row.get(size_col, 0)
+            try:
+                quantity = float(quantity) if pd.notna(quantity) else 0
+            except (TypeError, ValueError):
+                quantity = 0
+            if quantity > 0:
+                size = str(size_col).strip()
+                mask = ((upc_data[upc_style_col].astype(str).str.strip() == style)
+                        & (upc_data[upc_color_col].astype(str).str.strip().str.lower() == color.lower())
+                        & (upc_data[upc_size_col].astype(str).str.strip() == size))
+                match = upc_data[mask]
+                if not match.empty:
+                    rows.append({
+                        'UPC': str(match.iloc[0][upc_code_col]).strip(),
+                        'style #': style,
+                        'Description': description,
+                        'Color': color,
+                        'Talla': size,
+                        'PO': str(match.iloc[0][upc_po_col]).strip() if upc_po_col else po_packing,
+                        'Units': int(quantity),
+                    })
+    if not rows:
+        return pd.DataFrame()
+    consolidated = pd.DataFrame(rows).groupby(['UPC', 'style #', 'Description', 'Color', 'Talla', 'PO'])[
+        'Units'].sum().reset_index()
+    return consolidated.sort_values(['style #', 'Color', 'Talla'])
+
+
+@pytest.fixture(autouse=True)
+def indice_aislado(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(upc_index, '_loaded_indexes', {})
+    monkeypatch.setattr(upc_index, '_loaded_sources', {})
+
+
+def _packing(con_po=True):
+    packing = pd.DataFrame({
+        'Style #': [1001, 1001, 1002, 1003, 1001],
+        'Color': ['Black ', 'White', 'black', 'Red', 'Black'],
+        'Description': ['Polo', 'Polo', None, 'Short', 'Polo'],
+        'PO': ['A1', np.nan, 'A2', 'A3', 'A1'],
+        '2Y': [2.0, np.nan, 1.0, 0.0, 3.0],
+        '3Y': [1.5, 4.0, np.nan, 'x', 2.7],
+        '4Y ': [np.nan, np.nan, 5.0, 2.0, np.nan],
+    })
+    return packing if con_po else packing.drop(columns='PO')
+
+
+def _upc(con_po=False):
+    upc = pd.DataFrame({
+        'Style': [1001, 1001, 1001, 1002, 1002, 1003, 1001],
+        'Color': ['black', 'BLACK', 'white', 'Black', 'black', 'red', 'Black'],
+        'Size': ['2Y', '3Y', '3Y', '2Y', '4Y', '4Y', '2Y'],
+        # La última fila repite estilo/color/talla de la primera: se usa la primera
+        'UPC': ['0001', '0002', '0003', '0004', '0005', '0006', '9999'],
+    })
+    if con_po:
+        upc['PO'] = ['P1', 'P1', 'P2', 'P3', 'P3', np.nan, 'P9']
+    return upc
+
+
+@pytest.mark.parametrize('packing_con_po, upc_con_po', [(True, False), (False, False), (True, True)])
+def test_igual_que_el_consolidado_por_filas(packing_con_po, upc_con_po):
+    packing, upc = _packing(packing_con_po), _upc(upc_con_po)
+    esperado = _consolidado_por_filas(packing.copy(), upc.copy())
+
+    consolidado, details = consolidate_packing_list(packing.copy(), upc.copy())
+
+    pd.testing.assert_frame_equal(consolidado.reset_index(drop=True), esperado.reset_index(drop=True))
+    assert details['size_columns'] == ['2Y', '3Y', '4Y']
+    assert '9999' not in set(consolidado['UPC'])
+
+
+def test_por_bloques_igual_que_de_una_vez():
+    packing, upc = _packing(), _upc()
+    completo, _ = consolidate_packing_list(packing.copy(), upc.copy())
+    bloques = [packing.iloc[:2].copy(), packing.iloc[2:].copy()]
+
+    por_bloques, _ = consolidate_packing_list(iter(bloques), upc.copy())
+
+    pd.testing.assert_frame_equal(por_bloques.reset_index(drop=True), completo.reset_index(drop=True))
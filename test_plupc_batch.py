@@ -0,0 +1,107 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import plupc_batch
+from plupc_batch import collect_workbooks, consolidate_workbook, run_batch
+
+
+def _libro(path, po='PO1', units=(2, 3), sheets=('Packing List', 'UPC')):
+    workbook = Workbook()
+    packing = workbook.active
+    packing.title = sheets[0]
+    packing.append(['Style #', 'Color', 'Description', 'PO', '2Y', '3Y'])
+    packing.append([1001, 'Black', 'Polo', po, *units])
+    upc = workbook.create_sheet(sheets[1])
+    upc.append(['Style', 'Color', 'Talla', 'UPC'])
+    upc.append([1001, 'black', '2Y', '0001'])
+    upc.append([1001, 'black', '3Y', '0002'])
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def carpeta(tmp_path):
+    _libro(tmp_path / 'a.xlsx')
+    _libro(tmp_path / 'b.xlsx', po='PO2', units=(1, 0))
+    (tmp_path / '~$a.xlsx').write_bytes(b'')
+    (tmp_path / 'notas.txt').write_text('x')
+    return tmp_path
+
+
+def test_collect_workbooks(carpeta):
+    esperados = [str(carpeta / 'a.xlsx'), str(carpeta / 'b.xlsx')]
+    assert collect_workbooks([str(carpeta)]) == esperados
+    # Carpeta y patrón que apuntan a los mismos libros no los repiten
+    assert collect_workbooks([str(carpeta), str(carpeta / '*.xlsx')]) == esperados
+    assert collect_workbooks([str(carpeta / 'no_existe' / '*.xlsx')]) == []
+
+
+def test_consolidate_workbook(carpeta):
+    result = consolidate_workbook(str(carpeta / 'a.xlsx'))
+
+    assert result['Estado'] == 'OK' and result['Error'] == ''
+    assert (result['Filas'], result['Unidades'], result['Sin UPC']) == (2, 5, 0)
+    assert list(result['data']['UPC']) == ['0001', '0002']
+    assert set(result['data']['Archivo']) == {'a.xlsx'}
+
+
+def test_consolidate_workbook_nunca_lanza(tmp_path):
+    sin_pestanas = _libro(tmp_path / 'c.xlsx', sheets=('Hoja1', 'Hoja2'))
+    danado = tmp_path / 'd.xlsx'
+    danado.write_bytes(b'no es un libro')
+
+    for path in (sin_pestanas, str(danado)):
+        result = consolidate_workbook(path)
+        assert result['Estado'] == 'ERROR'
+        assert result['Error']
+        assert 'data' not in result
+
+
+def test_reporte_y_consolidados(carpeta, tmp_path):
+    (tmp_path / 'otros').mkdir()
+    danado = tmp_path / 'otros' / 'd.xlsx'
+    danado.write_bytes(b'no es un libro')
+    salida = tmp_path / 'salida'
+
+    report = run_batch(collect_workbooks([str(carpeta)]) + [str(danado)], str(salida), workers=2, file_format='CSV')
+
+    assert list(report.columns) == plupc_batch.REPORT_COLUMNS
+    assert list(report['Estado']) == ['OK', 'OK', 'ERROR']
+    assert list(report['Unidades']) == [5, 1, 0]
+    pd.testing.assert_frame_equal(pd.read_csv(salida / 'reporte_lote.csv').fillna(''),
+                                  report.astype({'Error': str}), check_dtype=False)
+    assert sorted(os.listdir(salida)) == ['consolidado_PO_PO1.csv', 'consolidado_PO_PO2.csv',
+                                          'consolidado_general.csv', 'reporte_lote.csv']
+    general = pd.read_csv(salida / 'consolidado_general.csv')
+    assert general['Units'].sum() == 6
+
+
+def _consolidar_con_fallas(path):
+    # Se ejecuta en el proceso del pool (fork): un libro mata el proceso y otro no termina
+    nombre = os.path.basename(path)
+    if nombre == 'cae.xlsx':
+        os._exit(1)
+    if nombre == 'cuelga.xlsx':
+        time.sleep(60)
+    return consolidate_workbook(path)
+
+
+@pytest.mark.skipif(os.name != 'posix', reason="el reemplazo de la tarea llega a los procesos con fork")
+def test_un_libro_que_cae_o_se_cuelga_no_detiene_el_lote(carpeta, tmp_path, monkeypatch):
+    monkeypatch.setattr(plupc_batch, 'consolidate_workbook', _consolidar_con_fallas)
+    paths = [str(carpeta / 'a.xlsx'), _libro(tmp_path / 'cae.xlsx'), _libro(tmp_path / 'cuelga.xlsx'),
+             str(carpeta / 'b.xlsx')]
+
+    start = time.monotonic()
+    report = run_batch(paths, str(tmp_path / 'salida'), workers=2, file_format='CSV', timeout=3)
+
+    assert time.monotonic() - start < 30
+    estados = dict(zip(report['Archivo'].map(os.path.basename), report['Estado']))
+    assert estados == {'a.xlsx': 'OK', 'b.xlsx': 'OK', 'cae.xlsx': 'ERROR', 'cuelga.xlsx': 'ERROR'}
+    errores = dict(zip(report['Archivo'].map(os.path.basename), report['Error']))
+    assert errores['cae.xlsx'].startswith('BrokenProcessPool')
+    assert errores['cuelga.xlsx'].startswith('TimeoutError')
@@ -0,0 +1,114 @@
+import datetime
+
+import pandas as pd
+
+from produccion import COLUMNAS, CONSULTA_PRODUCCION, PROCESOS, AlmacenProduccion, combinar_ramas, tramos_continuos
+
+D = datetime.date
+
+
+def _consultar_hasta(base, hoy, llamadas):
+    """Base de datos de reemplazo: solo existen filas hasta `hoy`"""
+    def consultar(inicio, fin):
+        llamadas.append((inicio, fin))
+        fin = min(pd.Timestamp(fin).date(), hoy)
+        return base[(base['Fecha'] >= inicio) & (base['Fecha'] <= fin)]
+    return consultar
+
+
+def _base():
+    fechas = pd.date_range('2024-01-01', '2024-01-31').date
+    return pd.DataFrame({'Fecha': fechas, 'Proceso': 'Produccion_Corte', 'Cantidad': 1})
+
+
+def test_solo_consulta_dias_faltantes_y_recientes(tmp_path):
+    almacen = AlmacenProduccion(str(tmp_path / 'p.sqlite'), dias_recientes=3)
+    base, llamadas = _base(), []
+    consultar = _consultar_hasta(base, D(2024, 1, 31), llamadas)
+
+    df, detalle = almacen.cargar(D(2024, 1, 10), D(2024, 1, 20), consultar, hoy=D(2024, 1, 31))
+    assert len(df) == 11
+    assert detalle['tramos'] == [(D(2024, 1, 10), D(2024, 1, 20))]
+
+    df, detalle = almacen.cargar(D(2024, 1, 1), D(2024, 1, 31), consultar, hoy=D(2024, 1, 31))
+    assert len(df) == 31
+    assert detalle['tramos'] == [(D(2024, 1, 1), D(2024, 1, 9)), (D(2024, 1, 21), D(2024, 1, 31))]
+
+    _, detalle = almacen.cargar(D(2024, 1, 1), D(2024, 1, 31), consultar, hoy=D(2024, 1, 31))
+    assert detalle['tramos'] == [(D(2024, 1, 28), D(2024, 1, 31))]
+
+
+def test_dias_futuros_no_quedan_como_cargados(tmp_path):
+    almacen = AlmacenProduccion(str(tmp_path / 'p.sqlite'), dias_recientes=3)
+    base, llamadas = _base(), []
+
+    almacen.cargar(D(2024, 1, 1), D(2024, 1, 31), _consultar_hasta(base, D(2024, 1, 10), llamadas),
+                   hoy=D(2024, 1, 10))
+    df, detalle = almacen.cargar(D(2024, 1, 1), D(2024, 1, 25), _consultar_hasta(base, D(2024, 1, 25), llamadas),
+                                 hoy=D(2024, 1, 25))
+
+    assert len(df) == 25
+    assert detalle['tramos'] == [(D(2024, 1, 7), D(2024, 1, 25))]
+
+
+def test_tramos_continuos():
+    dias = [D(2024, 1, 1), D(2024, 1, 2), D(2024, 1, 5)]
+    assert tramos_continuos(dias) == [(D(2024, 1, 1), D(2024, 1, 2)), (D(2024, 1, 5), D(2024, 1, 5))]
+
+
+def test_filas_repetidas_del_mismo_dia_se_suman(tmp_path):
+    almacen = AlmacenProduccion(str(tmp_path / 'p.sqlite'), dias_recientes=0)
+    # La consulta agrupa por fecha y hora: un mismo día y proceso puede venir en varias filas
+    df = pd.DataFrame({
+        'Fecha': [D(2024, 1, 5), D(2024, 1, 5), D(2024, 1, 5), D(2024, 1, 6)],
+        'Proceso': ['Produccion_Corte', 'Produccion_Corte', 'Produccion_Costura', 'Produccion_Corte'],
+        'Cantidad': [10, 7, None, 3],
+    })
+
+    almacen.guardar(D(2024, 1, 5), D(2024, 1, 6), df, hoy=D(2024, 2, 1))
+    guardado = almacen.leer(D(2024, 1, 5), D(2024, 1, 6))
+
+    assert list(zip(guardado['Fecha'], guardado['Proceso'])) == [
+        (D(2024, 1, 5), 'Produccion_Corte'), (D(2024, 1, 5), 'Produccion_Costura'), (D(2024, 1, 6), 'Produccion_Corte'),
+    ]
+    assert guardado['Cantidad'].iloc[0] == 17
+    assert pd.isna(guardado['Cantidad'].iloc[1])
+    assert guardado['Cantidad'].iloc[2] == 3
+
+
+def _consulta_unica(eventos):
+    """Resultado de CONSULTA_PRODUCCION sobre los eventos: suma por día de todas las ramas y UNPIVOT"""
+    ancho = (eventos.assign(Fecha=eventos['Fecha'].dt.date)
+             .pivot_table(index='Fecha', columns='Proceso', values='Cantidad', aggfunc='sum', fill_value=0)
+             .reindex(columns=PROCESOS, fill_value=0))
+    largo = ancho.stack().rename('Cantidad').reset_index()
+    return largo.sort_values(['Fecha', 'Proceso'], ignore_index=True).astype({'Cantidad': 'int64'})[COLUMNAS]
+
+
+def _consulta_por_proceso(eventos, proceso):
+    rama = eventos[eventos['Proceso'] == proceso]
+    return rama.groupby(rama['Fecha'].dt.date)['Cantidad'].sum().rename_axis('Fecha').reset_index()
+
+
+def test_combinar_ramas_igual_que_la_consulta_unica():
+    # Varios registros del mismo día a distintas horas, y días en que solo produjo un proceso
+    eventos = pd.DataFrame({
+        'Fecha': pd.to_datetime(['2024-01-05 08:00', '2024-01-05 15:30', '2024-01-05 09:10',
+                                 '2024-01-06 11:00', '2024-01-08 07:45', '2024-01-08 07:45']),
+        'Proceso': ['Produccion_Corte', 'Produccion_Corte', 'Produccion_Tejido',
+                    'Produccion_Costura', 'Produccion_Hilado', 'Produccion_Hilado'],
+        'Cantidad': [10, 7, 250, 40, 12, 3],
+    })
+    ramas = {proceso: _consulta_por_proceso(eventos, proceso) for proceso in PROCESOS}
+
+    combinado = combinar_ramas(ramas)
+
+    esperado = _consulta_unica(eventos)
+    pd.testing.assert_frame_equal(combinado, esperado)
+    assert len(combinado) == 3 * len(PROCESOS)
+    corte = combinado[(combinado['Fecha'] == D(2024, 1, 5)) & (combinado['Proceso'] == 'Produccion_Corte')]
+    assert corte['Cantidad'].tolist() == [17]
+
+
+def test_consulta_unica_agrupa_por_dia():
+    assert 'group by convert(date,sc.Fecha)' in CONSULTA_PRODUCCION
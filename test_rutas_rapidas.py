@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rutas_rapidas import preparar_datos, responder_rapido
+
+PROCESOS = ['Produccion_Armado', 'Produccion_Corte', 'Produccion_Costura', 'Produccion_Hilado',
+            'Produccion_Tejido', 'Produccion_Teñido']
+
+
+@pytest.fixture
+def datos():
+    fechas = pd.date_range('2024-01-01', '2024-03-31', freq='D')
+    df = pd.DataFrame({
+        'Fecha': np.repeat(fechas.date, len(PROCESOS)),
+        'Proceso': np.tile(PROCESOS, len(fechas)),
+        'Cantidad': np.random.default_rng(0).integers(0, 5000, len(fechas) * len(PROCESOS)),
+    })
+    return preparar_datos(df)
+
+
+@pytest.mark.parametrize('pregunta', [
+    '¿Cuántos días la costura superó 3000 unidades?',
+    'Dame la cantidad de días sin producción de tejido',
+    'Total de costura en enero',
+    '¿Cuál fue el máximo de costura en marzo?',
+    '¿Cuánto se tiñó el 5 de febrero?',
+    '¿Cuánto se cosió la semana pasada?',
+    'Total de corte entre el lunes y el viernes',
+    '¿Por qué bajó el tejido?',
+    '¿Cuánto se produjo?',
+    'Promedio de producción del último mes',
+])
+def test_preguntas_con_fecha_numero_o_condicion_van_al_agente(datos, pregunta):
+    assert responder_rapido(pregunta, datos) is None
+
+
+@pytest.mark.parametrize('pregunta, filas', [
+    ('Producción total por proceso', 6),
+    ('Total de costura', 1),
+    ('Total teñido', 1),
+    ('¿Cuál fue el mejor día de corte?', 1),
+    ('Promedio diario de hilado y tejido', 2),
+])
+def test_rutas_directas(datos, pregunta, filas):
+    respuesta = responder_rapido(pregunta, datos)
+    assert respuesta is not None
+    assert len(respuesta['tabla']) == filas
+
+
+def test_total_por_proceso(datos):
+    respuesta = responder_rapido('Total de costura', datos)
+    esperado = datos.loc[datos['Proceso'] == 'Produccion_Costura', 'Cantidad'].sum()
+    assert respuesta['tabla']['Total'].iloc[0] == esperado
+
+
+def test_conjugaciones_del_proceso(datos):
+    respuesta = responder_rapido('Total de lo que se tiñó', datos)
+    assert list(respuesta['tabla'].index) == ['Teñido']
+
+
+def test_variacion_con_la_ultima_semana_incompleta():
+    # Del lunes 1 al miércoles 10 de enero de 2024: la segunda semana solo tiene tres días
+    fechas = pd.date_range('2024-01-01', '2024-01-10', freq='D')
+    df = preparar_datos(pd.DataFrame({'Fecha': fechas, 'Proceso': 'Produccion_Costura', 'Cantidad': 100}))
+
+    respuesta = responder_rapido('Variación semanal de costura', df)
+
+    # Se comparan lunes a miércoles de cada semana, no tres días contra siete
+    fila = respuesta['tabla'].loc['Costura']
+    assert list(fila.iloc[:2]) == [300, 300]
+    assert fila['Diferencia'] == 0
+    assert '3 días' in respuesta['texto']
+
+
+def test_variacion_con_semanas_completas(datos):
+    respuesta = responder_rapido('Variación semanal', datos)
+    # El 31/03/2024 es domingo: se comparan las dos últimas semanas completas
+    semanal = datos.pivot_table(index=pd.Grouper(key='Fecha', freq='W-SUN'), columns='Proceso',
+                                values='Cantidad', aggfunc='sum')
+    assert list(respuesta['tabla'].columns[:2]) == ['24/03', '31/03']
+    assert list(respuesta['tabla']['31/03']) == list(semanal.iloc[-1])
+    assert list(respuesta['tabla']['24/03']) == list(semanal.iloc[-2])
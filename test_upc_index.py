@@ -0,0 +1,127 @@
+import os
+
+import pandas as pd
+import pytest
+
+import upc_index
+from upc_index import load_upc_index
+
+COLUMNS = {'style': 'Style', 'color': 'Color', 'size': 'Size', 'code': 'UPC', 'po': None}
+
+
+@pytest.fixture(autouse=True)
+def memoria_limpia(monkeypatch):
+    monkeypatch.setattr(upc_index, '_loaded_indexes', {})
+    monkeypatch.setattr(upc_index, '_loaded_sources', {})
+
+
+def _upc(filas=4):
+    return pd.DataFrame({
+        'Style': [1001 + i for i in range(filas)],
+        'Color': ['Black '] * filas,
+        'Size': ['S', 'M', 'L', 'XL'][:filas] if filas <= 4 else ['S'] * filas,
+        'UPC': [f"0000{i}" for i in range(filas)],
+    })
+
+
+def _indices(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith('.parquet'))
+
+
+def _variante(i):
+    upc = _upc()
+    upc.loc[3, 'UPC'] = f"9999{i}"
+    return upc
+
+
+def _sin_memoria():
+    upc_index._loaded_indexes.clear()
+    upc_index._loaded_sources.clear()
+
+
+def test_build_e_incremental(tmp_path):
+    cache_dir = str(tmp_path)
+    keys, stats = load_upc_index(_upc(), COLUMNS, cache_dir)
+    assert stats['status'] == 'build'
+    assert list(keys['color_key']) == ['black'] * 4
+
+    _, stats = load_upc_index(_variante(0), COLUMNS, cache_dir)
+
+    assert stats['status'] == 'incremental'
+    assert (stats['reused'], stats['normalized']) == (3, 1)
+    # El índice anterior se conserva para cuando se vuelva a cargar ese archivo
+    assert len(_indices(cache_dir)) == 2
+
+
+def test_alternar_archivos_usa_los_indices_en_disco(tmp_path):
+    cache_dir = str(tmp_path)
+    load_upc_index(_upc(), COLUMNS, cache_dir)
+    load_upc_index(_variante(0), COLUMNS, cache_dir)
+    _sin_memoria()
+
+    _, stats = load_upc_index(_upc(), COLUMNS, cache_dir)
+    assert stats['status'] == 'hit'
+    _, stats = load_upc_index(_variante(0), COLUMNS, cache_dir)
+    assert stats['status'] == 'hit'
+
+
+def test_se_borran_los_indices_mas_antiguos(tmp_path):
+    cache_dir = str(tmp_path)
+    hashes = [load_upc_index(_variante(i), COLUMNS, cache_dir)[1]['hash']
+              for i in range(upc_index.MAX_INDEXES_PER_SIGNATURE + 1)]
+
+    # Se conservan los últimos, el más reciente primero; el primero se borra
+    assert _indices(cache_dir) == sorted(f"{h}.parquet" for h in hashes[1:])
+    manifest = upc_index._read_manifest(cache_dir)
+    assert list(manifest.values()) == [hashes[:0:-1]]
+
+    # Volver a usar uno lo pone al frente y no se borra con el siguiente
+    _sin_memoria()
+    load_upc_index(_variante(1), COLUMNS, cache_dir)
+    load_upc_index(_variante(9), COLUMNS, cache_dir)
+    assert f"{hashes[1]}.parquet" in _indices(cache_dir)
+    assert f"{hashes[2]}.parquet" not in _indices(cache_dir)
+
+
+def test_lee_el_manifiesto_con_un_solo_hash(tmp_path):
+    cache_dir = str(tmp_path)
+    _, stats = load_upc_index(_upc(), COLUMNS, cache_dir)
+    manifest = upc_index._read_manifest(cache_dir)
+    upc_index._write_manifest(cache_dir, {firma: hashes[0] for firma, hashes in manifest.items()})
+    _sin_memoria()
+
+    _, stats = load_upc_index(_variante(0), COLUMNS, cache_dir)
+    assert stats['status'] == 'incremental'
+    assert len(list(upc_index._read_manifest(cache_dir).values())[0]) == 2
+
+
+def test_archivos_temporales_propios_del_proceso(tmp_path, monkeypatch):
+    reemplazos = []
+    reemplazar = os.replace
+
+    def registrar(origen, destino):
+        reemplazos.append(os.path.basename(origen))
+        reemplazar(origen, destino)
+    monkeypatch.setattr(upc_index.os, 'replace', registrar)
+
+    load_upc_index(_upc(), COLUMNS, str(tmp_path))
+
+    assert len(reemplazos) == 2
+    assert all(nombre.endswith(f".{os.getpid()}.tmp") for nombre in reemplazos)
+    assert not [nombre for nombre in os.listdir(tmp_path) if nombre.endswith('.tmp')]
+
+
+def test_misma_fuente_no_vuelve_a_recorrer_la_pestana(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path)
+    load_upc_index(_upc(), COLUMNS, cache_dir, source=('huella', 'UPC'))
+
+    def no_hashear(*args):
+        raise AssertionError("no debe recorrer la pestaña")
+    monkeypatch.setattr(upc_index, 'hash_upc_rows', no_hashear)
+
+    keys, stats = load_upc_index(_upc(), COLUMNS, cache_dir, source=('huella', 'UPC'))
+    assert stats['status'] == 'hit'
+    assert len(keys) == 4
+
+    with pytest.raises(AssertionError):
+        load_upc_index(_upc(), COLUMNS, cache_dir, source=('otra huella', 'UPC'))
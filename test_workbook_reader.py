@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from upc_index import normalize_text
+from workbook_reader import iter_sheet_chunks, read_sheet
+
+
+@pytest.fixture
+def libro(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Packing'
+    sheet.append(['Style #', 'Color', 'S', 'M'])
+    for fila in range(12):
+        # El estilo vacío cae en el último bloque cuando los bloques son de 5 filas
+        sheet.append([None if fila == 11 else 1001 + fila, 'Black', 1, 2.5])
+    ruta = tmp_path / 'libro.xlsx'
+    workbook.save(ruta)
+    return str(ruta)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 5000])
+def test_estilos_no_dependen_del_tamano_de_bloque(libro, chunk_size):
+    estilos = pd.concat(
+        [normalize_text(chunk['Style #']) for chunk in iter_sheet_chunks(libro, 'Packing', chunk_size)],
+        ignore_index=True,
+    )
+    assert list(estilos[:11]) == [str(1001 + fila) for fila in range(11)]
+
+
+def test_lectura_completa_igual_con_cualquier_bloque(libro):
+    completa = read_sheet(libro, 'Packing', chunk_size=5000)
+    por_bloques = read_sheet(libro, 'Packing', chunk_size=5)
+    pd.testing.assert_frame_equal(completa, por_bloques)
+    assert completa['S'].dtype == 'int64'
+    assert completa['M'].dtype == 'float64'
+
+
+def test_celdas_vacias_como_en_read_excel(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Packing'
+    sheet.append(['Style #', 'Color', 'Description', 'Notas', 'S'])
+    sheet.append(['A1', 'Black', None, None, 1.5])
+    sheet.append(['A2', None, 'Polo', None, None])
+    ruta = str(tmp_path / 'vacias.xlsx')
+    workbook.save(ruta)
+
+    leida = read_sheet(ruta, 'Packing', chunk_size=1)
+
+    pd.testing.assert_frame_equal(leida, pd.read_excel(ruta, sheet_name='Packing'))
+    assert list(normalize_text(leida['Description'])) == ['nan', 'Polo']
+    assert list(normalize_text(leida['Color'])) == ['Black', 'nan']
@@ -0,0 +1,209 @@
+"""
+Índice persistente de UPCs normalizados para el consolidador de packing list.
+
+Las llaves (estilo, color en minúsculas, talla) se normalizan una sola vez y se
+guardan en disco en formato Parquet, identificadas por un hash del contenido de
+la pestaña UPC. Si la pestaña cambia solo en algunas filas, se reutilizan las
+filas ya normalizadas del índice anterior y solo se normalizan las nuevas. Por cada combinación de
+columnas se conservan los últimos MAX_INDEXES_PER_SIGNATURE índices, para que
+alternar entre varios archivos no reconstruya el índice cada vez; los más
+antiguos se borran del disco. Cuando se conoce el archivo de origen
+(huella de ingesta y pestaña), los reruns usan el índice ya cargado sin volver
+a recorrer la pestaña.
+"""
+import contextlib
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join('.cache', 'upc_index')
+MANIFEST_FILE = 'manifest.json'
+
+KEY_COLUMNS = ['style #', 'color_key', 'Talla']
+
+# Índices en disco que se conservan por combinación de columnas (el más reciente primero)
+MAX_INDEXES_PER_SIGNATURE = 4
+
+# Índices ya cargados en este proceso, para no leer el disco en cada rerun
+MAX_LOADED_INDEXES = 8
+_loaded_indexes = {}
+# (huella del archivo, pestaña, columnas) -> hash de la pestaña ya indexada
+_loaded_sources = {}
+
+
+def normalize_text(series):
+    """
+    Normaliza una columna a texto sin espacios, igual que str(valor).strip()
+    """
+    return series.astype(str).str.strip()
+
+
+def normalize_upc_rows(upc_data, columns):
+    """
+    Normaliza las columnas de la tabla UPC detectadas con find_column.
+    `columns` es un diccionario con las llaves style, color, size, code y po (opcional).
+    """
+    rows = pd.DataFrame({
+        'style #': normalize_text(upc_data[columns['style']]),
+        'color_key': normalize_text(upc_data[columns['color']]).str.lower(),
+        'Talla': normalize_text(upc_data[columns['size']]),
+        'UPC': normalize_text(upc_data[columns['code']]),
+    })
+    if columns.get('po'):
+        rows['PO'] = normalize_text(upc_data[columns['po']])
+    return rows.reset_index(drop=True)
+
+
+def hash_upc_rows(upc_data, columns):
+    """
+    Calcula un hash por fila de las columnas usadas para la búsqueda de UPC
+    """
+    used = [col for col in columns.values() if col]
+    return pd.util.hash_pandas_object(upc_data[used].astype(str), index=False).to_numpy()
+
+
+def _columns_signature(columns):
+    return hashlib.sha1(json.dumps(columns, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def _sheet_hash(row_hashes, columns):
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(_columns_signature(columns).encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    # Los manifiestos anteriores guardaban un solo hash por combinación de columnas
+    return {signature: [hashes] if isinstance(hashes, str) else hashes for signature, hashes in manifest.items()}
+
+
+def _write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def _index_path(cache_dir, sheet_hash):
+    return os.path.join(cache_dir, f"{sheet_hash}.parquet")
+
+
+def _remember(cache, key, value):
+    if key not in cache and len(cache) >= MAX_LOADED_INDEXES:
+        cache.pop(next(iter(cache)))
+    cache[key] = value
+
+
+def _push_hash(manifest, signature, sheet_hash):
+    """
+    Pone el hash al frente de la lista de su combinación de columnas y
+    devuelve los hashes que quedaron fuera del máximo.
+    """
+    hashes = [sheet_hash] + [h for h in manifest.get(signature, []) if h != sheet_hash]
+    manifest[signature] = hashes[:MAX_INDEXES_PER_SIGNATURE]
+    return hashes[MAX_INDEXES_PER_SIGNATURE:]
+
+
+def _remove_superseded(cache_dir, manifest, superseded):
+    """Borra los índices descartados que ya no usa ninguna combinación de columnas"""
+    in_use = {h for hashes in manifest.values() for h in hashes}
+    for sheet_hash in superseded:
+        if sheet_hash not in in_use:
+            with contextlib.suppress(OSError):
+                os.remove(_index_path(cache_dir, sheet_hash))
+
+
+def _reuse_rows(previous, row_hashes, upc_data, columns):
+    """
+    Arma las filas normalizadas en el orden actual reutilizando las del índice anterior
+    y normalizando solo las filas cuyo hash no existía.
+    """
+    previous = previous.drop_duplicates('row_hash').set_index('row_hash')
+    rows = previous.reindex(pd.Index(row_hashes, name='row_hash'))
+    missing = np.flatnonzero(rows['UPC'].isna().to_numpy())
+
+    if len(missing):
+        fresh = normalize_upc_rows(upc_data.iloc[missing], columns)
+        rows.iloc[missing, [rows.columns.get_loc(col) for col in fresh.columns]] = fresh.to_numpy()
+
+    rows = rows.reset_index()
+    return rows, len(row_hashes) - len(missing), len(missing)
+
+
+def load_upc_index(upc_data, columns, cache_dir=CACHE_DIR, source=None):
+    """
+    Devuelve la tabla de llaves UPC (sin combinaciones repetidas, se conserva la primera)
+    y un diccionario con estadísticas de cómo se obtuvo: hit, incremental o build.
+    `source` es opcional: (huella del archivo de ingesta, nombre de la pestaña).
+    """
+    source_key = (*source, _columns_signature(columns)) if source else None
+    if source_key in _loaded_sources and _loaded_sources[source_key] in _loaded_indexes:
+        sheet_hash = _loaded_sources[source_key]
+        stats = {'hash': sheet_hash, 'rows': len(upc_data), 'reused': len(upc_data), 'normalized': 0,
+                 'status': 'hit'}
+        return _loaded_indexes[sheet_hash], stats
+
+    row_hashes = hash_upc_rows(upc_data, columns)
+    sheet_hash = _sheet_hash(row_hashes, columns)
+    stats = {'hash': sheet_hash, 'rows': len(row_hashes), 'reused': 0, 'normalized': 0}
+
+    if sheet_hash in _loaded_indexes:
+        stats.update(status='hit', reused=len(row_hashes))
+        if source_key:
+            _remember(_loaded_sources, source_key, sheet_hash)
+        return _loaded_indexes[sheet_hash], stats
+
+    path = _index_path(cache_dir, sheet_hash)
+    signature = _columns_signature(columns)
+
+    try:
+        manifest = _read_manifest(cache_dir)
+        if os.path.exists(path):
+            rows = pd.read_parquet(path)
+            stats.update(status='hit', reused=len(rows))
+            if manifest.get(signature, [None])[0] != sheet_hash:
+                superseded = _push_hash(manifest, signature, sheet_hash)
+                _write_manifest(cache_dir, manifest)
+                _remove_superseded(cache_dir, manifest, superseded)
+        else:
+            # Se parte del índice más reciente de las mismas columnas que siga en disco
+            previous_path = next((_index_path(cache_dir, h) for h in manifest.get(signature, [])
+                                  if os.path.exists(_index_path(cache_dir, h))), None)
+
+            if previous_path:
+                rows, reused, normalized = _reuse_rows(pd.read_parquet(previous_path), row_hashes, upc_data,
+                                                       columns)
+                stats.update(status='incremental', reused=reused, normalized=normalized)
+            else:
+                rows = normalize_upc_rows(upc_data, columns)
+                rows.insert(0, 'row_hash', row_hashes)
+                stats.update(status='build', normalized=len(rows))
+
+            os.makedirs(cache_dir, exist_ok=True)
+            # Archivo temporal propio de cada proceso, como en ingesta.store_table
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            rows.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+            superseded = _push_hash(manifest, signature, sheet_hash)
+            _write_manifest(cache_dir, manifest)
+            _remove_superseded(cache_dir, manifest, superseded)
+    except (OSError, ImportError, ValueError):
+        # Sin disco disponible (o sin pyarrow) se construye el índice solo en memoria
+        rows = normalize_upc_rows(upc_data, columns)
+        stats.update(status='build', normalized=len(rows))
+
+    upc_keys = rows.drop(columns='row_hash', errors='ignore').drop_duplicates(KEY_COLUMNS, keep='first')
+    _remember(_loaded_indexes, sheet_hash, upc_keys)
+    if source_key:
+        _remember(_loaded_sources, source_key, sheet_hash)
+    return upc_keys, stats
@@ -0,0 +1,154 @@
+"""
+Lectura selectiva y por bloques de libros Excel.
+
+Primero se listan los nombres de las pestañas sin parsear su contenido y luego
+solo se leen las pestañas necesarias en modo read-only de openpyxl, entregando
+las filas en bloques de DataFrames.
+"""
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+CHUNK_SIZE = 5000
+
+
+def _is_legacy_xls(file):
+    name = getattr(file, 'name', file if isinstance(file, str) else '')
+    return str(name).lower().endswith('.xls')
+
+
+def _rewind(file):
+    if hasattr(file, 'seek'):
+        file.seek(0)
+
+
+def list_sheet_names(file):
+    """
+    Lista las pestañas del libro sin leer las celdas
+    """
+    _rewind(file)
+    if _is_legacy_xls(file):
+        return pd.ExcelFile(file).sheet_names
+
+    workbook = load_workbook(file, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def find_consolidation_sheets(sheet_names):
+    """
+    Busca las pestañas de Packing List y UPC (flexible con nombres)
+    """
+    packing_sheet = None
+    upc_sheet = None
+
+    for sheet_name in sheet_names:
+        if 'PL' in sheet_name.upper() or 'PACKING' in sheet_name.upper():
+            packing_sheet = sheet_name
+        elif 'UPC' in sheet_name.upper():
+            upc_sheet = sheet_name
+
+    return packing_sheet, upc_sheet
+
+
+def _header_names(header_row):
+    """
+    Nombres de columna al estilo de pd.read_excel: vacíos como 'Unnamed: i' y repetidos con sufijo .1, .2...
+    """
+    names = []
+    seen = {}
+    for position, value in enumerate(header_row):
+        name = f"Unnamed: {position}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _convert_cell(value):
+    # Igual que pandas: los números enteros guardados como float se leen como int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _build_chunk(rows, columns):
+    """
+    DataFrame de un bloque con tipos que no dependen de dónde cae el corte: una columna de
+    enteros con celdas vacías queda como Int64 y no como float, así un estilo 1001 se lee
+    igual ('1001') en cualquier bloque, tenga o no vacíos.
+    """
+    chunk = pd.DataFrame(rows, columns=columns, dtype=object)
+    for name in columns:
+        present = chunk[name].dropna()
+        if len(present) and all(_is_int(value) for value in present):
+            chunk[name] = chunk[name].astype('Int64' if len(present) < len(chunk) else 'int64')
+        elif len(present) < len(chunk):
+            # Las celdas vacías quedan como NaN, igual que en pd.read_excel (y no como None)
+            chunk[name] = chunk[name].where(chunk[name].notna(), np.nan)
+    return chunk.infer_objects()
+
+
+def iter_sheet_chunks(file, sheet_name, chunk_size=CHUNK_SIZE):
+    """
+    Lee una pestaña en modo streaming y entrega DataFrames de hasta `chunk_size` filas.
+    La primera fila se usa como encabezado; las filas vacías al final de la hoja se descartan.
+    """
+    _rewind(file)
+    if _is_legacy_xls(file):
+        # xlrd no tiene modo streaming: se lee solo la pestaña pedida
+        yield pd.read_excel(file, sheet_name=sheet_name)
+        return
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows_iter = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows_iter, None)
+        if header is None:
+            yield pd.DataFrame()
+            return
+
+        columns = _header_names(header)
+        width = len(columns)
+        rows = []
+        pending_empty = []
+        emitted = False
+
+        for row in rows_iter:
+            row = [_convert_cell(value) for value in row[:width]]
+            row.extend([None] * (width - len(row)))
+
+            # Las filas vacías solo se agregan si después aparece una fila con datos
+            if all(value is None for value in row):
+                pending_empty.append(row)
+                continue
+            rows.extend(pending_empty)
+            pending_empty = []
+            rows.append(row)
+
+            if len(rows) >= chunk_size:
+                yield _build_chunk(rows, columns)
+                emitted = True
+                rows = []
+
+        if rows or not emitted:
+            yield _build_chunk(rows, columns)
+    finally:
+        workbook.close()
+
+
+def read_sheet(file, sheet_name, chunk_size=CHUNK_SIZE):
+    """
+    Lee una pestaña completa concatenando sus bloques
+    """
+    chunks = list(iter_sheet_chunks(file, sheet_name, chunk_size))
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]